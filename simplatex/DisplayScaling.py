@@ -1,11 +1,6 @@
 import platform
 from typing import List, Dict
 
-try:
-    import mss  # type: ignore
-except Exception:
-    mss = None  # mss 可能未安装，运行时回退到 tkinter
-
 import tkinter as tk
 
 
@@ -23,8 +18,10 @@ def get_display_scaling() -> List[float]:
 
 
 def _monitors_from_mss() -> List[Dict]:
-    if mss is None:
-        raise RuntimeError("mss 未安装")
+    try:
+        import mss  # type: ignore
+    except Exception:
+        raise RuntimeError("mss 未安装")  # mss 可能未安装，运行时回退到 tkinter
     with mss.mss() as sct:
         # sct.monitors[0] 是虚拟桌面总体区域；1..n 为各物理显示器
         monitors_info: List[Dict] = []
@@ -65,15 +62,18 @@ def get_monitors_info_simple() -> List[Dict]:
             pass
 
 
-def get_monitors_info() -> List[Dict]:
+def get_monitors_info(allow_tk_fallback: bool = True) -> List[Dict]:
     """跨平台获取所有显示器的几何信息。
     - 优先使用 mss（Windows/Linux/macOS 均支持）。
-    - 失败则回退到 tkinter 单屏方案。
+    - 失败则回退到 tkinter 单屏方案；allow_tk_fallback=False 时直接抛出异常
+      （tkinter 回退会新建 Tk 实例，只能在主线程调用）。
     返回字段：index, scaling_factor, width, height, x, y
     """
     try:
         return _monitors_from_mss()
     except Exception:
+        if not allow_tk_fallback:
+            raise
         return get_monitors_info_simple()
 
 
@@ -1,47 +1,95 @@
 import datetime
 import json
-import requests
 from random import Random
 import hashlib
 import os
 import configparser
 import sys
+import threading
 
-# 获取当前工作目录
-pwd = os.getcwd()
 
-# 创建配置解析器对象
-config = configparser.ConfigParser()
+class ConfigError(Exception):
+    """.ini 配置缺失或凭据无效"""
 
-# 配置文件路径
-config_file = os.path.join(pwd, ".ini")
 
-# 读取 .ini 文件
-if os.path.exists(config_file):
+# 配置延迟到首次使用时才读取，导入本模块不再有文件 IO，也不会直接退出进程
+_config = None
+_credentials = None
+_config_lock = threading.Lock()
+
+
+def config_path():
+    # 配置文件位于当前工作目录
+    return os.path.join(os.getcwd(), ".ini")
+
+
+def load_config():
+    """读取并缓存 .ini；文件不存在时返回空配置"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            parser = configparser.ConfigParser()
+            config_file = config_path()
+            if os.path.exists(config_file):
+                try:
+                    parser.read(config_file, encoding="utf-8")
+                except Exception as e:
+                    raise ConfigError(f"读取配置文件失败: {e}\n请确保 .ini 文件存在且包含正确的配置信息") from e
+            _config = parser
+        return _config
+
+
+def get_credentials():
+    """返回 (APP_ID, APP_SECRET)，配置有问题时抛出 ConfigError"""
+    global _credentials
+    if _credentials is not None:
+        return _credentials
+    config_file = config_path()
+    if not os.path.exists(config_file):
+        raise ConfigError(
+            f"配置文件 {config_file} 不存在\n"
+            "请创建 .ini 文件并包含以下配置:\n"
+            "[Simpletex]\n"
+            "APP_ID = your_app_id_here\n"
+            "APP_SECRET = your_app_secret_here"
+        )
+    config = load_config()
     try:
-        config.read(config_file, encoding="utf-8")
-        # 获取配置信息
-        SIMPLETEX_APP_ID = config.get("Simpletex", "APP_ID")
-        SIMPLETEX_APP_SECRET = config.get("Simpletex", "APP_SECRET")
-        
-        # 检查配置是否为空或占位符
-        if (not SIMPLETEX_APP_ID or SIMPLETEX_APP_ID == "your_app_id_here" or
-            not SIMPLETEX_APP_SECRET or SIMPLETEX_APP_SECRET == "your_app_secret_here"):
-            print("错误：配置文件中的 API 凭据无效或仍为占位符")
-            print("请检查 .ini 文件并填入正确的 API 凭据")
-            sys.exit(1)
-            
+        app_id = config.get("Simpletex", "APP_ID")
+        app_secret = config.get("Simpletex", "APP_SECRET")
     except Exception as e:
-        print(f"读取配置文件失败: {e}")
-        print("请确保 .ini 文件存在且包含正确的配置信息")
-        sys.exit(1)
-else:
-    print(f"配置文件 {config_file} 不存在")
-    print("请创建 .ini 文件并包含以下配置:")
-    print("[Simpletex]")
-    print("APP_ID = your_app_id_here")
-    print("APP_SECRET = your_app_secret_here")
-    sys.exit(1)
+        raise ConfigError(f"读取配置文件失败: {e}\n请确保 .ini 文件存在且包含正确的配置信息") from e
+    # 检查配置是否为空或占位符
+    if (not app_id or app_id == "your_app_id_here" or
+            not app_secret or app_secret == "your_app_secret_here"):
+        raise ConfigError("错误：配置文件中的 API 凭据无效或仍为占位符\n请检查 .ini 文件并填入正确的 API 凭据")
+    _credentials = (app_id, app_secret)
+    return _credentials
+
+
+def __getattr__(name):
+    # 兼容旧的模块级常量，访问时才加载
+    if name == "SIMPLETEX_APP_ID":
+        return get_credentials()[0]
+    if name == "SIMPLETEX_APP_SECRET":
+        return get_credentials()[1]
+    if name == "config":
+        return load_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def sign_request(req_data=None):
+    """使用 .ini 中的凭据签名，返回 (headers, data)"""
+    app_id, app_secret = get_credentials()
+    return get_req_data(dict(req_data or {}), app_id, app_secret)
+
+
+# 识别接口地址；可通过环境变量 SIMPLETEX_API_BASE 指向本地模拟服务（见 mock_server.py）
+API_BASE = os.environ.get("SIMPLETEX_API_BASE", "https://server.simpletex.cn").rstrip("/")
+API_URLS = {
+    "turbo": API_BASE + "/api/latex_ocr_turbo",
+    "standard": API_BASE + "/api/latex_ocr",
+}
 
 def random_str(randomlength=16):
     str = ''
@@ -53,27 +101,34 @@ def random_str(randomlength=16):
     return str
 
 
+def compute_sign(params, secret):
+    """按 SimpleTeX 规则计算签名：参数按键名排序拼接后追加 secret 取 md5"""
+    pre_sign_string = ""
+    for key in sorted(params):
+        if pre_sign_string:
+            pre_sign_string += "&"
+        pre_sign_string += key + "=" + str(params[key])
+    pre_sign_string += "&secret=" + secret
+    return hashlib.md5(pre_sign_string.encode()).hexdigest()
+
+
 def get_req_data(req_data, appid, secret):
     header = {}
     header["timestamp"] = str(int(datetime.datetime.now().timestamp()))
     header["random-str"] = random_str(16)
     header["app-id"] = appid
-    pre_sign_string = ""
-    sorted_keys = list(req_data.keys()) + list(header)
-    sorted_keys.sort()
-    for key in sorted_keys:
-        if pre_sign_string:
-            pre_sign_string += "&"
-        if key in header:
-            pre_sign_string += key + "=" + str(header[key])
-        else:
-            pre_sign_string += key + "=" + str(req_data[key])
-
-    pre_sign_string += "&secret=" + secret
-    header["sign"] = hashlib.md5(pre_sign_string.encode()).hexdigest()
+    params = dict(req_data)
+    params.update(header)
+    header["sign"] = compute_sign(params, secret)
     return header, req_data
 
 if __name__ == "__main__":
+    import requests
+    try:
+        SIMPLETEX_APP_ID, SIMPLETEX_APP_SECRET = get_credentials()
+    except ConfigError as e:
+        print(e)
+        sys.exit(1)
     pwd = os.getcwd()
     work_dir = pwd + "/tex-ocr/"
     img_file = {"file": open(work_dir + "image/1.png", 'rb')}
@@ -81,6 +136,6 @@ if __name__ == "__main__":
 
     } # 请求参数数据（非文件型参数），视情况填入，可以参考各个接口的参数说明
     header, data = get_req_data(data, SIMPLETEX_APP_ID, SIMPLETEX_APP_SECRET)
-    res = requests.post("https://server.simpletex.cn/api/latex_ocr_turbo", files=img_file, data=data, headers=header)
+    res = requests.post(API_URLS["turbo"], files=img_file, data=data, headers=header)
 
     print(json.loads(res.text))
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""无界面批量识别：并发识别目录/通配符下的图片，逐张输出一行 JSONL。
+
+用法示例：
+    python simplatex/batch_ocr.py ./problems -o result.jsonl -j 4
+    python simplatex/batch_ocr.py "scans/**/*.png" --endpoint standard --resume -o result.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from SimpletexApi import sign_request, get_credentials, load_config, ConfigError, API_URLS
+from http_session import PooledSession
+from rate_limit import RequestScheduler
+from resilience import parse_retry_after
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+
+def collect_images(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                for name in filenames:
+                    if name.lower().endswith(IMAGE_EXTS):
+                        paths.append(os.path.join(dirpath, name))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            paths.extend(p for p in glob.glob(item, recursive=True)
+                         if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTS))
+    # 去重并保持稳定顺序，便于断点续跑
+    seen = set()
+    result = []
+    for p in sorted(os.path.abspath(p) for p in paths):
+        if p not in seen:
+            seen.add(p)
+            result.append(p)
+    return result
+
+
+def load_done(output_path):
+    """读取已有输出中成功的记录，用于断点续跑"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 中断时可能写了半行
+            if record.get('status') == 'ok':
+                done.add(record.get('path'))
+    return done
+
+
+class BatchRunner:
+    def __init__(self, endpoint='turbo', jobs=4, timeout=(3, 30), scheduler=None, throttle_retries=3):
+        self.endpoint = endpoint
+        self.api_url = API_URLS[endpoint]
+        self.jobs = jobs
+        self.timeout = timeout
+        self.session = PooledSession(pool_maxsize=jobs)
+        # 与界面/守护进程使用同一套 [RateLimit] 配置；批量任务按后台优先级领取令牌
+        self.scheduler = scheduler or RequestScheduler()
+        self.throttle_retries = throttle_retries  # 收到 429 后等待限流恢复再重发的次数
+
+    def recognize(self, path):
+        t0 = time.perf_counter()
+        record = {'path': path, 'endpoint': self.endpoint}
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            t_read = time.perf_counter()
+            for attempt in range(self.throttle_retries + 1):
+                self.scheduler.acquire('background')
+                t_wait = time.perf_counter()
+                headers, data = sign_request()
+                t_sign = time.perf_counter()
+                files = {"file": (os.path.basename(path), content)}
+                res = self.session.post(self.api_url, files=files, data=data, headers=headers, timeout=self.timeout)
+                t_upload = time.perf_counter()
+                if res.status_code != 429:
+                    self.scheduler.on_success()
+                    break
+                # 被限流：调度器降速并暂停，下一轮领令牌时自然等到恢复
+                self.scheduler.on_throttled(parse_retry_after(res.headers.get("Retry-After")))
+            record['attempts'] = attempt + 1
+            obj = json.loads(res.text)
+            res_obj = obj.get('res') or {}
+            record.update({
+                'status': 'ok' if obj.get('status', True) and 'latex' in res_obj else 'error',
+                'latex': res_obj.get('latex'),
+                'confidence': res_obj.get('conf'),
+                'request_id': obj.get('request_id'),
+            })
+            if record['status'] != 'ok':
+                record['error'] = obj.get('message') or obj.get('err_info') or str(obj)
+            record['timings_ms'] = {
+                'read': round((t_read - t0) * 1000, 2),
+                'rate_wait': round((t_wait - t_read) * 1000, 2),
+                'sign': round((t_sign - t_wait) * 1000, 2),
+                'upload': round((t_upload - t_sign) * 1000, 2),
+                'total': round((time.perf_counter() - t0) * 1000, 2),
+            }
+        except Exception as e:
+            record.update({'status': 'error', 'error': str(e),
+                           'timings_ms': {'total': round((time.perf_counter() - t0) * 1000, 2)}})
+        return record
+
+    def run(self, paths, out):
+        """out 为已打开的文本文件；返回 (成功数, 失败数)"""
+        write_lock = threading.Lock()
+        # 限制排队中的任务数，目录很大时不一次性堆满内存
+        slots = threading.BoundedSemaphore(self.jobs * 2)
+        counts = {'ok': 0, 'error': 0}
+
+        def task(path):
+            try:
+                record = self.recognize(path)
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    counts[record['status']] += 1
+                    done = counts['ok'] + counts['error']
+                print(f"[{done}/{len(paths)}] {record['status']}: {path}", file=sys.stderr)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for path in paths:
+                slots.acquire()
+                pool.submit(task, path)
+        return counts['ok'], counts['error']
+
+    def close(self):
+        self.session.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SimpleTeX 批量公式识别")
+    parser.add_argument('inputs', nargs='+', help="图片文件、目录或通配符")
+    parser.add_argument('-o', '--output', default='-', help="JSONL 输出文件，默认标准输出")
+    parser.add_argument('-j', '--jobs', type=int, default=4, help="并发数")
+    parser.add_argument('--endpoint', choices=sorted(API_URLS), default='turbo', help="识别接口")
+    parser.add_argument('--resume', action='store_true', help="跳过输出文件中已成功的图片")
+    args = parser.parse_args(argv)
+
+    try:
+        get_credentials()
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    paths = collect_images(args.inputs)
+    if args.resume:
+        if args.output == '-':
+            parser.error("--resume 需要配合 -o 输出文件使用")
+        done = load_done(args.output)
+        skipped = len(paths)
+        paths = [p for p in paths if p not in done]
+        skipped -= len(paths)
+        print(f"断点续跑：跳过已完成的 {skipped} 张图片", file=sys.stderr)
+    if not paths:
+        print("没有需要识别的图片", file=sys.stderr)
+        return 0
+
+    runner = BatchRunner(endpoint=args.endpoint, jobs=max(1, args.jobs),
+                         scheduler=RequestScheduler.from_config(load_config()))
+    t0 = time.perf_counter()
+    out = sys.stdout if args.output == '-' else open(args.output, 'a' if args.resume else 'w', encoding='utf-8')
+    try:
+        ok, failed = runner.run(paths, out)
+    finally:
+        runner.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - t0
+    print(f"完成：成功 {ok}，失败 {failed}，耗时 {elapsed:.1f}s", file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""编码基准：在截图语料上比较各编码的耗时与体积，并按不同上行带宽估算“编码 + 上传”总耗时。
+
+用法示例：
+    python simplatex/bench_encode.py ./shots -n 5
+    python simplatex/bench_encode.py "shots/**/*.png" --preprocess --uplink-kbps 500,2000,20000
+    python simplatex/bench_encode.py ./shots --write-profile encoder_profile.json
+生成的文件可填入 .ini 的 [Encoder] PROFILE，作为自适应编码的初始估计。
+"""
+import argparse
+import json
+import statistics
+import sys
+
+from batch_ocr import collect_images
+from image_encoder import ENCODINGS, encode_image
+from screenshot import RawFrame
+
+
+def load_frames(paths, preprocess=False):
+    """读取图片并转成与抓屏一致的 BGRA 帧；preprocess 时再经过上传前预处理"""
+    from PIL import Image
+    preprocessor = None
+    if preprocess:
+        from preprocess import Preprocessor
+        preprocessor = Preprocessor()
+    frames = []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                rgba = img.convert("RGBA")
+        except OSError as e:
+            print(f"跳过无法读取的图片 {path}: {e}", file=sys.stderr)
+            continue
+        frame = RawFrame(rgba.size, bytearray(rgba.tobytes("raw", "BGRA")))
+        frames.append(preprocessor.process(frame) if preprocessor is not None else frame)
+    return frames
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+
+def run(name, images, iterations):
+    """返回该编码在整个语料上的统计：每张图取 iterations 次中的中位数"""
+    per_image_ms = []
+    total_bytes = total_px = 0
+    for image, extra in images:
+        samples = []
+        for _ in range(iterations):
+            encoded = encode_image(image, name, extra)
+            samples.append(encoded.encode_ms)
+        per_image_ms.append(statistics.median(samples))
+        total_bytes += len(encoded)
+        total_px += image.size[0] * image.size[1]
+    return {
+        'name': name,
+        'p50_ms': statistics.median(per_image_ms),
+        'p95_ms': percentile(per_image_ms, 0.95),
+        'mean_ms': statistics.mean(per_image_ms),
+        'mean_bytes': total_bytes / len(images),
+        'ms_per_mpx': sum(per_image_ms) / (total_px / 1e6),
+        'bytes_per_px': total_bytes / total_px,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="截图编码基准")
+    parser.add_argument("inputs", nargs="+", help="截图目录、文件或通配符")
+    parser.add_argument("-n", "--iterations", type=int, default=3, help="每张图每种编码重复次数")
+    parser.add_argument("--formats", default=",".join(ENCODINGS), help="参与比较的编码，逗号分隔")
+    parser.add_argument("--preprocess", action="store_true", help="先经过上传前预处理（裁边/灰度/调色板）")
+    parser.add_argument("--uplink-kbps", default="256,1000,5000,50000", help="估算用的上行带宽，逗号分隔")
+    parser.add_argument("--write-profile", metavar="PATH", help="把实测的编码速度与压缩率写入 JSON")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.formats.split(",") if n.strip()]
+    unknown = [n for n in names if n not in ENCODINGS]
+    if unknown:
+        parser.error(f"未知的编码: {', '.join(unknown)}，可选 {', '.join(ENCODINGS)}")
+    bandwidths = [float(k) for k in args.uplink_kbps.split(",") if k.strip()]
+
+    frames = load_frames(collect_images(args.inputs), preprocess=args.preprocess)
+    if not frames:
+        print("没有可用的图片", file=sys.stderr)
+        return 1
+    # 解码为 PIL 图像不计入编码耗时
+    images = [(frame.to_image(), getattr(frame, 'save_kwargs', None)) for frame in frames]
+    pixels = statistics.mean(img.size[0] * img.size[1] for img, _ in images)
+    print(f"{len(images)} 张图片，平均 {pixels / 1e6:.3f} 百万像素，每种编码重复 {args.iterations} 次")
+
+    results = []
+    for name in names:
+        try:
+            results.append(run(name, images, max(1, args.iterations)))
+        except (OSError, KeyError, ValueError) as e:
+            # 例如 Pillow 未编译 WebP 支持
+            print(f"{name:>14}: 不可用 ({e})")
+    if not results:
+        return 1
+    baseline = next((r for r in results if r['name'] == 'png6'), results[0])
+    for r in results:
+        print(f"{r['name']:>14}: p50 {r['p50_ms']:7.2f}ms  p95 {r['p95_ms']:7.2f}ms  "
+              f"平均 {r['mean_bytes'] / 1024:8.1f}KB  体积 {r['mean_bytes'] / baseline['mean_bytes']:5.2f}x")
+
+    print("\n预计编码 + 上传耗时（平均编码耗时 + 平均体积 / 带宽）：")
+    print(" " * 16 + "".join(f"{f'{k:g}kbps':>12}" for k in bandwidths))
+    for r in results:
+        cells = [r['mean_ms'] + r['mean_bytes'] / (k * 1000 / 8) * 1000 for k in bandwidths]
+        print(f"{r['name']:>14}: " + "".join(f"{c:10.1f}ms" for c in cells))
+    for k in bandwidths:
+        best = min(results, key=lambda r: r['mean_ms'] + r['mean_bytes'] / (k * 1000 / 8) * 1000)
+        print(f"  {k:g}kbps 下最优: {best['name']}")
+
+    if args.write_profile:
+        profile = {r['name']: {'ms_per_mpx': round(r['ms_per_mpx'], 2), 'bytes_per_px': round(r['bytes_per_px'], 4)}
+                   for r in results}
+        with open(args.write_profile, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=2, ensure_ascii=False)
+        print(f"\n已写入 {args.write_profile}，可填入 .ini 的 [Encoder] PROFILE")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
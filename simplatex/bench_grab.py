@@ -0,0 +1,59 @@
+"""抓屏基准：对比“每次新建 mss”与常驻线程句柄的单次抓取耗时。
+
+用法示例：
+    python simplatex/bench_grab.py --width 1920 --height 1080 -n 50
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from screenshot import MultiMonitorScreenshot
+
+
+def grab_fresh(region):
+    # 旧实现：每次抓取都新建并销毁 mss（X11 下即新建显示连接）
+    import mss
+    with mss.mss() as sct:
+        return sct.grab(region)
+
+
+def run(label, fn, region, iterations, warmup=3):
+    for _ in range(warmup):
+        fn(region)
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn(region)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+    print(f"{label:>10}: 平均 {statistics.mean(samples):7.2f}ms  p50 {statistics.median(samples):7.2f}ms  "
+          f"p95 {p95:7.2f}ms  最小 {samples[0]:7.2f}ms")
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="mss 抓屏基准")
+    parser.add_argument("--left", type=int, default=0)
+    parser.add_argument("--top", type=int, default=0)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("-n", "--iterations", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    region = {'left': args.left, 'top': args.top, 'width': args.width, 'height': args.height}
+    print(f"区域: {region}，每组 {args.iterations} 次")
+    handler = MultiMonitorScreenshot([])
+    try:
+        fresh = run("每次新建", grab_fresh, region, args.iterations)
+        persistent = run("常驻句柄", handler._grab_with_retry, region, args.iterations)
+    finally:
+        handler.close()
+    print(f"p50 加速: {statistics.median(fresh) / max(statistics.median(persistent), 1e-6):.2f}x，"
+          f"常驻句柄新建 {handler.opened} 次、重连 {handler.reconnects} 次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
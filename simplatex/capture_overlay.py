@@ -2,97 +2,305 @@ import tkinter as tk
 from functools import partial
 
 
-class CaptureOverlay:
-    def __init__(self, root, total_width, total_height, min_x, min_y, on_finish, on_cancel):
-        self.root = root
-        self.total_width = total_width
-        self.total_height = total_height
-        self.min_x = min_x
-        self.min_y = min_y
-        self.on_finish = on_finish
-        self.on_cancel = on_cancel
+class MonitorOverlay:
+    """单个显示器上常驻的覆盖窗口：启动时创建一次，平时隐藏，截图时显示"""
 
-        self.top = tk.Toplevel(self.root)
-        self.top.geometry(f"{self.total_width}x{self.total_height}+{self.min_x}+{self.min_y}")
-        self.top.attributes('-alpha', 0.3)
-        self.top.attributes('-topmost', True)
+    def __init__(self, root, monitor):
+        self.monitor = monitor
+        self.x, self.y = int(monitor['x']), int(monitor['y'])
+        self.width, self.height = int(monitor['width']), int(monitor['height'])
+        self.offset = (int(monitor.get('relative_x', 0)), int(monitor.get('relative_y', 0)))
+
+        self.top = tk.Toplevel(root)
+        self.top.withdraw()
         self.top.overrideredirect(True)
+        self.top.geometry(f"{self.width}x{self.height}+{self.x}+{self.y}")
+        self.top.attributes('-topmost', True)
+        self.canvas = tk.Canvas(self.top, bg='gray', width=self.width, height=self.height, highlightthickness=0)
+        self.canvas.pack(fill='both', expand=True)
+        self.photo = None
+        self.image_item = None
+        self.rect = None
+        self.hint_label = None
+
+    def contains(self, x, y):
+        return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
+
+    def to_canvas(self, x, y):
+        return x - self.x, y - self.y
+
+    def show(self, background=None):
+        # 冻结画面模式下铺上本显示器对应的那块整屏图像，不再半透明
+        if background is not None:
+            from PIL import ImageTk
+            left, top = self.offset
+            self.photo = ImageTk.PhotoImage(background.crop((left, top, left + self.width, top + self.height)))
+            self.image_item = self.canvas.create_image(0, 0, image=self.photo, anchor='nw')
+        self.top.attributes('-alpha', 1.0 if background is not None else 0.3)
+        self.top.deiconify()
+        self.top.lift()
 
+    def hide(self):
+        self.top.withdraw()
+        self.hide_hint()
+        # 清掉上一次的选框、序号与背景图，窗口本身保留复用
+        self.canvas.delete('all')
+        self.photo = None
+        self.image_item = None
+        self.rect = None
+
+    def show_hint(self, text):
+        if self.hint_label is None:
+            self.hint_label = tk.Label(self.top, text=text, bg='yellow', fg='black', font=('Arial', 12, 'bold'))
+            self.hint_label.place(relx=0.5, rely=0.1, anchor='center')
+
+    def hide_hint(self):
+        if self.hint_label is not None:
+            try:
+                self.hint_label.destroy()
+            except Exception:
+                pass
+            self.hint_label = None
+
+    def destroy(self):
         try:
-            self.top.focus_force()
-            self.top.grab_set()
+            self.top.destroy()
         except Exception:
             pass
 
-        self.canvas = tk.Canvas(self.top, bg='gray', width=self.total_width, height=self.total_height)
-        self.canvas.pack(fill='both', expand=True)
+
+class OverlayEngine:
+    """按显示器预先创建覆盖窗口；布局变化时重建，截图时只显示/隐藏"""
+
+    def __init__(self, root, fps=60):
+        self.root = root
+        self.frame_ms = max(1, int(1000 / fps)) if fps else 16
+        self.overlays = []
+        self.signature = None
+        self.active = None
+        self._pending_layout = None
+
+    def rebuild(self, layout):
+        """按新布局重建覆盖窗口；截图进行中则等本次结束后再重建"""
+        if layout is None or layout.signature == self.signature:
+            return
+        if self.active is not None:
+            self._pending_layout = layout
+            return
+        for overlay in self.overlays:
+            overlay.destroy()
+        self.overlays = [MonitorOverlay(self.root, m) for m in layout.monitors]
+        self.signature = layout.signature
+
+    def open(self, on_finish, on_cancel, **kwargs):
+        """显示所有覆盖窗口并开始一次框选，返回 CaptureOverlay"""
+        if self.active is not None:
+            self.active.destroy()
+        self.active = CaptureOverlay(self, on_finish, on_cancel, **kwargs)
+        return self.active
+
+    def close(self, session):
+        if self.active is not session:
+            return
+        self.active = None
+        for overlay in self.overlays:
+            overlay.hide()
+        # 立即把隐藏请求交给窗口系统，避免随后的抓屏截到覆盖层
         try:
-            self.canvas.focus_set()
+            self.root.update_idletasks()
         except Exception:
             pass
+        if self._pending_layout is not None:
+            layout, self._pending_layout = self._pending_layout, None
+            self.rebuild(layout)
 
-        self.start_x = tk.IntVar()
-        self.start_y = tk.IntVar()
-        self.rect = None
+    def destroy(self):
+        for overlay in self.overlays:
+            overlay.destroy()
+        self.overlays = []
+        self.signature = None
 
-        self.top.bind('<Button-1>', self.on_button_press)
-        self.top.bind('<B1-Motion>', self.on_mouse_drag)
-        self.top.bind('<ButtonRelease-1>', self.on_button_release)
 
-        self.top.bind('<Button-3>', lambda e: self.cancel())
-        self.canvas.bind('<Button-3>', lambda e: self.cancel())
-        self.top.bind('<Escape>', lambda e: self.cancel())
+class CaptureOverlay:
+    """一次框选会话：在预建的各显示器覆盖窗口上画选框；拖动状态用普通属性保存，重绘按帧合并"""
 
-        self.top.bind('<Enter>', lambda e: self.show_hint())
-        self.top.bind('<Leave>', lambda e: self.hide_hint())
+    def __init__(self, engine, on_finish, on_cancel, background=None, on_pause=None, pause_ms=300,
+                 min_pause_size=8, on_region=None, on_visible=None):
+        self.engine = engine
+        self.root = engine.root
+        self.on_finish = on_finish
+        self.on_cancel = on_cancel
+        # 拖动中鼠标静止 pause_ms 毫秒后回调 on_pause(当前选区)，用于提前识别
+        self.on_pause = on_pause
+        self.pause_ms = pause_ms
+        self.min_pause_size = min_pause_size
+        self._pause_job = None
+        # 多区域模式：每松开一次鼠标回调 on_region(选区)，回车结束后 on_finish(全部选区)
+        self.on_region = on_region
+        self.regions = []
+        # 覆盖层首次映射到屏幕时回调，用于统计热键到可见的延迟
+        self.on_visible = on_visible
+        self.closed = False
 
-        self.hint_label = None
+        # 虚拟桌面坐标下的起点与最新指针位置
+        self.start = None
+        self.pointer = None
+        self._redraw_job = None
 
-    def show_hint(self):
-        if self.top.winfo_exists() and self.hint_label is None:
-            self.hint_label = tk.Label(self.top, text="右键或按ESC取消截图", 
-                                       bg='yellow', fg='black', font=('Arial', 12, 'bold'))
-            self.hint_label.place(relx=0.5, rely=0.1, anchor='center')
+        self.overlays = engine.overlays
+        for overlay in self.overlays:
+            top = overlay.top
+            top.bind('<Button-1>', self.on_button_press)
+            top.bind('<B1-Motion>', self.on_mouse_drag)
+            top.bind('<ButtonRelease-1>', self.on_button_release)
+            top.bind('<Button-3>', lambda e: self.cancel())
+            top.bind('<Escape>', lambda e: self.cancel())
+            if self.on_region is not None:
+                top.bind('<Return>', lambda e: self.finish_regions())
+                top.bind('<KP_Enter>', lambda e: self.finish_regions())
+            else:
+                top.unbind('<Return>')
+                top.unbind('<KP_Enter>')
+            top.bind('<Enter>', partial(self._on_enter, overlay))
+            top.bind('<Leave>', lambda e, o=overlay: o.hide_hint())
+            top.bind('<Map>', self._on_map)
+            overlay.show(background)
 
-    def hide_hint(self):
-        if self.hint_label is not None and self.hint_label.winfo_exists():
-            self.hint_label.destroy()
-            self.hint_label = None
+        # 键盘焦点给鼠标所在的显示器
+        px, py = self.root.winfo_pointerxy()
+        for overlay in self.overlays:
+            if overlay.contains(px, py):
+                try:
+                    overlay.top.focus_force()
+                except Exception:
+                    pass
+                break
+
+    def _on_map(self, event):
+        if self.on_visible is not None and not self.closed:
+            callback, self.on_visible = self.on_visible, None
+            callback()
+
+    def _on_enter(self, overlay, event):
+        if not self.closed:
+            text = "逐个框选公式，回车完成，右键或ESC取消" if self.on_region is not None else "右键或按ESC取消截图"
+            overlay.show_hint(text)
 
     def on_button_press(self, event):
-        self.start_x.set(event.x)
-        self.start_y.set(event.y)
-        self.rect = self.canvas.create_rectangle(self.start_x.get(), self.start_y.get(), self.start_x.get(), self.start_y.get(), outline='red')
+        if self.closed:
+            return
+        self.start = (event.x_root, event.y_root)
+        self.pointer = self.start
+        for overlay in self.overlays:
+            cx, cy = overlay.to_canvas(*self.start)
+            overlay.rect = overlay.canvas.create_rectangle(cx, cy, cx, cy, outline='red')
 
     def on_mouse_drag(self, event):
-        self.canvas.coords(self.rect, self.start_x.get(), self.start_y.get(), event.x, event.y)
+        if self.closed or self.start is None:
+            return
+        self.pointer = (event.x_root, event.y_root)
+        # 指针事件可能远高于刷新率，只记录最新位置，每帧最多重绘一次
+        if self._redraw_job is None:
+            self._redraw_job = self.root.after(self.engine.frame_ms, self._redraw)
+        if callable(self.on_pause) and self.pause_ms > 0:
+            # 每次移动都重置计时，只有停住不动才会触发
+            self._cancel_pause_timer()
+            self._pause_job = self.root.after(self.pause_ms, self._fire_pause)
 
-    def on_button_release(self, event):
-        end_x = event.x
-        end_y = event.y
+    def _redraw(self):
+        self._redraw_job = None
+        if self.closed or self.start is None:
+            return
+        for overlay in self.overlays:
+            if overlay.rect is not None:
+                x0, y0 = overlay.to_canvas(*self.start)
+                x1, y1 = overlay.to_canvas(*self.pointer)
+                overlay.canvas.coords(overlay.rect, x0, y0, x1, y1)
+
+    def _cancel_pause_timer(self):
+        if self._pause_job is not None:
+            try:
+                self.root.after_cancel(self._pause_job)
+            except Exception:
+                pass
+            self._pause_job = None
+
+    def _cancel_redraw(self):
+        if self._redraw_job is not None:
+            try:
+                self.root.after_cancel(self._redraw_job)
+            except Exception:
+                pass
+            self._redraw_job = None
 
-        left = min(self.start_x.get(), end_x)
-        top = min(self.start_y.get(), end_y)
-        right = max(self.start_x.get(), end_x)
-        bottom = max(self.start_y.get(), end_y)
+    def _fire_pause(self):
+        self._pause_job = None
+        if self.closed or self.start is None:
+            return
+        left, top, right, bottom = self._selection(*self.pointer)
+        if right - left < self.min_pause_size or bottom - top < self.min_pause_size:
+            return
+        self.on_pause(left, top, right, bottom)
 
-        actual_left = left + self.min_x
-        actual_top = top + self.min_y
-        actual_right = right + self.min_x
-        actual_bottom = bottom + self.min_y
+    def _selection(self, end_x, end_y):
+        """返回虚拟桌面坐标下的选区 (left, top, right, bottom)"""
+        sx, sy = self.start
+        return min(sx, end_x), min(sy, end_y), max(sx, end_x), max(sy, end_y)
+
+    def on_button_release(self, event):
+        if self.closed or self.start is None:
+            return
+        self._cancel_redraw()
+        actual_left, actual_top, actual_right, actual_bottom = self._selection(event.x_root, event.y_root)
+        if self.on_region is not None:
+            self._add_region(actual_left, actual_top, actual_right, actual_bottom)
+            return
 
         self.destroy()
         if callable(self.on_finish):
             self.on_finish(actual_left, actual_top, actual_right, actual_bottom)
 
+    def _add_region(self, left, top, right, bottom):
+        self._cancel_pause_timer()
+        self.start = None
+        small = right - left < 4 or bottom - top < 4
+        if not small:
+            self.regions.append((left, top, right, bottom))
+        for overlay in self.overlays:
+            rect, overlay.rect = overlay.rect, None
+            if rect is None:
+                continue
+            if small:
+                # 单击或误触，不算一个区域
+                overlay.canvas.delete(rect)
+                continue
+            # 已提交的区域改为绿色并标上序号
+            x0, y0 = overlay.to_canvas(left, top)
+            overlay.canvas.coords(rect, x0, y0, *overlay.to_canvas(right, bottom))
+            overlay.canvas.itemconfig(rect, outline='#00c853', width=2)
+            overlay.canvas.create_text(x0 + 4, y0 + 2, anchor='nw', text=str(len(self.regions)),
+                                       fill='#00c853', font=('Arial', 12, 'bold'))
+        if not small:
+            self.on_region(left, top, right, bottom)
+
+    def finish_regions(self):
+        if self.closed:
+            return
+        self.destroy()
+        if callable(self.on_finish):
+            self.on_finish(list(self.regions))
+
     def destroy(self):
-        try:
-            if self.top.winfo_exists():
-                self.top.destroy()
-        except Exception:
-            pass
+        if self.closed:
+            return
+        self.closed = True
+        self._cancel_pause_timer()
+        self._cancel_redraw()
+        self.engine.close(self)
 
     def cancel(self):
+        if self.closed:
+            return
         self.destroy()
         if callable(self.on_cancel):
-            self.on_cancel() 
\ No newline at end of file
+            self.on_cancel()
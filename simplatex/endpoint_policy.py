@@ -0,0 +1,131 @@
+import threading
+
+# 界面/配置中表示“自动选择接口”的取值
+AUTO_ENDPOINT = "auto"
+
+
+class EndpointStats:
+    """单个接口的滑动统计：延迟 EWMA 与错误率 EWMA"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.latency = None   # 秒
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0         # 最终采用该接口结果的次数
+
+    def observe(self, seconds, ok):
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        a = self.alpha
+        self.error_rate = (1 - a) * self.error_rate + a * (0.0 if ok else 1.0)
+        # 失败请求的耗时不代表正常响应时间，只计入错误率
+        if ok:
+            self.latency = seconds if self.latency is None else (1 - a) * self.latency + a * seconds
+
+    def snapshot(self):
+        return {
+            'latency_ms': None if self.latency is None else round(self.latency * 1000, 1),
+            'error_rate': round(self.error_rate, 3),
+            'requests': self.requests,
+            'errors': self.errors,
+            'wins': self.wins,
+        }
+
+
+class EndpointPolicy:
+    """自动接口策略：按延迟与错误率挑首发接口，超过对冲期限未返回时加发另一个接口，
+    轻量接口置信度过低时改用标准接口重识别"""
+
+    def __init__(self, urls, primary="turbo", secondary="standard", hedge_after=None,
+                 hedge_factor=1.5, hedge_bounds=(0.4, 4.0), min_confidence=0.8,
+                 error_penalty=4.0, alpha=0.2, unsampled_penalty=30.0):
+        self.urls = dict(urls)
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_after = hedge_after        # 固定对冲期限（秒）；None 表示按首发接口延迟 EWMA 自适应
+        self.hedge_factor = hedge_factor
+        self.hedge_bounds = hedge_bounds
+        self.min_confidence = min_confidence  # 低于该置信度时用标准接口复核；0 表示不复核
+        self.error_penalty = error_penalty
+        self.unsampled_penalty = unsampled_penalty  # 只失败过、没有延迟样本的接口按该延迟（秒）计分
+        self._lock = threading.Lock()
+        self.stats = {name: EndpointStats(alpha) for name in self.urls}
+        self.hedged = 0
+        self.escalated = 0
+
+    @classmethod
+    def from_config(cls, config, urls):
+        """从 .ini 的 [Endpoint] 段读取参数，缺省项使用默认值"""
+        section = "Endpoint"
+        if config is None or not config.has_section(section):
+            return cls(urls)
+        hedge_ms = config.getint(section, "HEDGE_AFTER_MS", fallback=0)
+        return cls(
+            urls,
+            hedge_after=hedge_ms / 1000 if hedge_ms > 0 else None,
+            min_confidence=config.getfloat(section, "MIN_CONFIDENCE", fallback=0.8),
+        )
+
+    def _score(self, name):
+        s = self.stats[name]
+        latency = s.latency
+        if latency is None:
+            # 还没成功过的接口：没出过错时按 0 延迟计，保证两边都会被试到；
+            # 已经出错则按请求超时上限计，不能因为没有延迟样本反而排在健康接口前面
+            latency = 0.0 if s.error_rate == 0 else self.unsampled_penalty
+        return latency * (1 + self.error_penalty * s.error_rate) + s.error_rate
+
+    def order(self):
+        """返回 (首发接口, 备用接口)"""
+        with self._lock:
+            if self._score(self.secondary) < self._score(self.primary):
+                return self.secondary, self.primary
+            return self.primary, self.secondary
+
+    def hedge_delay(self, name):
+        if self.hedge_after is not None:
+            return self.hedge_after
+        low, high = self.hedge_bounds
+        with self._lock:
+            latency = self.stats[name].latency
+        if latency is None:
+            return high
+        return min(high, max(low, latency * self.hedge_factor))
+
+    def needs_escalation(self, name, obj):
+        if not self.min_confidence or name != self.primary:
+            return False
+        conf = (obj.get("res") or {}).get("conf")
+        return conf is not None and conf < self.min_confidence
+
+    def observe(self, name, seconds, ok):
+        with self._lock:
+            self.stats[name].observe(seconds, ok)
+
+    def record_win(self, name, hedged=False, escalated=False):
+        with self._lock:
+            self.stats[name].wins += 1
+            if hedged:
+                self.hedged += 1
+            if escalated:
+                self.escalated += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'hedged': self.hedged,
+                'escalated': self.escalated,
+                'endpoints': {name: s.snapshot() for name, s in self.stats.items()},
+            }
+
+    def format_brief(self):
+        snap = self.snapshot()
+        parts = []
+        for name, s in snap['endpoints'].items():
+            latency = "-" if s['latency_ms'] is None else f"{s['latency_ms']:.0f}ms"
+            parts.append(f"{name} {latency}/错误率 {s['error_rate']:.0%}")
+        parts.append(f"对冲 {snap['hedged']} 次, 复核 {snap['escalated']} 次")
+        return ", ".join(parts)
@@ -1,21 +1,42 @@
+import time
+_STARTUP_T0 = time.perf_counter()
+
 import tkinter as tk
-from PIL import Image
-import json
-import requests
+from tkinter import filedialog
 import os
 import platform
-from SimpletexApi import get_req_data, SIMPLETEX_APP_ID, SIMPLETEX_APP_SECRET
+import queue
+from SimpletexApi import sign_request, get_credentials, load_config, ConfigError, API_URLS
+from endpoint_policy import AUTO_ENDPOINT, EndpointPolicy
+from image_encoder import AdaptiveEncoder
+from ocr_backends import LocalModelBackend
+from rate_limit import RequestScheduler
+from resilience import OfflineQueue, OfflineQueued
+from speculative import SpeculativeOcr
+from multi_region import MultiRegionSession
+from region_scan import BlockDetector, positioned_results
+from history import HistoryStore
+from history_window import HistoryWindow
 from DisplayScaling import get_monitors_info  # 使用跨平台实现
-import time
+from monitor_topology import MonitorTopology
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
-# 新组件
+# 新组件（均不在导入时加载 requests/PIL/mss/numpy/pynput 等重模块）
 from ui_logger import UILogger
-from screenshot import MultiMonitorScreenshot
+from screenshot import MultiMonitorScreenshot, CaptureError
 from hotkeys import HotkeyManager
-from capture_overlay import CaptureOverlay
+from capture_overlay import OverlayEngine
 from ocr_worker import OcrWorker
+from preprocess import Preprocessor
+from metrics import MetricsRegistry, StartupProfiler
+
+# 冻结画面模式下，主窗口可见时等待其收起的时间
+FROZEN_HIDE_DELAY_MS = 80
+
+# 后台预热的重模块，顺序即导入顺序
+HEAVY_MODULES = ('requests', 'PIL.Image', 'mss', 'numpy')
 
 # 可选热键库仍用于 DPI 感知与平台差异
 # 仅在 Windows 尝试设置 DPI 感知
@@ -33,8 +54,10 @@ if platform.system() == "Windows":
 
 
 class ScreenCapture:
-    def __init__(self, root):
+    def __init__(self, root, profiler=None):
         self.root = root
+        self.profiler = profiler or StartupProfiler()
+        self.profiler.mark('imports')
         self.root.title("屏幕公式ocr")
         self.root.geometry('450x500')
         
@@ -59,10 +82,17 @@ class ScreenCapture:
         self.api_label = tk.Label(self.api_frame, text="选择接口:")
         self.api_label.pack(side=tk.LEFT, padx=(0, 5))
         
-        # 接口选择变量
-        self.api_var = tk.StringVar(value="turbo")
+        # 接口选择变量；默认自动选择（对冲 + 低置信度复核）
+        self.api_var = tk.StringVar(value=AUTO_ENDPOINT)
+        # 热键监听线程与识别线程也要读取接口选择，Tk 变量只能在主线程访问，另存一份普通属性
+        self.api_choice = AUTO_ENDPOINT
+        self.api_var.trace_add('write', lambda *args: setattr(self, 'api_choice', self.api_var.get()))
         
         # 接口选择单选按钮
+        self.auto_radio = tk.Radiobutton(self.api_frame, text="自动",
+                                         variable=self.api_var, value=AUTO_ENDPOINT)
+        self.auto_radio.pack(side=tk.LEFT, padx=(0, 10))
+
         self.turbo_radio = tk.Radiobutton(self.api_frame, text="轻量接口", 
                                         variable=self.api_var, value="turbo")
         self.turbo_radio.pack(side=tk.LEFT, padx=(0, 10))
@@ -71,9 +101,65 @@ class ScreenCapture:
                                            variable=self.api_var, value="standard")
         self.standard_radio.pack(side=tk.LEFT)
 
+        # 上传前预处理开关（裁边、灰度、按字高缩小）
+        self.preprocess_var = tk.BooleanVar(value=True)
+        self.preprocess_check = tk.Checkbutton(root, text="上传前压缩图片", variable=self.preprocess_var,
+                                               command=self.on_preprocess_toggle)
+        self.preprocess_check.pack()
+
+        # 冻结画面模式：热键一按就抓整屏，在静止画面上框选并直接从内存裁剪
+        self.frozen_var = tk.BooleanVar(value=False)
+        self.frozen_check = tk.Checkbutton(root, text="冻结画面模式", variable=self.frozen_var)
+        self.frozen_check.pack()
+        self.frozen_frame = None
+
+        # 多区域模式：一次覆盖层中框选多个公式，并发识别后按阅读顺序合并（基于冻结画面）
+        self.multi_var = tk.BooleanVar(value=False)
+        self.multi_check = tk.Checkbutton(root, text="多区域模式（回车完成）", variable=self.multi_var)
+        self.multi_check.pack()
+        self.multi_session = None
+        # 冻结画面模式下，拖动停顿时提前识别；0 表示关闭
+        self.speculative_pause_ms = 300
+        # 每个显示器一个常驻覆盖窗口，布局确定后创建，截图时只显示/隐藏
+        self.overlay_engine = OverlayEngine(root)
+        self.overlay = None
+
         self.capture_button = tk.Button(root, text="开始截图", command=self.start_capture)
         self.capture_button.pack(pady=10)
 
+        # 整屏识别：抓取鼠标所在显示器，自动检测文字/公式块并逐块识别（热键 Ctrl+Shift+F12）
+        self.scan_button = tk.Button(root, text="整屏识别", command=self.start_scan)
+        self.scan_button.pack()
+        self.block_detector = BlockDetector()
+        self.scan_session = None
+        # 主线程置位：抓屏与检测阶段还没有 scan_session，也要挡住重复触发
+        self.scan_busy = False
+        self.last_scan = []
+
+        self.history_button = tk.Button(root, text="历史记录", command=self.open_history)
+        self.history_button.pack()
+        self.history = None  # 识别历史库在后台打开
+        self.history_window = None
+
+        # 识别队列状态：截图与识别解耦，识别中仍可继续截图
+        self.queue_frame = tk.Frame(root)
+        self.queue_frame.pack(pady=(0, 5))
+        self.queue_label = tk.Label(self.queue_frame, text="识别队列: 0")
+        self.queue_label.pack(side=tk.LEFT, padx=(0, 10))
+        self.cancel_ocr_button = tk.Button(self.queue_frame, text="取消识别", command=self.cancel_pending_ocr)
+        self.cancel_ocr_button.pack(side=tk.LEFT)
+
+        # 阶段耗时统计
+        self.metrics = MetricsRegistry()
+        self.metrics.startup = self.profiler
+        self.current_trace = None
+        self.metrics_frame = tk.Frame(root)
+        self.metrics_frame.pack(pady=(0, 5), fill='x')
+        self.metrics_label = tk.Label(self.metrics_frame, text="暂无耗时数据", anchor='w', justify='left', wraplength=330)
+        self.metrics_label.pack(side=tk.LEFT, padx=(8, 5), fill='x', expand=True)
+        self.export_metrics_button = tk.Button(self.metrics_frame, text="导出指标", command=self.export_metrics)
+        self.export_metrics_button.pack(side=tk.RIGHT, padx=8)
+
         # 日志组件
         self.logger = UILogger(self.root, root)
         self.logger.pack(padx=8, pady=5, fill='both', expand=True)
@@ -81,34 +167,208 @@ class ScreenCapture:
         self.screen_width = 0
         self.screen_height = 0
         
-        # 获取多显示器信息和缩放比例（跨平台）
-        self.monitors_info = self.get_monitors_info()
+        # 显示器信息在后台枚举，首次截图前若尚未完成则同步获取；之后由拓扑服务监测拔插
+        self.monitors_info = []
+        self.layout = None
+        self.topology = MonitorTopology()
+        self.topology.listeners.append(self.on_layout_changed)
         self.scaling_factor = 1.0  # 默认值，会在截图时动态确定
         
-        # 创建截图处理器
+        # 创建截图处理器；抓图固定在一个常驻线程上，复用该线程的 mss 句柄
         self.screenshot_handler = MultiMonitorScreenshot(self.monitors_info)
-        
-        # 显示检测到的显示器信息
-        self.display_monitor_info()
+        self.capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+
+        # 常驻识别器：跨截图复用同一个连接池（连接池在后台创建）
+        try:
+            ini = load_config()
+        except ConfigError as e:
+            ini = None
+            self.log(str(e), level='ERROR')
+        if ini is not None:
+            self.frozen_var.set(ini.getboolean("Capture", "FROZEN_FRAME", fallback=False))
+            self.speculative_pause_ms = ini.getint("Capture", "SPECULATIVE_PAUSE_MS", fallback=self.speculative_pause_ms)
+            self.overlay_engine.frame_ms = max(1, 1000 // max(1, ini.getint("Capture", "OVERLAY_FPS", fallback=60)))
+            self.logger.set_max_lines(ini.getint("Log", "MAX_LINES", fallback=self.logger.max_lines))
+            self.logger.set_level(ini.get("Log", "LEVEL", fallback=self.logger.get_level()).upper())
+        self.history_config = ini
+        self.preprocessor = Preprocessor.from_config(ini, reporter=self.log_preprocess_stats)
+        self.preprocess_var.set(self.preprocessor.enabled)
+        self.endpoint_policy = EndpointPolicy.from_config(ini, API_URLS)
+        # 网络中断时截图存入离线队列，恢复后自动补识别
+        try:
+            offline = OfflineQueue()
+        except Exception as e:
+            offline = None
+            self.log(f"离线队列不可用，断网时截图将直接失败: {e}", level='WARN')
+        # 可选的本地模型后端（[Local] 段）：常驻进程池，无网络或选"本地模型"时使用
+        self.local_backend = LocalModelBackend.from_config(ini)
+        if self.local_backend is not None:
+            self.local_radio = tk.Radiobutton(self.api_frame, text="本地模型", variable=self.api_var, value="local")
+            self.local_radio.pack(side=tk.LEFT, padx=(10, 0))
+        # 多区域模式下各区域并发上传，工作线程数决定同时在途的区域数
+        self.ocr = OcrWorker(self.get_api_url, self.get_auth, preprocessor=self.preprocessor, workers=4,
+                             policy=self.endpoint_policy, offline=offline,
+                             on_offline_done=self.on_offline_result,
+                             local=self.local_backend, route=self.get_route_mode,
+                             encoder=AdaptiveEncoder.from_config(ini),
+                             scheduler=RequestScheduler.from_config(ini))
+        self.speculative = SpeculativeOcr(self.ocr)
+        self.ocr.breaker.listeners.append(
+            lambda old, new: self.root.after(0, lambda: self.on_breaker_change(old, new)))
 
-        # 热键管理器 + 心跳
-        self.hotkeys = HotkeyManager(self.trigger_capture_from_hotkey)
+        # 热键管理器：监听线程退出时由监督线程立即按退避重启，连发的组合键去抖
+        debounce_ms = ini.getint("Hotkey", "DEBOUNCE_MS", fallback=400) if ini is not None else 400
+        self.hotkeys = HotkeyManager(self.trigger_capture_from_hotkey, on_scan=self.trigger_scan_from_hotkey,
+                                     debounce=debounce_ms / 1000,
+                                     on_state=lambda state, detail: self.root.after(
+                                         0, lambda: self.on_hotkey_state(state, detail)))
         self.start_hotkey_listener()
-        self.ensure_hotkey_alive()
-        
+        self.profiler.mark('ui_built')
+
+        # 窗口进入事件循环后再做耗时初始化
+        self.root.after(0, self.on_window_ready)
         self.logger.log("程序启动完成，已初始化界面与监听。")
 
     # 统一日志代理
     def log(self, message, level='INFO'):
         self.logger.log(message, level=level)
     
-    def trigger_capture_from_hotkey(self, hotkey):
+    def trigger_capture_from_hotkey(self, hotkey, pressed_at=None):
+        # 热键一触发就预热连接，等用户松开鼠标时握手已完成
+        self.ocr.prewarm()
+        trace = self.metrics.new_trace()
+        # 以监听线程收到按键的时刻为起点，hotkey 阶段包含切回主线程的排队时间
+        trace.mark('pressed', t=pressed_at)
         try:
-            self.root.after(0, lambda: self.start_capture(hotkey))
+            self.root.after(0, lambda: self.start_capture(hotkey, trace))
         except Exception as e:
             print(f"调度主线程截图失败: {e}")
             self.log(f"调度主线程截图失败: {e}", level='ERROR')
     
+    def trigger_scan_from_hotkey(self, pressed_at=None):
+        self.ocr.prewarm()
+        trace = self.metrics.new_trace()
+        trace.mark('pressed', t=pressed_at)
+        try:
+            self.root.after(0, lambda: self.start_scan(trace))
+        except Exception as e:
+            print(f"调度主线程整屏识别失败: {e}")
+
+    def get_api_url(self):
+        choice = self.api_choice
+        if choice == AUTO_ENDPOINT:
+            return AUTO_ENDPOINT
+        if choice == "standard":
+            return API_URLS["standard"]
+        return API_URLS["turbo"]
+
+    def get_route_mode(self):
+        # 自动：优先云端，云端不可用时用本地模型；选定具体接口时只用云端
+        choice = self.api_choice
+        if choice == "local":
+            return 'local'
+        return 'auto' if choice == AUTO_ENDPOINT else 'cloud'
+
+    def get_auth(self):
+        header, data = sign_request()
+        return header, data
+
+    def on_window_ready(self):
+        self.profiler.mark('window_ready')
+        Thread(target=self.background_init, name="startup-init", daemon=True).start()
+
+    def background_init(self):
+        """后台完成显示器枚举、凭据校验与重模块导入，结果回到主线程处理"""
+        try:
+            self.topology.refresh()
+        except Exception as e:
+            print(f"后台枚举显示器失败，改在主线程回退: {e}")
+        self.profiler.mark('monitors_ready')
+        if self.topology.layout is None:
+            self.root.after(0, lambda: self.apply_layout(None))
+        self.topology.start()
+
+        try:
+            get_credentials()
+            config_error = None
+        except ConfigError as e:
+            config_error = e
+        self.profiler.mark('credentials_ready')
+        if config_error is not None:
+            self.root.after(0, lambda: self.on_config_error(config_error))
+
+        for name in HEAVY_MODULES:
+            self.profiler.time_import(name)
+        try:
+            self.ocr.session  # 创建连接池
+        except Exception as e:
+            print(f"创建连接池失败: {e}")
+        self.profiler.mark('modules_warm')
+
+        self.history = self.open_history_store(self.history_config)
+
+        if self.hotkeys.ready.wait(timeout=10):
+            self.profiler.mark('hotkeys_live')
+        self.root.after(0, self.report_startup)
+
+        # 本地模型加载较慢，放在启动指标之后；加载后常驻工作进程，识别时不再付加载开销
+        if self.local_backend is not None:
+            t0 = time.perf_counter()
+            try:
+                self.ocr.prewarm_local()
+                self.log(f"本地模型已加载（{self.local_backend.model}，{self.local_backend.workers} 个进程），"
+                         f"用时 {time.perf_counter() - t0:.1f}s。", level='SUCCESS')
+            except Exception as e:
+                self.log(f"本地模型加载失败，仅使用云端接口: {e}", level='ERROR')
+
+    def on_layout_changed(self, old, layout):
+        # 在拓扑线程中调用，切回主线程更新
+        self.root.after(0, lambda: self.apply_layout(layout, changed=old is not None))
+
+    def apply_layout(self, layout, changed=False):
+        if layout is None:
+            if self.topology.layout is not None:
+                return  # 截图时已同步获取过
+            layout = self.topology.refresh(self.get_monitors_info()) or self.topology.layout
+        if layout is not self.topology.layout:
+            return  # 已有更新的布局排在后面
+        if not self.is_capturing:
+            # 截图进行中不切换坐标系，下一次截图时 update_screen_dimensions 会换上新布局
+            self.set_layout(layout)
+        if changed:
+            self.log(f"显示器布局已变化，重新载入 {len(layout.monitors)} 个显示器。", level='WARN')
+        self.display_monitor_info()
+
+    def set_layout(self, layout):
+        self.layout = layout
+        self.monitors_info = list(layout.monitors)
+        self.screenshot_handler.monitors_info = self.monitors_info
+        self.min_x, self.min_y = layout.min_x, layout.min_y
+        self.total_width, self.total_height = layout.total_width, layout.total_height
+        self.overlay_engine.rebuild(layout)
+
+    def on_config_error(self, exc):
+        print(exc)
+        if self.local_backend is not None:
+            self.label.config(text="未配置云端凭据，将使用本地模型识别")
+        else:
+            self.label.config(text="配置错误，请检查 .ini 文件")
+        self.log(str(exc).replace("\n", " "), level='ERROR')
+
+    def report_startup(self):
+        for line in self.profiler.report():
+            print(line)
+            self.log(line, level='DEBUG')
+        missing = self.profiler.missing('window_ready', 'hotkeys_live')
+        late = self.profiler.over_budget('window_ready', 'hotkeys_live')
+        if missing:
+            self.log(f"启动未完成: {', '.join(missing)} 尚未就绪（热键注册失败或超时）", level='WARN')
+        if late:
+            self.log(f"启动超出预算 {self.profiler.budget_ms}ms: {', '.join(late)}", level='WARN')
+        if not missing and not late:
+            ready = max(self.profiler.milestones['window_ready'], self.profiler.milestones['hotkeys_live'])
+            self.log(f"窗口与热键已在 {ready:.0f}ms 内就绪。")
+
     def get_monitors_info(self):
         try:
             return get_monitors_info()
@@ -118,160 +378,564 @@ class ScreenCapture:
             return [{'index': 0, 'scaling_factor': 1.0, 'width': 1920, 'height': 1080, 'x': 0, 'y': 0}]
     
     def get_monitor_for_position(self, x, y):
-        for monitor in self.monitors_info:
-            if (monitor['x'] <= x < monitor['x'] + monitor['width'] and 
-                monitor['y'] <= y < monitor['y'] + monitor['height']):
-                return monitor
-        return self.monitors_info[0] if self.monitors_info else {'scaling_factor': 1.0}
+        layout = self.topology.layout
+        if layout is None:
+            return {'scaling_factor': 1.0}
+        return layout.nearest(x, y)
     
     def start_hotkey_listener(self):
         self.hotkeys.start()
         self.log("热键监听线程已启动。")
-    
-    def ensure_hotkey_alive(self):
-        try:
-            if not self.hotkeys.is_alive():
-                self.log("检测到热键线程不在运行，尝试重启...", level='WARN')
-                self.hotkeys.start()
-        except Exception as e:
-            self.log(f"热键心跳检查异常: {e}", level='ERROR')
-        finally:
-            self.root.after(5000, self.ensure_hotkey_alive)
 
-    def start_capture(self, hotkey=None):
+    def on_hotkey_state(self, state, detail):
+        if state == 'running':
+            if self.hotkeys.restarts:
+                self.log(f"热键监听已恢复（{detail}），累计重启 {self.hotkeys.restarts} 次。", level='SUCCESS')
+            else:
+                self.log(f"全局热键已注册（{detail}）。", level='DEBUG')
+        elif state == 'restarting':
+            self.log(f"热键监听已退出，{detail:.1f}s 后重启。", level='WARN')
+        elif state == 'unavailable':
+            self.log(f"未能注册全局热键，请使用界面按钮截图: {detail}", level='ERROR')
+
+    def start_capture(self, hotkey=None, trace=None):
         if getattr(self, 'is_capturing', False):
             print("正在进行截图，忽略重复触发的热键/点击")
             self.log("正在进行截图，忽略重复触发的热键/点击。", level='DEBUG')
             return
+        if self.ocr.is_full():
+            # 背压：队列满时不再让用户框选，避免白白选完被丢弃
+            self.label.config(text="识别队列已满，请稍候")
+            self.log(f"识别队列已满（{self.ocr.max_pending}），请等待前面的识别完成。", level='WARN')
+            return
         self.is_capturing = True
+        if trace is None:
+            trace = self.metrics.new_trace()
+            trace.mark('pressed')
+        else:
+            trace.mark('hotkey')
+        self.current_trace = trace
         try:
             self.capture_button.config(state='disabled')
         except Exception:
             pass
-        self.log(f"开始截图，触发方式: {hotkey or '按钮'}")
+        self.log(f"[#{trace.capture_id}] 开始截图，触发方式: {hotkey or '按钮'}")
+        root_was_visible = self.root.winfo_viewable()
         self.root.withdraw()
         self.root.lift()
-        self.root.after(500, partial(self.capture_screen, hotkey=hotkey))
+        if self.frozen_var.get() or self.multi_var.get():
+            # 主窗口不在屏幕上时立即抓屏；否则只等窗口管理器把它收起
+            delay = FROZEN_HIDE_DELAY_MS if root_was_visible else 0
+            self.root.after(delay, partial(self.capture_frozen, hotkey=hotkey))
+        else:
+            # 覆盖层已预先创建，只需等主窗口收起，不再固定等待 500ms
+            delay = FROZEN_HIDE_DELAY_MS if root_was_visible else 0
+            self.root.after(delay, partial(self.capture_screen, hotkey=hotkey))
 
-    def capture_screen(self, hotkey=None):
+    def capture_frozen(self, hotkey=None):
+        """冻结画面模式：整块虚拟桌面只抓一次，覆盖层显示这帧静止画面"""
         self.update_screen_dimensions()
+        trace = self.current_trace
+        bounds = (self.min_x, self.min_y, self.min_x + self.total_width, self.min_y + self.total_height)
+        def grab_desktop():
+            try:
+                if trace is not None:
+                    with trace.span('capture'):
+                        frame = self.screenshot_handler.grab_area(*bounds)
+                else:
+                    frame = self.screenshot_handler.grab_area(*bounds)
+                image = frame.to_image()
+            except Exception as e:
+                self.root.after(0, lambda exc=e: self.on_frozen_failed(hotkey, exc))
+                return
+            self.root.after(0, lambda: self.show_frozen_overlay(hotkey, frame, image))
+        self.capture_executor.submit(grab_desktop)
+
+    def on_frozen_failed(self, hotkey, exc):
+        self.log(f"整屏抓取失败，回退到普通截图: {exc}", level='WARN')
+        self.capture_screen(hotkey=hotkey)
+
+    def show_frozen_overlay(self, hotkey, frame, image):
+        self.frozen_frame = frame
+        if self.multi_var.get():
+            self.capture_multi(hotkey, frame, image)
+        else:
+            self.capture_screen(hotkey=hotkey, background=image)
+
+    def capture_multi(self, hotkey, frame, image):
+        """多区域模式：每框一个区域立即提交，回车后等全部返回再合并写入剪贴板"""
+        trace = self.current_trace or self.metrics.new_trace()
+        self.current_trace = None
+        origin = (self.min_x, self.min_y)
+        session = MultiRegionSession(
+            self.ocr,
+            on_complete=lambda entries: self.root.after(0, lambda: self.on_multi_done(hotkey, entries, trace)),
+            on_error=lambda exc: self.root.after(0, lambda: self.on_ocr_error(exc, trace)),
+            meta={'hotkey': hotkey},
+        )
+        self.multi_session = session
+        def on_region(l, t, r, b):
+            source = partial(frame.crop, l - origin[0], t - origin[1], r - origin[0], b - origin[1])
+            index = session.add((l, t, r, b), source)
+            self.log(f"区域 {index}: ({l}, {t}) 到 ({r}, {b})，已提交识别", level='DEBUG')
+            self.update_queue_status()
+        def on_finish(regions):
+            self.multi_session = None
+            self.frozen_frame = None
+            self.end_selection()
+            if not regions:
+                session.cancel()
+                self.label.config(text="未框选任何区域")
+                self.log("多区域截图未框选任何区域。")
+                return
+            trace.mark('selection_released')
+            session.finish()
+            self.label.config(text=f"已框选 {len(regions)} 个区域，等待识别结果")
+            self.log(f"多区域截图完成，共 {len(regions)} 个区域，剩余 {session.pending()} 个识别中。")
+        self.overlay = self.overlay_engine.open(on_finish, self.cancel_capture, background=image, on_region=on_region,
+                                                on_visible=partial(self.on_overlay_visible, trace))
+        trace.mark('overlay_shown')
+        self.ocr.prewarm()
+
+    def start_scan(self, trace=None):
+        """整屏识别：抓取鼠标所在显示器，检测文字/公式块后并发识别"""
+        if self.is_capturing or self.scan_busy:
+            self.log("正在截图或整屏识别中，请稍候。", level='WARN')
+            return
+        self.scan_busy = True
+        trace = trace or self.metrics.new_trace()
+        trace.mark('hotkey')
+        x, y = self.root.winfo_pointerxy()
+        self.update_screen_dimensions()
+        monitor = self.get_monitor_for_position(x, y)
+        self.log(f"[#{trace.capture_id}] 整屏识别显示器 {monitor.get('index', 0)}")
+        root_was_visible = self.root.winfo_viewable()
+        self.root.withdraw()
+        delay = FROZEN_HIDE_DELAY_MS if root_was_visible else 0
+        self.root.after(delay, lambda: self.capture_executor.submit(self.grab_for_scan, monitor, trace))
+
+    def grab_for_scan(self, monitor, trace):
+        # 在抓图线程中执行：整屏抓取后立即恢复主窗口，检测与识别放到单独线程
+        try:
+            with trace.span('capture'):
+                frame = self.screenshot_handler.grab_monitor(monitor)
+        except CaptureError as e:
+            self.root.after(0, lambda exc=e: (self.root.deiconify(), self.on_scan_finished(),
+                                              self.on_ocr_error(exc, trace)))
+            return
+        self.root.after(0, self.root.deiconify)
+        Thread(target=self.run_scan, args=(frame, monitor, trace), name="region-scan", daemon=True).start()
+
+    def run_scan(self, frame, monitor, trace):
+        try:
+            with trace.span('detect'):
+                blocks = self.block_detector.detect(frame)
+        except Exception as e:
+            self.root.after(0, lambda exc=e: (self.on_scan_finished(), self.on_ocr_error(exc, trace)))
+            return
+        self.log(f"检测到 {len(blocks)} 个文字/公式块，用时 {self.block_detector.last_ms:.0f}ms", level='DEBUG')
+        if not blocks:
+            self.root.after(0, lambda: (self.on_scan_finished(), self.label.config(text="未检测到文字或公式")))
+            trace.finish(ok=False, error="未检测到文字或公式")
+            return
+        origin = (int(monitor['x']), int(monitor['y']))
+        # 给交互截图在识别队列中留两个空位
+        session = MultiRegionSession(
+            self.ocr,
+            on_complete=lambda entries: self.root.after(0, lambda: self.on_scan_done(entries, origin, trace)),
+            on_error=lambda exc: self.root.after(0, lambda: (self.on_scan_finished(), self.on_ocr_error(exc, trace))),
+            meta={'hotkey': 'scan'},
+            max_in_flight=max(1, self.ocr.max_pending - 2),
+            priority='normal',
+        )
+        self.scan_session = session
+        self.root.after(0, lambda: self.label.config(text=f"整屏识别：{len(blocks)} 个区域识别中"))
+        for block in blocks:
+            if session.add(block, partial(frame.crop, *block)) is None:
+                return  # 已取消
+        session.finish()
+
+    def on_scan_finished(self):
+        self.scan_session = None
+        self.scan_busy = False
+        self.update_queue_status()
+
+    def on_scan_done(self, entries, origin, trace=None):
+        self.on_scan_finished()
+        self.last_scan = positioned_results(entries, origin)
+        texts = [item['latex'] for item in self.last_scan if 'latex' in item]
+        failed = len(self.last_scan) - len(texts)
+        for entry in entries:
+            if entry['outcome'][0] == 'done':
+                self.record_history(entry['outcome'][1], entry['outcome'][2], 'scan', frame=entry['source'])
+        t0 = time.perf_counter()
+        self.root.clipboard_clear()
+        self.root.clipboard_append("\n\n".join(texts))
+        self.root.update()
+        if trace is not None:
+            trace.record('clipboard', time.perf_counter() - t0)
+            trace.finish(ok=failed == 0, error=f"{failed} 个区域识别失败" if failed else None)
+            self.log(f"耗时明细 {trace.summary()}")
+            self.update_metrics_view()
+        for item in self.last_scan:
+            self.log(f"区域 {tuple(item['region'])}: {item.get('latex', '失败: ' + item.get('error', ''))}", level='DEBUG')
+        self.label.config(text=f"整屏识别完成：{len(texts)} 个区域已复制" + (f"，{failed} 个失败" if failed else ""))
+        self.log(f"整屏识别完成：{len(texts)} 个成功，{failed} 个失败，结果已按阅读顺序复制到剪贴板。", level='SUCCESS')
+
+    def on_multi_done(self, hotkey, entries, trace=None):
+        texts = []
+        failed = 0
+        for entry in entries:
+            outcome = entry['outcome']
+            if outcome[0] != 'done':
+                failed += 1
+                self.log(f"区域 {entry['region']} 识别失败: {outcome[1]}", level='WARN')
+                continue
+            texts.append(self.format_result(hotkey, outcome[1]))
+            self.record_history(outcome[1], outcome[2], hotkey, frame=entry['source'])
+        t0 = time.perf_counter()
+        self.root.clipboard_clear()
+        self.root.clipboard_append("\n".join(texts))
+        self.root.update()
+        if trace is not None:
+            trace.record('clipboard', time.perf_counter() - t0)
+            trace.finish(ok=failed == 0, error=f"{failed} 个区域识别失败" if failed else None)
+            self.log(f"耗时明细 {trace.summary()}")
+            self.update_metrics_view()
+        if failed:
+            self.label.config(text=f"{len(texts)} 个区域已复制，{failed} 个失败")
+        else:
+            self.label.config(text=f"{len(texts)} 个区域已按阅读顺序合并复制到剪切板")
+        self.log(f"多区域识别完成：{len(texts)} 个成功，{failed} 个失败，结果已按阅读顺序复制到剪贴板。", level='SUCCESS')
+        self.update_queue_status()
+
+    def capture_screen(self, hotkey=None, background=None):
+        if background is None:
+            self.update_screen_dimensions()
         # 调用覆盖层组件
         def on_finish(l, t, r, b):
             self.on_region_selected(hotkey, l, t, r, b)
         def on_cancel():
             self.cancel_capture()
-        self.overlay = CaptureOverlay(self.root, self.total_width, self.total_height, self.min_x, self.min_y, on_finish, on_cancel)
-        self.log(f"创建截图窗口: 位置({self.min_x}, {self.min_y}), 尺寸 {self.total_width}x{self.total_height}", level='DEBUG')
+        # 只有冻结画面才能在框选中途抓图：实时模式下覆盖层本身会被截进去
+        on_pause = (partial(self.on_selection_pause, hotkey)
+                    if background is not None and self.speculative_pause_ms > 0 else None)
+        trace = self.current_trace
+        on_visible = partial(self.on_overlay_visible, trace) if trace is not None else None
+        self.overlay = self.overlay_engine.open(on_finish, on_cancel, background=background, on_pause=on_pause,
+                                                pause_ms=self.speculative_pause_ms, on_visible=on_visible)
+        if trace is not None:
+            trace.mark('overlay_shown')
+        self.ocr.prewarm()
+        self.log(f"显示截图窗口: {len(self.overlay_engine.overlays)} 个显示器, "
+                 f"虚拟桌面 ({self.min_x}, {self.min_y}) {self.total_width}x{self.total_height}", level='DEBUG')
 
-    def cancel_capture(self):
-        if hasattr(self, 'overlay'):
-            try:
-                self.overlay.destroy()
-            except Exception:
-                pass
+    def on_overlay_visible(self, trace):
+        # 覆盖层真正映射到屏幕上；trace.started 即热键/按钮按下的时刻
+        trace.mark('overlay_visible')
+        latency = trace.elapsed()
+        trace.record('press_to_overlay', latency)
+        self.log(f"[#{trace.capture_id}] 按键到覆盖层可见 {latency * 1000:.0f}ms", level='DEBUG')
+
+    def end_selection(self):
+        """框选阶段结束：恢复主窗口，允许下一次截图（识别可能仍在进行）"""
         self.root.deiconify()
-        self.label.config(text="截图已取消")
         self.is_capturing = False
         try:
             self.capture_button.config(state='normal')
         except Exception:
             pass
-        self.log("截图已取消。")
 
-    def on_region_selected(self, hotkey, actual_left, actual_top, actual_right, actual_bottom):
-        self.log(f"最终截图区域: ({actual_left}, {actual_top}) 到 ({actual_right}, {actual_bottom})", level='DEBUG')
-        screenshot = self.screenshot_handler.capture_area(actual_left, actual_top, actual_right, actual_bottom)
-        if screenshot is None:
-            print("截图失败！")
-            self.root.deiconify()
-            self.label.config(text="截图失败，请重试")
-            self.is_capturing = False
+    def cancel_capture(self):
+        if self.overlay is not None:
             try:
-                self.capture_button.config(state='normal')
+                self.overlay.destroy()
             except Exception:
                 pass
-            self.log("截图失败，请重试。", level='ERROR')
-            return
-        # 保存临时文件
-        tmp_path = "./screenshot.png"
-        screenshot.save(tmp_path)
-        self.log("已保存临时截图 ./screenshot.png", level='DEBUG')
-        # 异步识别
-        def api_url_getter():
-            if self.api_var.get() == "standard":
-                self.log("使用标准接口 /api/latex_ocr")
-                return "https://server.simpletex.cn/api/latex_ocr"
-            else:
-                self.log("使用轻量接口 /api/latex_ocr_turbo")
-                return "https://server.simpletex.cn/api/latex_ocr_turbo"
-        def auth_getter():
-            header, data = get_req_data({}, SIMPLETEX_APP_ID, SIMPLETEX_APP_SECRET)
-            return header, data
+            self.overlay = None
+        self.end_selection()
+        self.current_trace = None
+        self.frozen_frame = None
+        self.speculative.cancel()
+        if self.multi_session is not None:
+            self.multi_session.cancel()
+            self.multi_session = None
+        self.label.config(text="截图已取消")
+        self.log("截图已取消。")
+
+    def on_region_selected(self, hotkey, actual_left, actual_top, actual_right, actual_bottom):
+        trace = self.current_trace or self.metrics.new_trace()
+        self.current_trace = None
+        trace.mark('selection_released')
+        self.log(f"最终截图区域: ({actual_left}, {actual_top}) 到 ({actual_right}, {actual_bottom})", level='DEBUG')
+        if self.api_var.get() == AUTO_ENDPOINT:
+            first, _ = self.endpoint_policy.order()
+            self.log(f"自动选择接口，首发 {first}", level='DEBUG')
+        elif self.api_var.get() == "standard":
+            self.log("使用标准接口 /api/latex_ocr")
+        else:
+            self.log("使用轻量接口 /api/latex_ocr_turbo")
+        # 工作线程回调统一切回 Tk 主线程
+        # 截图帧留到识别完成后生成历史缩略图；沿用预识别时存裁剪函数，由历史写入线程执行
+        captured = {'frame': None}
         def on_done(text, raw):
-            self.on_ocr_done(hotkey, text, raw, tmp_path)
+            self.root.after(0, lambda: self.on_ocr_done(hotkey, text, raw, trace, captured['frame']))
         def on_error(exc):
-            self.on_ocr_error(exc, tmp_path)
-        self.ocr = OcrWorker(api_url_getter, auth_getter, on_done, on_error)
-        self.ocr.submit(tmp_path)
+            self.root.after(0, lambda: self.on_ocr_error(exc, trace))
+        frozen, self.frozen_frame = self.frozen_frame, None
+        origin = (self.min_x, self.min_y)
+        region = (actual_left, actual_top, actual_right, actual_bottom)
+        if frozen is not None:
+            captured['frame'] = partial(frozen.crop, actual_left - origin[0], actual_top - origin[1],
+                                        actual_right - origin[0], actual_bottom - origin[1])
+        if frozen is not None and self.speculative.adopt(region, on_done, on_error):
+            # 停顿时已按同一选区提交过识别，直接沿用，不再重新裁剪上传
+            self.log("选区与停顿时一致，沿用预识别结果。", level='DEBUG')
+            self.on_submitted("已在框选时提前识别，等待结果")
+            return
+        # 松手后立即在抓图线程抓图（不排在识别队列后面），编码与上传交给识别线程池，全程不落盘
+        def grab_and_submit():
+            try:
+                if frozen is not None:
+                    # 冻结画面：直接从内存中的整屏帧裁剪，不再二次抓屏
+                    with trace.span('crop'):
+                        frame = frozen.crop(actual_left - origin[0], actual_top - origin[1],
+                                            actual_right - origin[0], actual_bottom - origin[1])
+                else:
+                    with trace.span('capture'):
+                        frame = self.screenshot_handler.grab_area(actual_left, actual_top, actual_right, actual_bottom)
+            except CaptureError as e:
+                self.root.after(0, lambda exc=e: (self.end_selection(), self.on_ocr_error(exc, trace)))
+                return
+            captured['frame'] = frame
+            try:
+                self.ocr.submit(frame, on_done=on_done, on_error=on_error, trace=trace, meta={'hotkey': hotkey},
+                                priority='interactive')
+                result = ("已加入识别队列，可继续截图", None)
+            except queue.Full:
+                result = ("识别队列已满，本次截图已丢弃", "识别队列已满，本次截图已丢弃。")
+            self.root.after(0, lambda: self.on_submitted(*result))
+        self.capture_executor.submit(grab_and_submit)
 
-    def on_ocr_error(self, exc, tmp_path):
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
-        self.root.deiconify()
-        self.label.config(text="识别失败，请重试")
-        self.is_capturing = False
-        try:
-            self.capture_button.config(state='normal')
-        except Exception:
-            pass
-        self.log(f"识别失败: {exc}", level='ERROR')
+    def on_selection_pause(self, hotkey, left, top, right, bottom):
+        """框选停顿：从冻结画面裁剪当前选区并提前提交识别"""
+        frozen = self.frozen_frame
+        if frozen is None:
+            return
+        origin = (self.min_x, self.min_y)
+        # 裁剪放在识别线程里做，不占用界面线程
+        source = partial(frozen.crop, left - origin[0], top - origin[1], right - origin[0], bottom - origin[1])
+        if self.speculative.start((left, top, right, bottom), source, meta={'hotkey': hotkey}):
+            self.log(f"框选停顿，提前识别 ({left}, {top}) 到 ({right}, {bottom})", level='DEBUG')
+            self.update_queue_status()
+
+    def on_submitted(self, status_text, warning=None):
+        self.end_selection()
+        self.label.config(text=status_text)
+        if warning:
+            self.log(warning, level='WARN')
+        self.update_queue_status()
 
-    def on_ocr_done(self, hotkey, text, raw, tmp_path):
+    def cancel_pending_ocr(self):
+        for session in (self.scan_session, self.multi_session):
+            if session is not None:
+                session.cancel()
+        if self.scan_session is not None:
+            # 已取消的会话不会再回调；抓屏/检测阶段的整屏识别由其线程结束时清除标记
+            self.on_scan_finished()
+        count = self.ocr.cancel_all()
+        self.log(f"已取消 {count} 个排队/进行中的识别任务。", level='WARN' if count else 'INFO')
+        self.update_queue_status()
+
+    def update_queue_status(self):
         try:
-            os.remove(tmp_path)
-            self.log("已删除临时截图文件。", level='DEBUG')
+            pending = self.ocr.pending()
+            status = f"识别队列: {pending}/{self.ocr.max_pending}"
+            offline = self.ocr.offline_pending()
+            if offline:
+                status += f" | 离线待识别: {offline}"
+            if self.ocr.breaker.state != 'closed':
+                status += " | 接口不可用"
+            self.queue_label.config(text=status)
         except Exception:
             pass
+
+    def on_ocr_error(self, exc, trace=None):
+        if isinstance(exc, CaptureError):
+            print("截图失败！")
+            self.label.config(text="截图失败，请重试")
+            self.log(f"截图失败，请重试。{exc}", level='ERROR')
+        elif isinstance(exc, OfflineQueued):
+            self.label.config(text="网络不可用，截图已保存，恢复后自动识别")
+            self.log(f"识别失败，截图已存入离线队列: {exc.cause}", level='WARN')
+        else:
+            self.label.config(text="识别失败，请重试")
+            self.log(f"识别失败: {exc}", level='ERROR')
+        if trace is not None:
+            trace.finish(ok=False, error=exc)
+            self.update_metrics_view()
+        self.update_queue_status()
+
+    @staticmethod
+    def format_result(hotkey, text):
         if hotkey == "ctrl+shift+win":
             text = " $" + text + "$ "
         elif hotkey == "ctrl+shift+alt":
             text = "$$\n" + text + "\n$$"
         elif hotkey == "ctrl+win+alt":
             text = " $$" + text.strip() + "$$ "
+        return text
+
+    def on_ocr_done(self, hotkey, text, raw, trace=None, frame=None):
+        latex = text
+        text = self.format_result(hotkey, text)
+        t0 = time.perf_counter()
         self.root.clipboard_clear()
         self.root.clipboard_append(text)
         self.root.update()
+        if trace is not None:
+            trace.record('clipboard', time.perf_counter() - t0)
+            trace.finish(ok=True)
+            self.log(f"耗时明细 {trace.summary()}")
+            self.update_metrics_view()
+        self.record_history(latex, raw, hotkey, trace, frame)
         print(raw)
         self.log("识别完成，结果已复制到剪贴板。", level='SUCCESS')
-        self.root.deiconify()
+        if raw.get("speculative"):
+            stats = self.speculative.stats()
+            self.log(f"采用框选停顿时的预识别结果（累计提前 {stats['started']} 次, 采用 {stats['adopted']} 次, 丢弃 {stats['discarded']} 次）",
+                     level='DEBUG')
+        if raw.get("cached"):
+            self.log("命中识别缓存，未发起网络请求。")
+        else:
+            self.log_connection_stats()
+            if raw.get("endpoint") == "local":
+                note = "（云端不可用，已回退）" if raw.get("fallback") else ""
+                self.log(f"采用本地模型结果{note}，推理 {raw.get('infer_ms')}ms", level='DEBUG')
+            elif raw.get("endpoint"):
+                notes = [n for n, flag in (("已对冲", raw.get("hedged")), ("已复核", raw.get("escalated"))) if flag]
+                self.log(f"采用 {raw['endpoint']} 接口结果{'（' + '，'.join(notes) + '）' if notes else ''}; "
+                         f"{self.endpoint_policy.format_brief()}", level='DEBUG')
         self.label.config(text="截图成功，已复制到剪切板")
-        self.is_capturing = False
+        self.update_queue_status()
+        self.log("截图识别流程完成。", level='SUCCESS')
+
+    def on_offline_result(self, meta, text, raw):
+        # 在补识别线程中调用
+        self.root.after(0, lambda: self.on_offline_done(meta, text, raw))
+
+    def on_offline_done(self, meta, text, raw):
+        self.record_history(text, raw, meta.get('hotkey'))
+        text = self.format_result(meta.get('hotkey'), text)
+        queued_at = time.strftime("%H:%M:%S", time.localtime(meta.get('queued_at', time.time())))
+        if meta.get('region') is not None:
+            # 多区域/整屏识别中的单个区域：逐个覆盖剪贴板会互相冲掉，只记入历史与日志
+            self.log(f"{queued_at} 离线保存的区域 {meta['region']}（{meta.get('hotkey')}）已补识别，"
+                     f"可在历史记录中查看: {text.strip()}", level='SUCCESS')
+            self.label.config(text="离线区域已识别，见历史记录")
+        else:
+            self.root.clipboard_clear()
+            self.root.clipboard_append(text)
+            self.root.update()
+            self.log(f"{queued_at} 离线保存的截图已补识别，结果已复制到剪贴板: {text.strip()}", level='SUCCESS')
+            self.label.config(text="离线截图已识别，已复制到剪切板")
+        self.update_queue_status()
+
+    def open_history_store(self, config):
+        section = "History"
+        if config is not None and not config.getboolean(section, "ENABLED", fallback=True):
+            return None
         try:
-            self.capture_button.config(state='normal')
+            return HistoryStore(
+                max_items=config.getint(section, "MAX_ITEMS", fallback=5000) if config is not None else 5000,
+                max_age_days=config.getint(section, "MAX_AGE_DAYS", fallback=180) if config is not None else 180,
+            )
+        except Exception as e:
+            print(f"打开识别历史失败: {e}")
+            self.log(f"识别历史不可用: {e}", level='WARN')
+            return None
+
+    def record_history(self, latex, raw, hotkey=None, trace=None, frame=None):
+        if self.history is None:
+            return
+        durations = {k: round(v * 1000, 2) for k, v in trace.durations.items()} if trace is not None else None
+        self.history.add(latex, raw=raw, hotkey=hotkey, durations=durations, frame=frame)
+
+    def open_history(self):
+        if self.history is None:
+            self.log("识别历史尚未就绪或已关闭。", level='WARN')
+            return
+        if self.history_window is not None and self.history_window.exists():
+            self.history_window.lift()
+            return
+        self.history_window = HistoryWindow(self.root, self.history, on_copy=self.copy_from_history)
+
+    def copy_from_history(self, latex):
+        self.root.clipboard_clear()
+        self.root.clipboard_append(latex)
+        self.root.update()
+        self.log("已从历史记录复制 LaTeX 到剪贴板。", level='SUCCESS')
+
+    def on_breaker_change(self, old, new):
+        if new == 'open':
+            self.log("识别接口连续失败，暂停请求；新截图将离线保存。", level='WARN')
+        elif new == 'closed' and old != 'closed':
+            self.log("识别接口已恢复。")
+        self.update_queue_status()
+
+    def update_metrics_view(self):
+        try:
+            self.metrics_label.config(text=self.metrics.format_brief())
         except Exception:
             pass
-        self.log("截图识别流程完成。", level='SUCCESS')
+
+    def export_metrics(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="导出耗时指标", defaultextension=".json", initialfile="tex-ocr-metrics.json",
+            filetypes=[("JSON", "*.json"), ("Prometheus 文本", "*.prom"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            self.metrics.export(path)
+            self.log(f"耗时指标已导出到 {path}", level='SUCCESS')
+        except Exception as e:
+            self.log(f"导出耗时指标失败: {e}", level='ERROR')
+
+    def on_preprocess_toggle(self):
+        self.preprocessor.enabled = bool(self.preprocess_var.get())
+        self.log(f"上传前预处理已{'开启' if self.preprocessor.enabled else '关闭'}。")
+
+    def log_preprocess_stats(self, stats):
+        w0, h0 = stats['size_before']
+        w1, h1 = stats['size_after']
+        self.log(
+            f"预处理: {w0}x{h0} -> {w1}x{h1}, 原图 {stats['raw_bytes']} 字节(未压缩) -> 上传 {stats['encoded_bytes']} 字节, "
+            f"预处理 {stats['preprocess_ms']}ms, 编码({stats.get('encoding', 'png')}) {stats['encode_ms']}ms",
+            level='DEBUG'
+        )
+
+    def log_connection_stats(self):
+        try:
+            stats = self.ocr.connection_stats()
+            self.log(f"连接统计: 新建 {stats['opened']} 个, 复用 {stats['reused']} 次, 共 {stats['requests']} 次请求")
+        except Exception as e:
+            self.log(f"获取连接统计失败: {e}", level='DEBUG')
+        limit = self.ocr.scheduler_stats()
+        if limit['enabled']:
+            waits = ", ".join(f"{name} p95 {w['p95_ms']}ms" for name, w in limit['wait'].items())
+            self.log(f"限流: {limit['qps']}/{limit['max_qps']} QPS, 被限流 {limit['throttled']} 次, "
+                     f"等待令牌 {sum(limit['waiting'].values())} 个, 排队 {sum(limit['queued'].values())} 个"
+                     f"{'; ' + waits if waits else ''}", level='DEBUG')
 
     def update_screen_dimensions(self):
-        if not hasattr(self, 'monitors_info') or not self.monitors_info:
-            self.monitors_info = self.get_monitors_info()
-        min_x = min(monitor['x'] for monitor in self.monitors_info)
-        min_y = min(monitor['y'] for monitor in self.monitors_info)
-        max_x = max(monitor['x'] + monitor['width'] for monitor in self.monitors_info)
-        max_y = max(monitor['y'] + monitor['height'] for monitor in self.monitors_info)
-        self.total_width = max_x - min_x
-        self.total_height = max_y - min_y
-        self.min_x = min_x
-        self.min_y = min_y
-        print(f"屏幕边界: 最小({min_x}, {min_y}), 最大({max_x}, {max_y})")
-        print(f"总尺寸: {self.total_width}x{self.total_height}")
-        self.log(f"屏幕边界: 最小({min_x}, {min_y}), 最大({max_x}, {max_y}); 总尺寸: {self.total_width}x{self.total_height}", level='DEBUG')
-        for monitor in self.monitors_info:
-            monitor['relative_x'] = monitor['x'] - min_x
-            monitor['relative_y'] = monitor['y'] - min_y
-            print(f"显示器 {monitor['index']}: 相对位置({monitor['relative_x']}, {monitor['relative_y']})")
+        # 边界与相对坐标在布局重建时已算好，这里只在布局更新后切换引用
+        layout = self.topology.layout
+        if layout is None:
+            layout = self.topology.refresh(self.get_monitors_info()) or self.topology.layout
+        if layout is not self.layout:
+            self.set_layout(layout)
+            self.log(f"屏幕边界: 最小({layout.min_x}, {layout.min_y}), 最大({layout.max_x}, {layout.max_y}); "
+                     f"总尺寸: {layout.total_width}x{layout.total_height}", level='DEBUG')
 
     def display_monitor_info(self):
         print(f"检测到 {len(self.monitors_info)} 个显示器:")
@@ -284,27 +948,38 @@ class ScreenCapture:
                 f"显示器 {monitor['index']}: 位置({monitor['x']},{monitor['y']}), 尺寸{monitor['width']}x{monitor['height']}, 缩放比例{monitor['scaling_factor']}",
                 level='DEBUG'
             )
-        if len(self.monitors_info) > 1:
-            min_x = min(monitor['x'] for monitor in self.monitors_info)
-            min_y = min(monitor['y'] for monitor in self.monitors_info)
-            max_x = max(monitor['x'] + monitor['width'] for monitor in self.monitors_info)
-            max_y = max(monitor['y'] + monitor['height'] for monitor in self.monitors_info)
-            total_width = max_x - min_x
-            total_height = max_y - min_y
-            print(f"总屏幕区域: 位置({min_x}, {min_y}), 尺寸{total_width}x{total_height}")
-            self.log(f"总屏幕区域: 位置({min_x}, {min_y}), 尺寸{total_width}x{total_height}", level='DEBUG')
+        layout = self.topology.layout
+        if layout is not None and len(layout.monitors) > 1:
+            print(f"总屏幕区域: 位置({layout.min_x}, {layout.min_y}), 尺寸{layout.total_width}x{layout.total_height}")
+            self.log(f"总屏幕区域: 位置({layout.min_x}, {layout.min_y}), 尺寸{layout.total_width}x{layout.total_height}", level='DEBUG')
 
     def cleanup(self):
+        if hasattr(self, 'hotkeys'):
+            self.hotkeys.stop()
+        if hasattr(self, 'overlay_engine'):
+            self.overlay_engine.destroy()
+        if hasattr(self, 'topology'):
+            self.topology.stop()
+        if hasattr(self, 'capture_executor'):
+            self.capture_executor.shutdown(wait=False)
         if hasattr(self, 'screenshot_handler'):
             self.screenshot_handler.close()
+        if hasattr(self, 'ocr'):
+            self.ocr.close()
+        if getattr(self, 'history', None) is not None:
+            self.history.close()
         self.log("已清理资源，准备退出。")
+        if hasattr(self, 'logger'):
+            self.logger.close()
 
     def __del__(self):
         self.cleanup()
 
 if __name__ == "__main__":
+    profiler = StartupProfiler(t0=_STARTUP_T0)
+    profiler.mark('imports')
     root = tk.Tk()
-    app = ScreenCapture(root)
+    app = ScreenCapture(root, profiler=profiler)
     
     def on_closing():
         app.cleanup()
@@ -0,0 +1,210 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from io import BytesIO
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    latex TEXT NOT NULL,
+    hotkey TEXT,
+    endpoint TEXT,
+    conf REAL,
+    raw TEXT,
+    durations TEXT,
+    thumb BLOB
+);
+CREATE INDEX IF NOT EXISTS captures_created ON captures(created_at);
+"""
+
+# 外部内容表：全文索引只存分词，原文仍在 captures 里；触发器保持两者同步
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS captures_fts USING fts5(latex, content='captures', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS captures_ai AFTER INSERT ON captures BEGIN
+    INSERT INTO captures_fts(rowid, latex) VALUES (new.id, new.latex);
+END;
+CREATE TRIGGER IF NOT EXISTS captures_ad AFTER DELETE ON captures BEGIN
+    INSERT INTO captures_fts(captures_fts, rowid, latex) VALUES ('delete', old.id, old.latex);
+END;
+"""
+
+THUMB_SIZE = (256, 96)
+
+
+def default_history_path():
+    return os.path.join(os.path.expanduser("~"), ".tex-ocr", "history.sqlite3")
+
+
+def make_thumbnail(frame, size=THUMB_SIZE):
+    """把截图缩成灰度小图（PNG），通常只有几 KB"""
+    if frame is None:
+        return None
+    if callable(frame):
+        frame = frame()
+    image = frame.to_image() if hasattr(frame, "to_image") else frame
+    thumb = image.convert("L")
+    thumb.thumbnail(size)
+    buf = BytesIO()
+    thumb.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def fts_query(text):
+    """把用户输入转成 FTS5 查询：按单词切分，每个词做前缀匹配，全部命中才算"""
+    terms = re.findall(r"\w+", text)
+    return " AND ".join(f'"{t}"*' for t in terms)
+
+
+class HistoryStore:
+    """识别历史：SQLite + FTS5 全文索引；写入在后台线程批量提交，并按条数/时间清理"""
+
+    def __init__(self, db_path=None, max_items=5000, max_age_days=180, batch_interval=0.5):
+        self.db_path = db_path or default_history_path()
+        self.max_items = max_items
+        self.max_age_days = max_age_days
+        self.batch_interval = batch_interval
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        with self._reader:
+            self._reader.executescript(SCHEMA)
+            try:
+                self._reader.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError as e:
+                # 个别 SQLite 构建没有 FTS5，退回到 LIKE 查询
+                print(f"SQLite 不支持 FTS5，历史搜索改用 LIKE: {e}")
+                self.has_fts = False
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self.written = 0
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+        # WAL 下读写互不阻塞，搜索窗口查询时后台写入照常进行
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add(self, latex, raw=None, hotkey=None, durations=None, frame=None, created_at=None):
+        """可在任意线程（包括界面线程）调用，只入队；缩略图与写库都在后台线程完成"""
+        if self._closed:
+            return
+        self._queue.put({
+            'created_at': created_at or time.time(),
+            'latex': latex,
+            'raw': raw or {},
+            'hotkey': hotkey,
+            'durations': durations,
+            'frame': frame,
+        })
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # 攒一小段时间内的写入，合并为一个事务
+            deadline = time.monotonic() + self.batch_interval
+            stop = False
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(conn, batch)
+            except Exception as e:
+                print(f"写入识别历史失败: {e}")
+            if stop:
+                break
+        conn.close()
+
+    def _row(self, item):
+        raw = item['raw']
+        try:
+            thumb = make_thumbnail(item['frame'])
+        except Exception as e:
+            print(f"生成缩略图失败: {e}")
+            thumb = None
+        return (
+            item['created_at'],
+            item['latex'],
+            item['hotkey'],
+            raw.get('endpoint'),
+            (raw.get('res') or {}).get('conf'),
+            json.dumps(raw, ensure_ascii=False),
+            json.dumps(item['durations']) if item['durations'] else None,
+            thumb,
+        )
+
+    def _write_batch(self, conn, batch):
+        rows = [self._row(item) for item in batch]
+        with conn:
+            conn.executemany(
+                "INSERT INTO captures (created_at, latex, hotkey, endpoint, conf, raw, durations, thumb) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._apply_retention(conn)
+        self.written += len(rows)
+
+    def _apply_retention(self, conn):
+        if self.max_age_days:
+            conn.execute("DELETE FROM captures WHERE created_at < ?",
+                         (time.time() - self.max_age_days * 86400,))
+        if self.max_items:
+            conn.execute("DELETE FROM captures WHERE id <= ("
+                         "SELECT id FROM captures ORDER BY id DESC LIMIT 1 OFFSET ?)", (self.max_items,))
+
+    def search(self, text="", limit=200):
+        """按 LaTeX 全文搜索，空串返回最近的记录；结果按时间倒序，不含缩略图"""
+        columns = "c.id, c.created_at, c.latex, c.hotkey, c.endpoint, c.conf"
+        query = fts_query(text) if self.has_fts else text.strip()
+        with self._read_lock:
+            if not query:
+                cur = self._reader.execute(
+                    f"SELECT {columns} FROM captures c ORDER BY c.id DESC LIMIT ?", (limit,))
+            elif self.has_fts:
+                cur = self._reader.execute(
+                    f"SELECT {columns} FROM captures_fts f JOIN captures c ON c.id = f.rowid "
+                    f"WHERE captures_fts MATCH ? ORDER BY c.id DESC LIMIT ?", (query, limit))
+            else:
+                cur = self._reader.execute(
+                    f"SELECT {columns} FROM captures c WHERE c.latex LIKE ? ORDER BY c.id DESC LIMIT ?",
+                    (f"%{query}%", limit))
+            keys = ('id', 'created_at', 'latex', 'hotkey', 'endpoint', 'conf')
+            return [dict(zip(keys, row)) for row in cur.fetchall()]
+
+    def thumbnail(self, capture_id):
+        with self._read_lock:
+            row = self._reader.execute("SELECT thumb FROM captures WHERE id = ?", (capture_id,)).fetchone()
+        return row[0] if row else None
+
+    def count(self):
+        with self._read_lock:
+            return self._reader.execute("SELECT COUNT(*) FROM captures").fetchone()[0]
+
+    def close(self, timeout=2.0):
+        """停止后台写入，尽量把队列中剩余的记录写完"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        with self._read_lock:
+            self._reader.close()
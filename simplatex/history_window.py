@@ -0,0 +1,108 @@
+import base64
+import time
+import tkinter as tk
+
+
+class HistoryWindow:
+    """识别历史搜索窗口：输入即搜索，双击或回车复制 LaTeX 到剪贴板"""
+
+    def __init__(self, root, store, on_copy=None, search_delay_ms=150):
+        self.root = root
+        self.store = store
+        self.on_copy = on_copy  # (latex) -> None
+        self.search_delay_ms = search_delay_ms
+        self._search_job = None
+        self.results = []
+        self.preview_photo = None
+
+        self.top = tk.Toplevel(root)
+        self.top.title("识别历史")
+        self.top.geometry("640x420")
+
+        search_frame = tk.Frame(self.top)
+        search_frame.pack(fill='x', padx=8, pady=(8, 4))
+        tk.Label(search_frame, text="搜索 LaTeX:").pack(side=tk.LEFT)
+        self.query_var = tk.StringVar()
+        self.entry = tk.Entry(search_frame, textvariable=self.query_var)
+        self.entry.pack(side=tk.LEFT, fill='x', expand=True, padx=(5, 0))
+        self.query_var.trace_add('write', lambda *_: self.schedule_search())
+
+        list_frame = tk.Frame(self.top)
+        list_frame.pack(fill='both', expand=True, padx=8)
+        self.listbox = tk.Listbox(list_frame, activestyle='dotbox')
+        self.listbox.pack(side=tk.LEFT, fill='both', expand=True)
+        scrollbar = tk.Scrollbar(list_frame, command=self.listbox.yview)
+        scrollbar.pack(side=tk.RIGHT, fill='y')
+        self.listbox.config(yscrollcommand=scrollbar.set)
+
+        self.preview = tk.Label(self.top, bg='white', height=6)
+        self.preview.pack(fill='x', padx=8, pady=4)
+        self.status = tk.Label(self.top, text="", anchor='w')
+        self.status.pack(fill='x', padx=8, pady=(0, 8))
+
+        self.listbox.bind('<<ListboxSelect>>', lambda e: self.show_preview())
+        self.listbox.bind('<Double-Button-1>', lambda e: self.copy_selected())
+        self.listbox.bind('<Return>', lambda e: self.copy_selected())
+        self.top.bind('<Escape>', lambda e: self.top.destroy())
+
+        self.entry.focus_set()
+        self.search()
+
+    def schedule_search(self):
+        # 连续输入时只在停顿后查一次
+        if self._search_job is not None:
+            self.top.after_cancel(self._search_job)
+        self._search_job = self.top.after(self.search_delay_ms, self.search)
+
+    def search(self):
+        self._search_job = None
+        t0 = time.perf_counter()
+        try:
+            self.results = self.store.search(self.query_var.get())
+        except Exception as e:
+            self.results = []
+            self.status.config(text=f"搜索失败: {e}")
+            return
+        elapsed = (time.perf_counter() - t0) * 1000
+        self.listbox.delete(0, 'end')
+        for item in self.results:
+            ts = time.strftime("%m-%d %H:%M", time.localtime(item['created_at']))
+            latex = item['latex'].replace("\n", " ")
+            self.listbox.insert('end', f"{ts}  {latex}")
+        self.status.config(text=f"{len(self.results)} 条结果，用时 {elapsed:.1f}ms；双击或回车复制")
+
+    def selected(self):
+        sel = self.listbox.curselection()
+        return self.results[sel[0]] if sel else None
+
+    def show_preview(self):
+        item = self.selected()
+        if item is None:
+            return
+        thumb = self.store.thumbnail(item['id'])
+        if not thumb:
+            self.preview.config(image='', text="（无缩略图）")
+            self.preview_photo = None
+            return
+        # Tk 8.6 原生支持 PNG，无需 PIL
+        self.preview_photo = tk.PhotoImage(data=base64.b64encode(thumb))
+        self.preview.config(image=self.preview_photo, text="")
+
+    def copy_selected(self):
+        item = self.selected()
+        if item is None:
+            return
+        if callable(self.on_copy):
+            self.on_copy(item['latex'])
+        self.status.config(text="已复制到剪贴板")
+
+    def lift(self):
+        self.top.deiconify()
+        self.top.lift()
+        self.entry.focus_set()
+
+    def exists(self):
+        try:
+            return bool(self.top.winfo_exists())
+        except Exception:
+            return False
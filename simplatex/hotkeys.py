@@ -1,72 +1,214 @@
 import time
 import platform
-from threading import Thread
+from threading import Thread, Event, Lock
 from functools import partial
 
-try:
-    import keyboard as kb  # type: ignore
-except Exception:
-    kb = None
 
-try:
-    from pynput import keyboard as pynput_keyboard  # type: ignore
-except Exception:
-    pynput_keyboard = None
+# keyboard / pynput 导入较慢，放到热键线程中再导入，不阻塞窗口显示
+def _load_keyboard():
+    try:
+        import keyboard as kb  # type: ignore
+        return kb
+    except Exception:
+        return None
+
+
+def _load_pynput():
+    try:
+        from pynput import keyboard as pynput_keyboard  # type: ignore
+        return pynput_keyboard
+    except Exception:
+        return None
+
+
+# 各平台 pynput 组合键写法 -> 统一的热键名
+PYNPUT_HOTKEYS = {
+    'Darwin': {
+        '<ctrl>+<shift>+<cmd>': "ctrl+shift+win",
+        '<ctrl>+<shift>+<alt>': "ctrl+shift+alt",
+        '<ctrl>+<alt>+<cmd>': "ctrl+win+alt",
+    },
+    'Linux': {
+        '<ctrl>+<shift>+<super>': "ctrl+shift+win",
+        '<ctrl>+<shift>+<alt>': "ctrl+shift+alt",
+        '<ctrl>+<alt>+<super>': "ctrl+win+alt",
+    },
+}
+PYNPUT_HOTKEYS['Windows'] = PYNPUT_HOTKEYS['Darwin']
+SCAN_HOTKEY = "ctrl+shift+f12"
+
+
+class HotkeyUnavailable(Exception):
+    """keyboard 与 pynput 都不可用，重启也无济于事"""
 
 
 class HotkeyManager:
-    def __init__(self, on_hotkey):
+    """全局热键监听 + 监督线程：监听线程一退出立即按退避重启；同一组合键的连发在时间窗内去抖。
+
+    回调签名为 on_hotkey(hotkey, pressed_at) / on_scan(pressed_at)，pressed_at 是监听线程
+    收到按键时的 time.perf_counter()，用于统计按键到覆盖层出现的延迟。
+    """
+
+    def __init__(self, on_hotkey, on_scan=None, debounce=0.4, backoff=0.5, max_backoff=30.0,
+                 stable_after=30.0, on_state=None):
         self.on_hotkey = on_hotkey
+        self.on_scan = on_scan  # 整屏识别热键 Ctrl+Shift+F12，可为 None
+        self.debounce = debounce        # 同一热键两次触发间隔小于该值（秒）视为连发，丢弃
+        self.backoff = backoff          # 首次重启前的等待，之后每次翻倍直到 max_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after  # 监听持续运行这么久后，退避重新从 backoff 算起
+        self.on_state = on_state        # (state, detail) -> None，在监督线程中调用
         self.thread = None
+        self.backend = None             # 'keyboard' / 'pynput'
+        self.state = 'stopped'          # stopped / starting / running / restarting / unavailable
+        self.restarts = 0
+        self.triggers = 0
+        self.debounced = 0
+        self.last_error = None
+        self._last_fired = {}
+        self._fire_lock = Lock()
+        self._listener = None
+        self._wake = Event()
+        self._stopping = Event()
+        # 热键注册成功后置位，用于统计启动耗时
+        self.ready = Event()
 
     def start(self):
         if self.thread is not None and self.thread.is_alive():
             return
-        self.thread = Thread(target=self._run)
-        self.thread.daemon = True
+        self._stopping.clear()
+        self.thread = Thread(target=self._supervise, name="hotkey-supervisor", daemon=True)
         self.thread.start()
 
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            try:
+                listener.stop()
+            except Exception:
+                pass
+
     def is_alive(self):
-        return self.thread is not None and self.thread.is_alive()
+        return self.thread is not None and self.thread.is_alive() and self.state == 'running'
 
-    def _run(self):
-        system_name = platform.system()
-        # 优先 keyboard（Windows 体验较好）
-        if kb is not None and system_name == 'Windows':
+    def _set_state(self, state, detail=None):
+        self.state = state
+        if callable(self.on_state):
+            try:
+                self.on_state(state, detail)
+            except Exception as e:
+                print(f"热键状态回调异常: {e}")
+
+    def _fire(self, name, callback, *args):
+        """监听线程中调用：记录按键时间并去抖，再交给回调"""
+        pressed_at = time.perf_counter()
+        with self._fire_lock:
+            last = self._last_fired.get(name)
+            # 按住组合键时会持续触发，窗口随每次触发顺延，松开后才能再次触发
+            self._last_fired[name] = pressed_at
+            if last is not None and pressed_at - last < self.debounce:
+                self.debounced += 1
+                return
+            self.triggers += 1
+        try:
+            callback(*args, pressed_at)
+        except Exception as e:
+            print(f"热键回调异常 {name}: {e}")
+
+    def _supervise(self):
+        delay = self.backoff
+        while not self._stopping.is_set():
+            self._set_state('starting')
+            self._wake.clear()
+            started = time.monotonic()
             try:
-                kb.add_hotkey('ctrl+shift+win', partial(self.on_hotkey, "ctrl+shift+win"))
-                kb.add_hotkey('ctrl+shift+alt', partial(self.on_hotkey, "ctrl+shift+alt"))
-                kb.add_hotkey('ctrl+win+alt', partial(self.on_hotkey, "ctrl+win+alt"))
-                while True:
-                    time.sleep(1)
+                self._listener, watched = self._start_listener()
+            except HotkeyUnavailable as e:
+                self.last_error = str(e)
+                self._set_state('unavailable', str(e))
+                print(f"未能注册全局热键。请使用界面按钮进行截图。{e}")
                 return
             except Exception as e:
-                print(f"keyboard 热键注册失败，回退到 pynput: {e}")
-        # 回退到 pynput
-        if pynput_keyboard is not None:
-            if system_name == 'Darwin':
-                mapping = {
-                    '<ctrl>+<shift>+<cmd>': partial(self.on_hotkey, "ctrl+shift+win"),
-                    '<ctrl>+<shift>+<alt>': partial(self.on_hotkey, "ctrl+shift+alt"),
-                    '<ctrl>+<alt>+<cmd>': partial(self.on_hotkey, "ctrl+win+alt"),
-                }
-            elif system_name == 'Linux':
-                mapping = {
-                    '<ctrl>+<shift>+<super>': partial(self.on_hotkey, "ctrl+shift+win"),
-                    '<ctrl>+<shift>+<alt>': partial(self.on_hotkey, "ctrl+shift+alt"),
-                    '<ctrl>+<alt>+<super>': partial(self.on_hotkey, "ctrl+win+alt"),
-                }
+                self.last_error = str(e)
+                print(f"热键注册失败: {e}")
             else:
-                mapping = {
-                    '<ctrl>+<shift>+<cmd>': partial(self.on_hotkey, "ctrl+shift+win"),
-                    '<ctrl>+<shift>+<alt>': partial(self.on_hotkey, "ctrl+shift+alt"),
-                    '<ctrl>+<alt>+<cmd>': partial(self.on_hotkey, "ctrl+win+alt"),
-                }
+                self.ready.set()
+                self._set_state('running', self.backend)
+                # 监听线程退出时由看护线程唤醒，不再轮询
+                Thread(target=self._watch, args=(watched,), name="hotkey-watch", daemon=True).start()
+                self._wake.wait()
+            if self._stopping.is_set():
+                break
+            self.restarts += 1
+            if time.monotonic() - started >= self.stable_after:
+                delay = self.backoff
+            self._set_state('restarting', delay)
+            if self._stopping.wait(delay):
+                break
+            delay = min(delay * 2, self.max_backoff)
+        self._set_state('stopped')
+
+    def _watch(self, thread):
+        try:
+            thread.join()
+        finally:
+            self._wake.set()
+
+    def _start_listener(self):
+        """注册热键，返回 (可 stop 的监听对象, 监听线程)"""
+        system_name = platform.system()
+        # 优先 keyboard（Windows 体验较好）
+        kb = _load_keyboard() if system_name == 'Windows' else None
+        if kb is not None:
             try:
-                hotkeys = pynput_keyboard.GlobalHotKeys(mapping)
-                hotkeys.start()
-                hotkeys.join()
-                return
+                # 重启时先清掉上一轮注册的热键，避免重复触发
+                kb.unhook_all_hotkeys()
+                for name in ("ctrl+shift+win", "ctrl+shift+alt", "ctrl+win+alt"):
+                    kb.add_hotkey(name, partial(self._fire, name, self.on_hotkey, name))
+                if self.on_scan is not None:
+                    kb.add_hotkey(SCAN_HOTKEY, partial(self._fire, SCAN_HOTKEY, self.on_scan))
+                listener = _KeyboardListener(kb)
+                self.backend = 'keyboard'
+                return listener, listener.thread
             except Exception as e:
-                print(f"pynput 热键注册失败: {e}")
-        print("未能注册全局热键。请使用界面按钮进行截图。") 
\ No newline at end of file
+                print(f"keyboard 热键注册失败，回退到 pynput: {e}")
+        # 回退到 pynput
+        pynput_keyboard = _load_pynput()
+        if pynput_keyboard is None:
+            raise HotkeyUnavailable("keyboard 与 pynput 均不可用")
+        mapping = {
+            combo: partial(self._fire, name, self.on_hotkey, name)
+            for combo, name in PYNPUT_HOTKEYS.get(system_name, PYNPUT_HOTKEYS['Windows']).items()
+        }
+        if self.on_scan is not None:
+            mapping['<ctrl>+<shift>+<f12>'] = partial(self._fire, SCAN_HOTKEY, self.on_scan)
+        hotkeys = pynput_keyboard.GlobalHotKeys(mapping)
+        hotkeys.start()
+        self.backend = 'pynput'
+        return hotkeys, hotkeys
+
+
+class _KeyboardListener:
+    """keyboard 库不公开其监听线程：由本对象持有一个代表本轮注册的线程供监督线程 join，stop() 时结束。
+    另挂一个心跳钩子，记录最近一次收到按键事件的时刻，便于排查监听是否还在工作"""
+
+    def __init__(self, kb):
+        self.kb = kb
+        self.last_event = None  # time.monotonic()，尚未收到按键时为 None
+        self._stopped = Event()
+        self._unhook = kb.hook(self._beat)
+        self.thread = Thread(target=self._stopped.wait, name="hotkey-keyboard", daemon=True)
+        self.thread.start()
+
+    def _beat(self, event):
+        self.last_event = time.monotonic()
+
+    def stop(self):
+        try:
+            self.kb.unhook(self._unhook)
+        except Exception:
+            pass
+        self.kb.unhook_all_hotkeys()
+        self._stopped.set()
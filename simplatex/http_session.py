@@ -0,0 +1,80 @@
+import time
+import threading
+from threading import Thread
+from urllib.parse import urlsplit
+
+
+class PooledSession:
+    """共享的 keep-alive HTTP 会话：连接池复用 + 按需预热 + 复用统计"""
+
+    def __init__(self, pool_maxsize=4, idle_before_prewarm=20.0):
+        # requests 导入较慢，放到构造时（通常在后台线程）再导入
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        # 距上次使用超过该秒数才重新预热，避免每次热键都打一轮请求
+        self.idle_before_prewarm = idle_before_prewarm
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._prewarming = set()
+
+    @staticmethod
+    def _origin(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _touch(self, origin):
+        with self._lock:
+            self._last_used[origin] = time.monotonic()
+
+    def post(self, url, **kwargs):
+        try:
+            return self.session.post(url, **kwargs)
+        finally:
+            self._touch(self._origin(url))
+
+    def prewarm(self, url):
+        """在后台提前完成 DNS/TCP/TLS 握手，使上传时连接已处于可用状态"""
+        origin = self._origin(url)
+        now = time.monotonic()
+        with self._lock:
+            if origin in self._prewarming:
+                return
+            last = self._last_used.get(origin)
+            if last is not None and now - last < self.idle_before_prewarm:
+                return
+            self._prewarming.add(origin)
+        Thread(target=self._do_prewarm, args=(origin,), daemon=True).start()
+
+    def _do_prewarm(self, origin):
+        try:
+            # HEAD 不带请求体，服务端返回什么状态码都无所谓，只为建立连接
+            self.session.head(origin + "/", timeout=(3, 5), allow_redirects=False)
+        except Exception as e:
+            print(f"连接预热失败: {e}")
+        finally:
+            with self._lock:
+                self._prewarming.discard(origin)
+                self._last_used[origin] = time.monotonic()
+
+    def stats(self):
+        """返回连接池统计：新建连接数、复用次数、总请求数"""
+        opened = 0
+        total = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            total += pool.num_requests
+        return {"opened": opened, "reused": max(0, total - opened), "requests": total}
+
+    def close(self):
+        try:
+            self.session.close()
+        except Exception:
+            pass
@@ -0,0 +1,215 @@
+import json
+import threading
+import time
+from collections import deque
+from io import BytesIO
+
+# 可选编码；webp / jpeg 需要接口支持，默认只在无损的 PNG 系列中选择（见 .ini 的 [Encoder] FORMATS）
+ENCODINGS = {
+    'png1': {'format': 'PNG', 'mime': 'image/png', 'ext': 'png', 'save': {'compress_level': 1}},
+    'png6': {'format': 'PNG', 'mime': 'image/png', 'ext': 'png', 'save': {'compress_level': 6}},
+    'png9': {'format': 'PNG', 'mime': 'image/png', 'ext': 'png', 'save': {'optimize': True}},
+    # 自适应调色板：截图里的公式通常只有几十种颜色（抗锯齿灰阶），量化后体积小得多；
+    # 有损（抗锯齿边缘会丢灰阶），自适应选择只比较耗时不考虑识别效果，因此须在 FORMATS 中显式开启
+    'png-palette': {'format': 'PNG', 'mime': 'image/png', 'ext': 'png', 'save': {'optimize': True},
+                    'palette': 32},
+    'webp-lossless': {'format': 'WEBP', 'mime': 'image/webp', 'ext': 'webp',
+                      'save': {'lossless': True, 'method': 2}},
+    'jpeg90': {'format': 'JPEG', 'mime': 'image/jpeg', 'ext': 'jpg', 'save': {'quality': 90}},
+}
+DEFAULT_CANDIDATES = ('png1', 'png6')
+
+# 未测得数据前的估计：每百万像素编码毫秒数、每像素字节数（1080p 截图上的典型值，可用 bench_encode.py 重新测量）
+DEFAULT_PROFILE = {
+    'png1': {'ms_per_mpx': 18.0, 'bytes_per_px': 0.22},
+    'png6': {'ms_per_mpx': 45.0, 'bytes_per_px': 0.17},
+    'png9': {'ms_per_mpx': 160.0, 'bytes_per_px': 0.15},
+    'png-palette': {'ms_per_mpx': 40.0, 'bytes_per_px': 0.08},
+    'webp-lossless': {'ms_per_mpx': 90.0, 'bytes_per_px': 0.10},
+    'jpeg90': {'ms_per_mpx': 12.0, 'bytes_per_px': 0.30},
+}
+
+
+class Encoded:
+    """编码结果；data 即上传的文件内容"""
+
+    def __init__(self, data, name, mime, ext, encode_ms):
+        self.data = data
+        self.name = name
+        self.mime = mime
+        self.ext = ext
+        self.filename = f"screenshot.{ext}"
+        self.encode_ms = encode_ms
+
+    def __len__(self):
+        return len(self.data)
+
+
+def sniff_type(data):
+    """按文件头判断已编码图片的 (mime, 扩展名)"""
+    head = bytes(data[:12])
+    if head.startswith(b"\xff\xd8"):
+        return 'image/jpeg', 'jpg'
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return 'image/webp', 'webp'
+    if head.startswith(b"BM"):
+        return 'image/bmp', 'bmp'
+    return 'image/png', 'png'
+
+
+def encode_image(image, name, extra=None):
+    """按指定编码把 PIL 图像编码为字节，返回 Encoded；extra 为额外的保存参数（如调色板位深）"""
+    spec = ENCODINGS[name]
+    t0 = time.perf_counter()
+    save = dict(spec['save'])
+    if extra and image.mode == 'P' and spec['format'] == 'PNG':
+        save.update(extra)
+    if spec.get('palette'):
+        if image.mode != 'P':
+            from PIL import Image
+            # FASTOCTREE 比默认的中位切分快一个数量级
+            image = image.convert('RGB').quantize(colors=spec['palette'], method=getattr(
+                getattr(Image, 'Quantize', Image), 'FASTOCTREE', 2))
+    elif image.mode == 'P' and spec['format'] != 'PNG':
+        image = image.convert('L')
+    if spec['format'] == 'JPEG' and image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    buf = BytesIO()
+    image.save(buf, format=spec['format'], **save)
+    return Encoded(buf.getvalue(), name, spec['mime'], spec['ext'], (time.perf_counter() - t0) * 1000)
+
+
+class UplinkEstimator:
+    """根据最近的上传 (字节数, 秒) 拟合 耗时 = 固定开销 + 字节数 / 带宽"""
+
+    def __init__(self, initial_kbps=2000.0, window=40):
+        self.initial = initial_kbps * 1000 / 8  # 字节/秒
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, nbytes, seconds):
+        if nbytes > 0 and seconds > 0:
+            with self._lock:
+                self.samples.append((float(nbytes), float(seconds)))
+
+    def bytes_per_second(self):
+        with self._lock:
+            samples = list(self.samples)
+        if len(samples) < 5:
+            return self.initial
+        n = len(samples)
+        mean_x = sum(x for x, _ in samples) / n
+        mean_y = sum(y for _, y in samples) / n
+        var = sum((x - mean_x) ** 2 for x, _ in samples)
+        # 请求体大小差别太小时斜率不可信，沿用初始值
+        if var <= (0.2 * mean_x) ** 2 * n:
+            return self.initial
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var
+        if slope <= 0:
+            return self.initial
+        # 限制在 64 kbps ~ 1 Gbps 之间，避免个别异常样本把选择带偏
+        return min(125e6, max(8e3, 1.0 / slope))
+
+
+class AdaptiveEncoder:
+    """按选区大小与上行带宽选编码：预计总耗时 = 编码耗时 + 字节数 / 带宽，取最小者。
+
+    每种编码的编码速度和压缩率在运行中按实际结果滑动更新；每 explore_every 次
+    改用次优编码一次，避免估计一直停留在初始值上。
+    """
+
+    def __init__(self, candidates=DEFAULT_CANDIDATES, profile=None, uplink_kbps=2000.0, explore_every=20,
+                 enabled=True):
+        unknown = [c for c in candidates if c not in ENCODINGS]
+        if unknown:
+            raise ValueError(f"未知的图片编码: {', '.join(unknown)}")
+        self.candidates = tuple(candidates)
+        self.enabled = enabled
+        self.uplink = UplinkEstimator(uplink_kbps)
+        self.explore_every = explore_every
+        self.profile = {name: dict(DEFAULT_PROFILE[name]) for name in ENCODINGS}
+        for name, values in (profile or {}).items():
+            if name in self.profile:
+                self.profile[name].update(values)
+        self._lock = threading.Lock()
+        self.counts = {}
+        self._encodes = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """从 .ini 的 [Encoder] 段读取；PROFILE 为 bench_encode.py --write-profile 生成的文件"""
+        section = "Encoder"
+        if config is None or not config.has_section(section):
+            return cls()
+        candidates = [c.strip() for c in config.get(section, "FORMATS", fallback=",".join(DEFAULT_CANDIDATES))
+                      .split(",") if c.strip()]
+        profile = None
+        path = config.get(section, "PROFILE", fallback="").strip()
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取编码基准文件失败，使用默认估计: {e}")
+        return cls(candidates=candidates, profile=profile,
+                   uplink_kbps=config.getfloat(section, "UPLINK_KBPS", fallback=2000.0),
+                   enabled=config.getboolean(section, "ENABLED", fallback=True))
+
+    def predict(self, pixels, bandwidth=None):
+        """返回 [(预计总毫秒, 编码名)]，按耗时升序"""
+        bandwidth = bandwidth or self.uplink.bytes_per_second()
+        ranked = []
+        with self._lock:
+            for name in self.candidates:
+                p = self.profile[name]
+                encode_ms = p['ms_per_mpx'] * pixels / 1e6
+                upload_ms = p['bytes_per_px'] * pixels / bandwidth * 1000
+                ranked.append((encode_ms + upload_ms, name))
+        ranked.sort()
+        return ranked
+
+    def choose(self, pixels):
+        if not self.enabled or len(self.candidates) == 1:
+            return self.candidates[0] if self.enabled else 'png6'
+        ranked = self.predict(pixels)
+        with self._lock:
+            self._encodes += 1
+            explore = self.explore_every and self._encodes % self.explore_every == 0
+        return ranked[1][1] if explore else ranked[0][1]
+
+    def encode(self, frame):
+        """frame 为 RawFrame / ProcessedImage / PNG 字节；返回 Encoded"""
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            # 文件或已编码的图片原样上传
+            data = bytes(frame)
+            return Encoded(data, 'passthrough', *sniff_type(data), 0.0)
+        image = frame.to_image()
+        pixels = image.size[0] * image.size[1]
+        name = self.choose(pixels)
+        # 预处理已量化为低位调色板时，PNG 系列按其位深保存
+        encoded = encode_image(image, name, getattr(frame, 'save_kwargs', None))
+        self._learn(name, pixels, encoded)
+        recorder = getattr(frame, 'record_encoding', None)
+        if callable(recorder):
+            recorder(encoded)
+        return encoded
+
+    def _learn(self, name, pixels, encoded, alpha=0.2):
+        if pixels < 1000:
+            return
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            p = self.profile[name]
+            p['ms_per_mpx'] += alpha * (encoded.encode_ms / (pixels / 1e6) - p['ms_per_mpx'])
+            p['bytes_per_px'] += alpha * (len(encoded) / pixels - p['bytes_per_px'])
+
+    def observe_upload(self, nbytes, seconds):
+        self.uplink.observe(nbytes, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uplink_kbps': round(self.uplink.bytes_per_second() * 8 / 1000, 1),
+                'counts': dict(self.counts),
+                'profile': {n: dict(self.profile[n]) for n in self.candidates},
+            }
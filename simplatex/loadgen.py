@@ -0,0 +1,208 @@
+"""按录制的截图轨迹回放请求，统计延迟分位数与吞吐。
+
+轨迹文件为 JSONL，每行一条：{"image": "captures/001.png", "t": 0.0, "endpoint": "turbo"}
+其中 t 为相对首条请求的秒数，endpoint 可省略（使用 --url 指定的地址）。
+
+用法示例：
+    python simplatex/loadgen.py trace.jsonl --url http://127.0.0.1:8765/api/latex_ocr_turbo -c 4
+    python simplatex/loadgen.py --from-dir ./captures --interval 0.2 --url http://127.0.0.1:8765/api/latex_ocr -c 8
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from SimpletexApi import sign_request, get_credentials, ConfigError
+from http_session import PooledSession
+from batch_ocr import collect_images
+
+
+def load_trace(path):
+    base = os.path.dirname(os.path.abspath(path))
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            image = item["image"]
+            if not os.path.isabs(image):
+                image = os.path.join(base, image)
+            events.append({"image": image, "t": float(item.get("t", 0.0)), "endpoint": item.get("endpoint")})
+    events.sort(key=lambda e: e["t"])
+    return events
+
+
+def trace_from_dir(inputs, interval):
+    return [{"image": p, "t": i * interval, "endpoint": None} for i, p in enumerate(collect_images(inputs))]
+
+
+def percentile(sorted_values, q):
+    """最近秩法分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(results, wall_seconds):
+    latencies = sorted(r["latency_ms"] for r in results if r["ok"])
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    ok = len(latencies)
+    return {
+        "requests": len(results),
+        "ok": ok,
+        "errors": len(results) - ok,
+        "status": statuses,
+        "parse_errors": sum(1 for r in results if isinstance(r["status"], int) and r.get("error")),
+        "wall_s": round(wall_seconds, 3),
+        "throughput_rps": round(ok / wall_seconds, 3) if wall_seconds > 0 else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else None,
+    }
+
+
+class LoadGenerator:
+    def __init__(self, url, concurrency=4, speed=1.0, timeout=(3, 30)):
+        self.url = url
+        self.concurrency = concurrency
+        self.speed = speed
+        self.timeout = timeout
+        self.session = PooledSession(pool_maxsize=concurrency)
+        self._images = {}
+
+    def _read(self, path):
+        data = self._images.get(path)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._images[path] = data
+        return data
+
+    def _url_for(self, endpoint):
+        if not endpoint:
+            return self.url
+        base = self.url.rsplit("/api/", 1)[0]
+        return base + ("/api/latex_ocr_turbo" if endpoint == "turbo" else "/api/latex_ocr")
+
+    def _one(self, event, scheduled_at):
+        data = self._read(event["image"])
+        url = self._url_for(event["endpoint"])
+        t0 = time.perf_counter()
+        result = {"image": event["image"], "url": url, "lag_ms": round((t0 - scheduled_at) * 1000, 2)}
+        try:
+            headers, form = sign_request()
+            res = self.session.post(url, files={"file": (os.path.basename(event["image"]), data)},
+                                    data=form, headers=headers, timeout=self.timeout)
+        except Exception as e:
+            # 请求没有拿到响应，没有 HTTP 状态码
+            result["status"] = type(e).__name__
+            result["error"] = str(e)
+            result["ok"] = False
+        else:
+            result["status"] = res.status_code
+            try:
+                obj = json.loads(res.text)
+            except ValueError as e:
+                # 状态码照常记录，解析失败单独计数
+                result["error"] = f"响应不是 JSON: {e}"
+                result["ok"] = False
+            else:
+                result["ok"] = (res.status_code == 200 and isinstance(obj, dict) and bool(obj.get("status", True))
+                                and "res" in obj)
+        result["latency_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return result
+
+    def run(self, events):
+        # 预先读入图片，避免磁盘 IO 计入延迟
+        for event in events:
+            self._read(event["image"])
+        results = []
+        lock = threading.Lock()
+
+        def task(event, scheduled_at):
+            r = self._one(event, scheduled_at)
+            with lock:
+                results.append(r)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for event in events:
+                scheduled_at = start + event["t"] / self.speed
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(task, event, scheduled_at)
+        wall = time.perf_counter() - start
+        return results, wall
+
+    def close(self):
+        self.session.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="截图轨迹回放压测")
+    parser.add_argument("trace", nargs="?", help="JSONL 轨迹文件")
+    parser.add_argument("--from-dir", nargs="+", help="不使用轨迹文件，按固定间隔回放目录中的图片")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="--from-dir 时相邻请求的间隔秒数；--repeat 时也是相邻两轮之间的间隔")
+    parser.add_argument("--url", required=True, help="目标接口地址，可指向真实服务或 mock_server")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，2 表示按两倍速度发送")
+    parser.add_argument("--repeat", type=int, default=1, help="轨迹重复次数")
+    parser.add_argument("--json", dest="json_out", help="把汇总与明细写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    try:
+        get_credentials()
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    if args.from_dir:
+        events = trace_from_dir(args.from_dir, args.interval)
+    elif args.trace:
+        events = load_trace(args.trace)
+    else:
+        parser.error("需要提供轨迹文件或 --from-dir")
+    if not events:
+        print("轨迹为空", file=sys.stderr)
+        return 1
+    if args.repeat > 1:
+        span = events[-1]["t"] + (args.interval or 0.0)
+        if span <= 0:
+            # 轨迹时长为 0（如只有一条记录）时各轮会同时发出，变成一次突发而不是重复回放
+            parser.error("轨迹时长为 0，--repeat 需要用 --interval 指定相邻两轮的间隔")
+        events = [dict(e, t=e["t"] + i * span) for i in range(args.repeat) for e in events]
+
+    gen = LoadGenerator(args.url, concurrency=max(1, args.concurrency), speed=max(args.speed, 1e-6))
+    try:
+        results, wall = gen.run(events)
+        summary = summarize(results, wall)
+        summary["connections"] = gen.session.stats()
+    finally:
+        gen.close()
+    for key in ("requests", "ok", "errors", "status", "parse_errors", "wall_s", "throughput_rps",
+                "p50_ms", "p95_ms", "p99_ms", "max_ms", "connections"):
+        print(f"{key:>15}: {summary[key]}")
+    if summary["parse_errors"]:
+        example = next(r for r in results if isinstance(r["status"], int) and r.get("error"))
+        print(f"响应解析失败 {summary['parse_errors']} 次，例如 HTTP {example['status']}: {example['error']}",
+              file=sys.stderr)
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summary, "results": results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
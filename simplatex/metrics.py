@@ -0,0 +1,292 @@
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# 截图流程中的阶段，按先后顺序排列；导出与界面展示都按这个顺序
+STAGES = (
+    'hotkey',              # 热键回调 -> 主线程开始截图
+    'overlay_shown',       # 开始截图 -> 覆盖层显示请求发出（含等待主窗口收起）
+    'overlay_visible',     # 显示请求 -> 覆盖层实际映射到屏幕
+    'selection_released',  # 覆盖层出现 -> 用户松开鼠标
+    'capture',             # 抓屏 capture_area（冻结画面模式下为整屏抓取）
+    'crop',                # 冻结画面模式：从内存整屏帧裁剪选区
+    'detect',              # 整屏识别：检测文字/公式块
+    'queue_wait',          # 在识别队列中等待
+    'rate_wait',           # 等待限流令牌
+    'preprocess',          # 裁边/灰度/缩放
+    'encode',              # PNG 编码
+    'sign',                # 计算签名
+    'upload',              # 上传并等待响应
+    'retry',               # 重试前的退避等待
+    'parse',               # 解析响应
+    'clipboard',           # 写入剪贴板
+    'press_to_overlay',    # 汇总：按键 -> 覆盖层可见
+    'total',
+)
+
+# Prometheus 直方图桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class CaptureTrace:
+    """单次截图的计时记录，所有阶段通过同一个 capture_id 关联"""
+
+    def __init__(self, capture_id, registry=None):
+        self.capture_id = capture_id
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self._marks = []  # [(stage, t)]
+        self.durations = OrderedDict()
+        self.ok = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def mark(self, stage, t=None):
+        """记录一个时间点；该阶段耗时 = 距上一个时间点的间隔"""
+        t = time.perf_counter() if t is None else t
+        with self._lock:
+            prev = self._marks[-1][1] if self._marks else None
+            self._marks.append((stage, t))
+            if prev is not None:
+                self.durations[stage] = t - prev
+
+    def elapsed(self, t=None):
+        """距第一个时间点（按键时刻）的秒数"""
+        t = time.perf_counter() if t is None else t
+        with self._lock:
+            first = self._marks[0][1] if self._marks else self.started
+        return t - first
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0)
+
+    def finish(self, ok=True, error=None):
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            first = self._marks[0][1] if self._marks else self.started
+            self.durations['total'] = time.perf_counter() - first
+            self.ok = ok
+            self.error = None if error is None else str(error)
+        if self.registry is not None:
+            self.registry.observe(self)
+
+    def summary(self):
+        parts = [f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in self.durations.items()]
+        return f"[#{self.capture_id}] " + ", ".join(parts)
+
+    def to_dict(self):
+        return {
+            'capture_id': self.capture_id,
+            'started_at': self.wall_started,
+            'ok': self.ok,
+            'error': self.error,
+            'durations_ms': {k: round(v * 1000, 2) for k, v in self.durations.items()},
+        }
+
+
+class RollingHistogram:
+    """滚动窗口分位数 + 累计直方图桶"""
+
+    def __init__(self, window=200, buckets=DEFAULT_BUCKETS):
+        self.samples = deque(maxlen=window)
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+    def quantile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum_s': round(self.sum, 6),
+            'window': len(self.samples),
+            'p50_ms': _ms(self.quantile(0.5)),
+            'p95_ms': _ms(self.quantile(0.95)),
+            'max_ms': _ms(max(self.samples) if self.samples else None),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class MetricsRegistry:
+    """汇总所有截图的阶段耗时，支持导出为 Prometheus 文本或 JSON"""
+
+    def __init__(self, window=200, keep_traces=50):
+        self.window = window
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.histograms = OrderedDict()
+        self.recent = deque(maxlen=keep_traces)
+        self.completed = 0
+        self.failed = 0
+        self.listeners = []
+        self.startup = None  # StartupProfiler，导出时一并写出
+
+    def new_trace(self):
+        return CaptureTrace(next(self._ids), self)
+
+    def observe(self, trace):
+        with self._lock:
+            for stage, seconds in trace.durations.items():
+                hist = self.histograms.get(stage)
+                if hist is None:
+                    hist = self.histograms[stage] = RollingHistogram(self.window)
+                hist.observe(seconds)
+            self.recent.append(trace.to_dict())
+            if trace.ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        for listener in list(self.listeners):
+            try:
+                listener(trace)
+            except Exception as e:
+                print(f"指标监听回调异常: {e}")
+
+    def _ordered_stages(self):
+        known = [s for s in STAGES if s in self.histograms]
+        return known + [s for s in self.histograms if s not in STAGES]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'completed': self.completed,
+                'failed': self.failed,
+                'stages': OrderedDict((s, self.histograms[s].snapshot()) for s in self._ordered_stages()),
+                'recent': list(self.recent),
+                'startup': self.startup.as_dict() if self.startup is not None else None,
+            }
+
+    def to_prometheus(self, prefix='texocr'):
+        lines = [
+            f"# HELP {prefix}_captures_total Captures finished, by outcome.",
+            f"# TYPE {prefix}_captures_total counter",
+        ]
+        with self._lock:
+            lines.append(f'{prefix}_captures_total{{outcome="ok"}} {self.completed}')
+            lines.append(f'{prefix}_captures_total{{outcome="error"}} {self.failed}')
+            lines.append(f"# HELP {prefix}_stage_seconds Per-stage capture latency.")
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage in self._ordered_stages():
+                hist = self.histograms[stage]
+                for bound, count in zip(hist.buckets, hist.bucket_counts):
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {hist.sum:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """按扩展名导出：.prom / .txt 为 Prometheus 文本，其余为 JSON"""
+        if path.endswith(('.prom', '.txt')):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def format_brief(self, stages=('total', 'press_to_overlay', 'capture', 'upload')):
+        """界面上展示的简要统计"""
+        with self._lock:
+            parts = []
+            for stage in stages:
+                hist = self.histograms.get(stage)
+                if hist is None or not hist.samples:
+                    continue
+                parts.append(f"{stage} p50 {_ms(hist.quantile(0.5)):.0f}ms/p95 {_ms(hist.quantile(0.95)):.0f}ms")
+        return " | ".join(parts) if parts else "暂无耗时数据"
+
+
+class StartupProfiler:
+    """启动计时：各里程碑距启动的耗时 + 重模块导入耗时"""
+
+    def __init__(self, t0=None, budget_ms=500):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.budget_ms = budget_ms
+        self._lock = threading.Lock()
+        self.milestones = OrderedDict()
+        self.imports = OrderedDict()
+
+    def mark(self, name):
+        with self._lock:
+            if name not in self.milestones:
+                self.milestones[name] = (time.perf_counter() - self.t0) * 1000
+        return self.milestones[name]
+
+    def time_import(self, module_name):
+        """导入模块并记录耗时；已导入的模块记为 0"""
+        import importlib
+        import sys
+        already = module_name in sys.modules
+        t0 = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            with self._lock:
+                self.imports[module_name] = None
+            print(f"后台导入 {module_name} 失败: {e}")
+            return None
+        with self._lock:
+            self.imports[module_name] = 0.0 if already else (time.perf_counter() - t0) * 1000
+        return module
+
+    def over_budget(self, *names):
+        """返回超出预算的里程碑列表；尚未到达的里程碑见 missing"""
+        with self._lock:
+            return [n for n in names if n in self.milestones and self.milestones[n] > self.budget_ms]
+
+    def missing(self, *names):
+        """返回尚未到达的里程碑列表（如热键注册失败或等待超时）"""
+        with self._lock:
+            return [n for n in names if n not in self.milestones]
+
+    def report(self):
+        with self._lock:
+            stages = ", ".join(f"{k} {v:.0f}ms" for k, v in self.milestones.items())
+            imports = ", ".join(
+                f"{k} {'失败' if v is None else f'{v:.0f}ms'}" for k, v in self.imports.items())
+        lines = [f"启动耗时: {stages}"]
+        if imports:
+            lines.append(f"后台导入: {imports}")
+        return lines
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'budget_ms': self.budget_ms,
+                'milestones_ms': {k: round(v, 2) for k, v in self.milestones.items()},
+                'imports_ms': {k: None if v is None else round(v, 2) for k, v in self.imports.items()},
+            }
@@ -0,0 +1,236 @@
+"""本地 SimpleTeX 模拟服务：校验签名，按配置的延迟分布、错误率与限流返回仿真结果。
+
+用法示例：
+    python simplatex/mock_server.py --port 8765 --latency lognormal:600,0.4 --turbo-latency lognormal:250,0.4 \\
+        --error-rate 0.02 --qps 5
+    SIMPLETEX_API_BASE=http://127.0.0.1:8765 python simplatex/gui.py
+"""
+import argparse
+import email.policy
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from SimpletexApi import compute_sign, get_credentials, ConfigError
+
+SAMPLE_LATEX = [
+    r"E=mc^2",
+    r"\int_{0}^{\infty} e^{-x^{2}} d x=\frac{\sqrt{\pi}}{2}",
+    r"\sum_{n=1}^{\infty} \frac{1}{n^{2}}=\frac{\pi^{2}}{6}",
+    r"x=\frac{-b \pm \sqrt{b^{2}-4 a c}}{2 a}",
+    r"\nabla \times \mathbf{E}=-\frac{\partial \mathbf{B}}{\partial t}",
+    r"f(x)=\lim _{h \rightarrow 0} \frac{f(x+h)-f(x)}{h}",
+]
+
+ENDPOINTS = {"/api/latex_ocr": "standard", "/api/latex_ocr_turbo": "turbo"}
+
+
+class LatencyModel:
+    """延迟分布，毫秒。格式：fixed:200 / uniform:100,400 / lognormal:中位数,sigma"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(",") if v.strip()]
+        if kind == "fixed" and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self._sample = lambda: random.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            mu = math.log(values[0])
+            self._sample = lambda: random.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(f"无法解析的延迟分布: {spec}")
+
+    def sample_seconds(self):
+        return max(0.0, self._sample()) / 1000.0
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+class MockConfig:
+    def __init__(self, app_id, app_secret, latency, turbo_latency, error_rate=0.0, qps=0.0, burst=None,
+                 max_skew=300, verbose=False):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.latency = {"standard": latency, "turbo": turbo_latency}
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(qps, burst or qps) if qps > 0 else None
+        self.max_skew = max_skew
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.counters = {"ok": 0, "sign_error": 0, "throttled": 0, "server_error": 0, "bad_request": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "SimpletexMock/1.0"
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，便于验证连接复用
+
+    @property
+    def cfg(self) -> MockConfig:
+        return self.server.mock_config
+
+    def log_message(self, fmt, *args):
+        if self.cfg.verbose:
+            sys.stderr.write("%s - %s\n" % (self.address_string(), fmt % args))
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        # 客户端用 HEAD 预热连接
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        endpoint = ENDPOINTS.get(self.path.split("?", 1)[0])
+        if endpoint is None:
+            self._send_json(404, {"status": False, "message": "not found"})
+            return
+        try:
+            fields, image = self._parse_multipart(body)
+        except Exception as e:
+            self.cfg.count("bad_request")
+            self._send_json(400, {"status": False, "message": f"bad multipart: {e}"})
+            return
+        if image is None:
+            self.cfg.count("bad_request")
+            self._send_json(400, {"status": False, "message": "missing file"})
+            return
+        if not self._check_sign(fields):
+            self.cfg.count("sign_error")
+            self._send_json(401, {"status": False, "message": "sign error"})
+            return
+        if self.cfg.bucket is not None and not self.cfg.bucket.try_acquire():
+            self.cfg.count("throttled")
+            self._send_json(429, {"status": False, "message": "req limit exceeded"})
+            return
+
+        time.sleep(self.cfg.latency[endpoint].sample_seconds())
+        if random.random() < self.cfg.error_rate:
+            self.cfg.count("server_error")
+            self._send_json(500, {"status": False, "message": "server error"})
+            return
+
+        digest = hashlib.md5(image).hexdigest()
+        latex = SAMPLE_LATEX[int(digest[:8], 16) % len(SAMPLE_LATEX)]
+        conf = round(0.75 + (int(digest[8:12], 16) % 2500) / 10000.0, 4)
+        if endpoint == "turbo":
+            conf = round(conf - 0.08, 4)
+        self.cfg.count("ok")
+        self._send_json(200, {
+            "status": True,
+            "res": {"latex": latex, "conf": conf},
+            "request_id": "mock_" + digest[:16],
+        })
+
+    def _parse_multipart(self, body):
+        ctype = self.headers.get("Content-Type", "")
+        msg = BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + ctype.encode("latin-1") + b"\r\n\r\n" + body)
+        fields = {}
+        image = None
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename() is not None or name == "file":
+                image = payload
+            elif name:
+                fields[name] = payload.decode("utf-8")
+        return fields, image
+
+    def _check_sign(self, fields):
+        h = self.headers
+        app_id, ts, rnd, sign = h.get("app-id"), h.get("timestamp"), h.get("random-str"), h.get("sign")
+        if not (app_id and ts and rnd and sign) or app_id != self.cfg.app_id:
+            return False
+        try:
+            if abs(time.time() - int(ts)) > self.cfg.max_skew:
+                return False
+        except ValueError:
+            return False
+        params = dict(fields)
+        params.update({"app-id": app_id, "timestamp": ts, "random-str": rnd})
+        return compute_sign(params, self.cfg.app_secret) == sign
+
+
+def make_server(host, port, mock_config):
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.mock_config = mock_config
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 SimpleTeX 模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:600,0.4", help="标准接口延迟分布（毫秒）")
+    parser.add_argument("--turbo-latency", default="lognormal:250,0.4", help="轻量接口延迟分布（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--qps", type=float, default=0.0, help="限流速率，0 表示不限流；超出返回 429")
+    parser.add_argument("--burst", type=float, default=None, help="限流桶容量，默认等于 qps")
+    parser.add_argument("--app-id", help="默认读取 .ini 中的 APP_ID")
+    parser.add_argument("--app-secret", help="默认读取 .ini 中的 APP_SECRET")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    app_id, app_secret = args.app_id, args.app_secret
+    if not (app_id and app_secret):
+        try:
+            ini_id, ini_secret = get_credentials()
+        except ConfigError as e:
+            parser.error(f"未指定 --app-id/--app-secret，且无法从 .ini 读取凭据：\n{e}")
+        app_id, app_secret = app_id or ini_id, app_secret or ini_secret
+
+    cfg = MockConfig(app_id, app_secret, LatencyModel(args.latency), LatencyModel(args.turbo_latency),
+                     error_rate=args.error_rate, qps=args.qps, burst=args.burst, verbose=args.verbose)
+    server = make_server(args.host, args.port, cfg)
+    print(f"模拟服务已启动: http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"请求统计: {cfg.counters}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import threading
+from bisect import bisect_right
+
+from DisplayScaling import get_monitors_info
+
+
+def layout_signature(monitors):
+    """显示器布局指纹：只看几何与缩放，顺序无关"""
+    return tuple(sorted(
+        (int(m['x']), int(m['y']), int(m['width']), int(m['height']), float(m.get('scaling_factor', 1.0)))
+        for m in monitors
+    ))
+
+
+class MonitorLayout:
+    """不可变的显示器布局：预先算好虚拟桌面边界、相对坐标与按位置查找的索引"""
+
+    def __init__(self, monitors):
+        if not monitors:
+            raise ValueError("显示器列表为空")
+        self.signature = layout_signature(monitors)
+        self.min_x = min(int(m['x']) for m in monitors)
+        self.min_y = min(int(m['y']) for m in monitors)
+        self.max_x = max(int(m['x']) + int(m['width']) for m in monitors)
+        self.max_y = max(int(m['y']) + int(m['height']) for m in monitors)
+        self.total_width = self.max_x - self.min_x
+        self.total_height = self.max_y - self.min_y
+        # 复制一份并补上相对坐标，之后不再修改
+        self.monitors = tuple(
+            dict(m, relative_x=int(m['x']) - self.min_x, relative_y=int(m['y']) - self.min_y)
+            for m in monitors
+        )
+        self._build_index()
+
+    def _build_index(self):
+        # 按所有显示器的左右边缘把桌面切成竖条；每个竖条内按上边缘排序，查找时两次二分
+        self._xs = sorted({int(m['x']) for m in self.monitors} | {int(m['x']) + int(m['width']) for m in self.monitors})
+        self._slabs = []
+        for left, right in zip(self._xs, self._xs[1:]):
+            members = sorted(
+                (m for m in self.monitors if int(m['x']) <= left and int(m['x']) + int(m['width']) >= right),
+                key=lambda m: int(m['y']),
+            )
+            self._slabs.append(([int(m['y']) for m in members], members))
+
+    @property
+    def bounds(self):
+        return self.min_x, self.min_y, self.max_x, self.max_y
+
+    def monitor_at(self, x, y):
+        """返回包含该点的显示器，点落在显示器之间的空隙或桌面外时返回 None"""
+        i = bisect_right(self._xs, x) - 1
+        if i < 0 or i >= len(self._slabs):
+            return None
+        tops, members = self._slabs[i]
+        j = bisect_right(tops, y) - 1
+        # 镜像/重叠的显示器可能有多个上边缘不大于 y，向前找第一个覆盖 y 的
+        while j >= 0:
+            m = members[j]
+            if y < int(m['y']) + int(m['height']):
+                return m
+            j -= 1
+        return None
+
+    def nearest(self, x, y):
+        """返回包含该点或距其最近的显示器"""
+        hit = self.monitor_at(x, y)
+        if hit is not None:
+            return hit
+
+        def distance(m):
+            dx = max(int(m['x']) - x, 0, x - (int(m['x']) + int(m['width']) - 1))
+            dy = max(int(m['y']) - y, 0, y - (int(m['y']) + int(m['height']) - 1))
+            return dx * dx + dy * dy
+        return min(self.monitors, key=distance)
+
+
+class MssProbe:
+    """廉价的布局变化信号：每轮新建一个 mss 句柄只读显示器列表（mss 会缓存列表，复用句柄看不到拔插），
+    比完整枚举（含缩放比例等平台查询）便宜得多"""
+
+    def __call__(self):
+        import mss
+        with mss.mss() as sct:
+            return tuple((m['left'], m['top'], m['width'], m['height']) for m in sct.monitors[1:])
+
+
+class MonitorTopology:
+    """显示器拓扑服务：后台轮询廉价信号，变化时才完整枚举；布局确实变化时才重建并通知监听者"""
+
+    def __init__(self, enumerate_monitors=None, poll_interval=2.0, probe=None):
+        self.enumerate_monitors = enumerate_monitors or (lambda: get_monitors_info(allow_tk_fallback=False))
+        self.poll_interval = poll_interval
+        # () -> 可比较的值；None 表示每轮都完整枚举。默认只配合默认枚举方式使用
+        self.probe = probe if probe is not None or enumerate_monitors is not None else MssProbe()
+        self.listeners = []  # (old_layout, new_layout) -> None，在轮询线程中调用
+        self._lock = threading.Lock()
+        self._layout = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.rebuilds = 0
+
+    @property
+    def layout(self):
+        return self._layout
+
+    def refresh(self, monitors=None):
+        """重新枚举（或使用给定的显示器列表），布局变化时返回新布局，否则返回 None"""
+        if monitors is None:
+            monitors = self.enumerate_monitors()
+        # 先比指纹，布局没变就不重建索引
+        signature = layout_signature(monitors)
+        with self._lock:
+            old = self._layout
+            if old is not None and old.signature == signature:
+                return None
+        layout = MonitorLayout(monitors)
+        with self._lock:
+            old = self._layout
+            if old is not None and old.signature == signature:
+                return None
+            self._layout = layout
+            self.rebuilds += 1
+        for listener in list(self.listeners):
+            try:
+                listener(old, layout)
+            except Exception as e:
+                print(f"显示器布局监听回调异常: {e}")
+        return layout
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="monitor-topology", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        last = None
+        while not self._stop.wait(self.poll_interval):
+            if self.probe is not None:
+                try:
+                    signal = self.probe()
+                except Exception:
+                    signal = None  # 信号取不到时本轮退回完整枚举
+                if signal is not None and signal == last:
+                    continue
+                last = signal
+            try:
+                self.refresh()
+            except Exception as e:
+                # 拔插过程中枚举可能短暂失败，保留旧布局，下一轮再试
+                last = None
+                print(f"显示器枚举失败，保留当前布局: {e}")
+
+    def stop(self):
+        self._stop.set()
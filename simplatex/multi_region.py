@@ -0,0 +1,103 @@
+import queue
+import threading
+
+
+def reading_order(regions):
+    """按阅读顺序排列选区下标：先按行（纵向重叠过半视为同一行），行内从左到右"""
+    order = sorted(range(len(regions)), key=lambda i: (regions[i][1], regions[i][0]))
+    lines = []
+    for i in order:
+        left, top, right, bottom = regions[i]
+        for line in lines:
+            l_top, l_bottom = line['top'], line['bottom']
+            overlap = min(bottom, l_bottom) - max(top, l_top)
+            if overlap > 0.5 * min(bottom - top, l_bottom - l_top):
+                line['items'].append(i)
+                line['top'], line['bottom'] = min(top, l_top), max(bottom, l_bottom)
+                break
+        else:
+            lines.append({'top': top, 'bottom': bottom, 'items': [i]})
+    result = []
+    for line in sorted(lines, key=lambda ln: ln['top']):
+        result.extend(sorted(line['items'], key=lambda i: regions[i][0]))
+    return result
+
+
+class MultiRegionSession:
+    """一次覆盖层中框选多个区域：每框一个立即提交识别，全部返回后按阅读顺序合并"""
+
+    def __init__(self, ocr, on_complete, on_error, meta=None, max_in_flight=None, priority='interactive'):
+        self.ocr = ocr
+        self.priority = priority  # 交互框选为 interactive，整屏识别用 normal 让位给热键截图
+        # 限制本会话同时在识别队列中的区域数，给交互截图留出队列空位；add 会阻塞，需在后台线程调用
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.on_complete = on_complete  # (entries) -> None，entries 已按阅读顺序排列
+        self.on_error = on_error        # (exc) -> None，全部区域都失败时调用
+        self.meta = meta or {}
+        self._lock = threading.Lock()
+        self.entries = []  # dict(region, source, job, outcome)
+        self._finished = False
+        self._delivered = False
+        self.cancelled = False
+
+    def add(self, region, source):
+        """source 同 OcrWorker.submit；返回该区域序号，会话已取消时返回 None"""
+        entry = {'region': tuple(region), 'source': source, 'job': None, 'outcome': None}
+        if self._slots is not None:
+            # 已取消的任务不会回调，等待时要定期检查是否已取消
+            while not self._slots.acquire(timeout=0.2):
+                if self.cancelled:
+                    return None
+        if self.cancelled:
+            return None
+        with self._lock:
+            self.entries.append(entry)
+            index = len(self.entries)
+        try:
+            entry['job'] = self.ocr.submit(source,
+                                           on_done=lambda text, raw: self._settle(entry, ('done', text, raw)),
+                                           on_error=lambda exc: self._settle(entry, ('error', exc)),
+                                           meta=dict(self.meta, region=index), priority=self.priority)
+        except queue.Full as e:
+            self._settle(entry, ('error', RuntimeError(f"识别队列已满: {e}")))
+        return index
+
+    def _settle(self, entry, outcome):
+        with self._lock:
+            entry['outcome'] = outcome
+        if self._slots is not None:
+            self._slots.release()
+        self._maybe_complete()
+
+    def finish(self):
+        """框选结束；已提交的区域全部返回后回调 on_complete"""
+        with self._lock:
+            self._finished = True
+        self._maybe_complete()
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for e in self.entries if e['outcome'] is None)
+
+    def _maybe_complete(self):
+        with self._lock:
+            if self._delivered or not self._finished:
+                return
+            if any(e['outcome'] is None for e in self.entries):
+                return
+            self._delivered = True
+            entries = [self.entries[i] for i in reading_order([e['region'] for e in self.entries])]
+        ok = [e for e in entries if e['outcome'][0] == 'done']
+        if ok:
+            self.on_complete(entries)
+        elif entries:
+            self.on_error(entries[0]['outcome'][1])
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            self._delivered = True
+            entries = list(self.entries)
+        for e in entries:
+            if e['job'] is not None:
+                e['job'].cancel()
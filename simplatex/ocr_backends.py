@@ -0,0 +1,399 @@
+import importlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+from endpoint_policy import AUTO_ENDPOINT
+from http_session import PooledSession
+from resilience import ApiError, CircuitBreaker, is_retryable, parse_retry_after
+
+# 路由模式：auto 优先云端，云端不可用（无凭据、熔断、断网）时改用本地；cloud / local 固定使用一方
+ROUTE_MODES = ('auto', 'cloud', 'local')
+
+# 默认本地模型：pix2tex（LaTeX-OCR），CPU 可用，实例可直接对 PIL 图像调用
+DEFAULT_LOCAL_MODEL = "pix2tex.cli:LatexOCR"
+
+
+class OcrBackend:
+    """识别后端接口：输入 image_encoder.Encoded，返回 (latex, raw_json)；raw_json 与 SimpleTeX 的响应格式一致"""
+
+    name = "backend"
+    # 是否走重试/熔断/离线队列（只对网络后端有意义）
+    remote = False
+
+    def available(self):
+        return True
+
+    def cache_scope(self):
+        """缓存键的一部分；不同后端/模型的结果不能互相命中"""
+        return self.name
+
+    def recognize(self, payload, job=None):
+        raise NotImplementedError
+
+    def prewarm(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _span(job):
+    return job.span if job is not None else (lambda stage: nullcontext())
+
+
+class SimpleTexBackend(OcrBackend):
+    """SimpleTeX HTTP 接口：复用连接池，AUTO_ENDPOINT 时按策略对冲与复核"""
+
+    name = "simpletex"
+    remote = True
+
+    def __init__(self, api_url_getter, auth_getter, timeout=(3, 30), session=None, policy=None,
+                 pool_size=4, hedge_workers=2):
+        self.api_url_getter = api_url_getter  # () -> url 或 AUTO_ENDPOINT
+        self.auth_getter = auth_getter        # () -> (headers, data)
+        self.timeout = timeout
+        self._session = session
+        self._lock = threading.Lock()
+        self._pool_size = pool_size
+        # 自动选择接口的策略（endpoint_policy.EndpointPolicy），api_url_getter 返回 AUTO_ENDPOINT 时使用
+        self.policy = policy
+        self._hedge_pool = None
+        self._hedge_workers = hedge_workers
+        # (字节数, 秒) -> None，上传耗时反馈给编码器估计上行带宽
+        self.on_upload = None
+        # rate_limit.RequestScheduler：每个实际发出的请求先领令牌，None 表示不限流
+        self.scheduler = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = PooledSession(pool_maxsize=self._pool_size)
+        return self._session
+
+    @property
+    def hedge_pool(self):
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=self._hedge_workers,
+                                                          thread_name_prefix="ocr-hedge")
+        return self._hedge_pool
+
+    def available(self):
+        # 凭据缺失（如内网机器未配置）时视为不可用
+        try:
+            self.auth_getter()
+        except Exception:
+            return False
+        return True
+
+    def cache_scope(self):
+        return self.api_url_getter()
+
+    def resolve_url(self, api_url):
+        if api_url == AUTO_ENDPOINT:
+            if self.policy is None:
+                raise ValueError("未配置自动接口策略")
+            return self.policy.urls[self.policy.order()[0]]
+        return api_url
+
+    def prewarm(self):
+        self.session.prewarm(self.resolve_url(self.api_url_getter()))
+
+    def recognize(self, payload, job=None, api_url=None):
+        api_url = api_url or self.api_url_getter()
+        file = (payload.filename, payload.data, payload.mime)
+        if api_url == AUTO_ENDPOINT:
+            if self.policy is None:
+                raise ValueError("未配置自动接口策略")
+            # 对冲请求并行执行，各自的签名/解析耗时不单独计入，整体记为 upload
+            with _span(job)('upload'):
+                return self._post_auto(file, job)
+        text, obj = self._send(api_url, file, job)
+        return text, obj
+
+    def _admit(self, job):
+        """按任务优先级领取令牌；没有任务（离线补识别）按后台优先级"""
+        if self.scheduler is None:
+            return
+        if job is None:
+            self.scheduler.acquire('background')
+            return
+        waited = self.scheduler.acquire(job.priority, lambda: job.cancelled)
+        if job.trace is not None and waited > 0.001:
+            job.trace.record('rate_wait', waited)
+
+    def _send(self, api_url, file, job=None, record=True):
+        # 对冲/复核请求并行执行，只领令牌，不单独记录各阶段耗时
+        span = _span(job if record else None)
+        self._admit(job)
+        with span('sign'):
+            headers, data = self.auth_getter()
+        t0 = time.perf_counter()
+        with span('upload'):
+            res = self.session.post(api_url, files={"file": file}, data=data, headers=headers,
+                                    timeout=self.timeout)
+        if callable(self.on_upload):
+            self.on_upload(len(file[1]), time.perf_counter() - t0)
+        retry_after = None
+        if res.status_code == 429:
+            retry_after = parse_retry_after(res.headers.get("Retry-After"))
+            if self.scheduler is not None:
+                self.scheduler.on_throttled(retry_after)
+        if res.status_code == 429 or res.status_code >= 500:
+            raise ApiError(res.status_code, res.text[:200], retry_after=retry_after)
+        if self.scheduler is not None:
+            self.scheduler.on_success()
+        with span('parse'):
+            obj = json.loads(res.text)
+            text = obj["res"]["latex"]
+        return text, obj
+
+    def _timed_send(self, name, file, job=None):
+        t0 = time.perf_counter()
+        try:
+            result = self._send(self.policy.urls[name], file, job, record=False)
+        except Exception:
+            self.policy.observe(name, time.perf_counter() - t0, ok=False)
+            raise
+        self.policy.observe(name, time.perf_counter() - t0, ok=True)
+        return result
+
+    def _post_auto(self, file, job):
+        """首发接口超过对冲期限未返回（或已失败）时加发备用接口，取先成功的结果；
+        首发结果置信度过低时再用另一接口复核"""
+        policy = self.policy
+        cancelled = lambda: job is not None and job.cancelled
+        first, second = policy.order()
+        futures = {self.hedge_pool.submit(self._timed_send, first, file, job): first}
+        pending = set(futures)
+        hedge_delay = policy.hedge_delay(first)
+        hedged = False
+        winner = result = last_exc = None
+        while pending:
+            timeout = hedge_delay if len(futures) == 1 else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                    winner = futures[future]
+                    break
+                except Exception as e:
+                    last_exc = e
+            if winner is not None:
+                break
+            if len(futures) == 1 and not cancelled():
+                # 超过对冲期限或首发失败：加发备用接口
+                hedged = not done
+                future = self.hedge_pool.submit(self._timed_send, second, file, job)
+                futures[future] = second
+                pending.add(future)
+        if winner is None:
+            raise last_exc if last_exc is not None else RuntimeError("识别请求已取消")
+
+        text, obj = result
+        escalated = False
+        if policy.needs_escalation(winner, obj) and not cancelled():
+            other = second if winner == first else first
+            # 另一接口若已在对冲中，直接等它的结果；否则补发一次
+            running = [f for f in pending if futures[f] == other]
+            try:
+                alt_text, alt_obj = running[0].result() if running else self._timed_send(other, file, job)
+                alt_conf = (alt_obj.get("res") or {}).get("conf")
+                conf = (obj.get("res") or {}).get("conf")
+                if alt_conf is None or conf is None or alt_conf >= conf:
+                    text, obj, winner = alt_text, alt_obj, other
+                escalated = True
+            except Exception as e:
+                print(f"复核请求失败，沿用 {winner} 的结果: {e}")
+        policy.record_win(winner, hedged=hedged, escalated=escalated)
+        return text, dict(obj, endpoint=winner, hedged=hedged, escalated=escalated)
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+
+
+# ---- 本地模型：以下函数在工作进程中执行，必须是模块级函数才能被 spawn 方式序列化 ----
+
+_model = None
+
+
+def _load_factory(spec):
+    module_name, _, attr = spec.partition(":")
+    factory = importlib.import_module(module_name)
+    for part in (attr or "load").split("."):
+        factory = getattr(factory, part)
+    return factory
+
+
+def _init_worker(spec):
+    # 每个工作进程启动时加载一次模型，之后常驻内存
+    global _model
+    _model = _load_factory(spec)()
+
+
+def _ping():
+    return _model is not None
+
+
+def _run_model(data):
+    from io import BytesIO
+    from PIL import Image
+    t0 = time.perf_counter()
+    out = _model(Image.open(BytesIO(data)).convert("RGB"))
+    if isinstance(out, dict):
+        text, conf = out.get("latex", ""), out.get("conf")
+    else:
+        text, conf = str(out), None
+    return text, conf, time.perf_counter() - t0
+
+
+class LocalModelBackend(OcrBackend):
+    """本地 CPU 模型：常驻进程池，每个进程启动时加载一次模型，请求只传编码后的图片字节
+
+    model 为 "模块:工厂" 形式，工厂无参调用后返回可调用对象 (PIL.Image) -> latex 或 {'latex', 'conf'}。
+    """
+
+    name = "local"
+
+    def __init__(self, model=DEFAULT_LOCAL_MODEL, workers=1, timeout=60.0):
+        self.model = model
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._warm = threading.Event()
+        self.load_error = None
+        self.requests = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """读取 .ini 的 [Local] 段；未启用时返回 None"""
+        if config is None or not config.has_section("Local"):
+            return None
+        if not config.getboolean("Local", "ENABLED", fallback=True):
+            return None
+        return cls(model=config.get("Local", "MODEL", fallback=DEFAULT_LOCAL_MODEL),
+                   workers=config.getint("Local", "WORKERS", fallback=1),
+                   timeout=config.getfloat("Local", "TIMEOUT", fallback=60.0))
+
+    def cache_scope(self):
+        return f"local:{self.model}"
+
+    def available(self):
+        # 预热（或一次本地请求）成功加载模型后才算可用：冷启动进程池与加载模型不能占用某次识别的超时，
+        # 此前自动路由仍走云端，云端失败的截图进离线队列
+        return self._warm.is_set()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                     initargs=(self.model,))
+        return self._pool
+
+    def prewarm(self):
+        """启动工作进程并加载模型；可重复调用，已就绪时立即返回"""
+        if self._warm.is_set():
+            return
+        try:
+            # 每个进程启动时先跑初始化函数；ping 返回即说明模型已加载完毕
+            futures = [self.pool.submit(_ping) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+        except Exception as e:
+            self._reset(e)
+            raise
+        self.load_error = None
+        self._warm.set()
+
+    def recognize(self, payload, job=None):
+        with _span(job)('upload'):
+            try:
+                text, conf, infer = self.pool.submit(_run_model, bytes(payload.data)).result(timeout=self.timeout)
+            except Exception as e:
+                from concurrent.futures.process import BrokenProcessPool
+                if isinstance(e, BrokenProcessPool):
+                    # 工作进程崩溃（或模型加载失败），下次请求重新建池
+                    self._reset(e)
+                raise
+        self._warm.set()
+        self.requests += 1
+        return text, {"status": True, "res": {"latex": text, "conf": conf}, "endpoint": "local",
+                      "infer_ms": round(infer * 1000, 1)}
+
+    def _reset(self, exc):
+        self.load_error = str(exc)
+        self._warm.clear()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+class BackendRouter:
+    """在云端与本地后端之间选择；auto 模式下云端不可用或网络失败时改走本地"""
+
+    def __init__(self, cloud, local=None, mode='auto', breaker=None):
+        self.cloud = cloud
+        self.local = local
+        self.mode = mode  # 字符串或返回字符串的函数，取值见 ROUTE_MODES
+        self.breaker = breaker
+        self.routed = {}     # 后端名 -> 选中次数
+        self.fallbacks = 0
+
+    def current_mode(self):
+        mode = self.mode() if callable(self.mode) else self.mode
+        return mode if mode in ROUTE_MODES else 'auto'
+
+    def choose(self):
+        mode = self.current_mode()
+        if self.local is None or mode == 'cloud':
+            backend = self.cloud
+        elif mode == 'local':
+            backend = self.local
+        elif not self.local.available():
+            # 本地模型尚未预热完成或加载失败时留在云端，由熔断与离线队列兜底
+            backend = self.cloud
+        elif self.breaker is not None and self.breaker.state == CircuitBreaker.OPEN:
+            backend = self.local
+        elif not self.cloud.available():
+            backend = self.local
+        else:
+            backend = self.cloud
+        self.routed[backend.name] = self.routed.get(backend.name, 0) + 1
+        return backend
+
+    def fallback(self, backend, exc):
+        """云端请求失败后可改用的后端；没有则返回 None"""
+        if (backend is self.cloud and self.local is not None and self.local.available()
+                and self.current_mode() == 'auto' and is_retryable(exc)):
+            self.fallbacks += 1
+            return self.local
+        return None
+
+    def prewarm(self):
+        if self.local is not None and self.current_mode() != 'cloud':
+            self.local.prewarm()
+
+    def close(self):
+        self.cloud.close()
+        if self.local is not None:
+            self.local.close()
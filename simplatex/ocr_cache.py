@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".tex-ocr", "cache")
+
+
+class OcrCache:
+    """按内容寻址的识别结果缓存：内存 LRU + 磁盘存储（按总大小淘汰）"""
+
+    def __init__(self, cache_dir=None, memory_items=256, max_disk_bytes=32 * 1024 * 1024):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        # 磁盘索引 key -> [大小, 最近访问时间]，避免每次写入都扫描目录
+        self._disk_index = {}
+        self._disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # 磁盘索引在首次读写时才扫描，不拖慢启动
+        self._disk_ok = None
+
+    @staticmethod
+    def make_key(content, endpoint, size=None):
+        """content 为像素缓冲区或编码后的图片字节，endpoint 为接口地址"""
+        h = hashlib.blake2b(digest_size=20)
+        if size is not None:
+            h.update(f"{int(size[0])}x{int(size[1])}|".encode())
+        h.update(content)
+        h.update(b"|" + str(endpoint).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _ensure_index(self):
+        if self._disk_ok is None:
+            with self._lock:
+                if self._disk_ok is None:
+                    self._disk_ok = self._load_disk_index()
+        return self._disk_ok
+
+    def _load_disk_index(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for sub in os.listdir(self.cache_dir):
+                sub_dir = os.path.join(self.cache_dir, sub)
+                if not os.path.isdir(sub_dir):
+                    continue
+                for name in os.listdir(sub_dir):
+                    if not name.endswith(".json"):
+                        continue
+                    st = os.stat(os.path.join(sub_dir, name))
+                    self._disk_index[name[:-5]] = [st.st_size, st.st_mtime]
+                    self._disk_bytes += st.st_size
+            return True
+        except Exception as e:
+            print(f"识别缓存目录不可用，仅使用内存缓存: {e}")
+            return False
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        self._ensure_index()
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            entry = self._disk_index.get(key) if self._disk_ok else None
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path, None)
+        except Exception:
+            with self._lock:
+                self._forget_disk(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._disk_index:
+                self._disk_index[key][1] = os.path.getmtime(path)
+            self._remember(key, value)
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._ensure_index()
+        with self._lock:
+            self._remember(key, value)
+            if not self._disk_ok:
+                return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"写入识别缓存失败: {e}")
+            return
+        with self._lock:
+            self._forget_disk(key)
+            self._disk_index[key] = [len(data), os.path.getmtime(path)]
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _forget_disk(self, key):
+        entry = self._disk_index.pop(key, None)
+        if entry is not None:
+            self._disk_bytes -= entry[0]
+
+    def _evict_disk(self):
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # 按最近访问时间从旧到新淘汰
+        for key, _ in sorted(self._disk_index.items(), key=lambda kv: kv[1][1]):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._forget_disk(key)
+            try:
+                os.remove(self._path(key))
+            except Exception:
+                pass
+
+    def stats(self):
+        self._ensure_index()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_items": len(self._disk_index),
+                "disk_bytes": self._disk_bytes,
+            }
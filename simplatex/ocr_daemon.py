@@ -0,0 +1,535 @@
+"""本地识别守护进程：常驻加载截图、识别与历史组件，通过本机 HTTP 或 Unix 套接字对外提供服务。
+
+编辑器插件、笔记脚本等只需发一个请求即可拿到结果，不必各自启动进程、建立连接池。
+
+用法示例：
+    python simplatex/ocr_daemon.py --port 8766 --socket ~/.tex-ocr/daemon.sock
+    curl --data-binary @formula.png http://127.0.0.1:8766/ocr
+    curl -d '{"region": [100, 200, 600, 300]}' http://127.0.0.1:8766/capture
+    curl --unix-socket ~/.tex-ocr/daemon.sock "http://localhost/history?q=frac&limit=5"
+
+接口（均返回 JSON，失败时 {"status": false, "message": ...}）：
+    GET  /health                  运行状态、队列、缓存与连接统计
+    GET  /metrics                 Prometheus 文本格式的耗时统计
+    POST /ocr                     请求体为图片字节，或 JSON {"path": 本地图片路径}；
+                                  path 只在配置了 [Daemon] PATH_ROOT（或 --path-root）时接受，且须位于该目录内
+    POST /capture                 JSON {"region": [l, t, r, b]}（虚拟桌面坐标）或 {"monitor": 下标}；
+                                  {"monitor": 下标, "scan": true} 检测整屏公式块后逐块识别
+    /ocr 与 /capture 可带 ?priority=interactive|normal|speculative|background 指定限流优先级，
+    默认 /capture 为 interactive、/ocr 与整屏识别为 normal
+    网络中断时返回 202：图片已存入离线队列，恢复后自动补识别并写入识别历史
+    GET  /history?q=&limit=       搜索识别历史
+    GET  /history/<id>/thumb      历史缩略图（PNG）
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from SimpletexApi import sign_request, get_credentials, load_config, ConfigError, API_URLS
+from endpoint_policy import AUTO_ENDPOINT, EndpointPolicy
+from history import HistoryStore
+from image_encoder import AdaptiveEncoder
+from metrics import MetricsRegistry
+from monitor_topology import MonitorTopology
+from multi_region import MultiRegionSession
+from ocr_backends import LocalModelBackend
+from ocr_worker import OcrWorker
+from preprocess import Preprocessor
+from rate_limit import PRIORITIES, RequestScheduler
+from region_scan import BlockDetector, positioned_results
+from resilience import OfflineQueue, OfflineQueued, default_offline_dir
+from screenshot import MultiMonitorScreenshot, CaptureError
+
+
+def default_socket_path():
+    return os.path.join(os.path.expanduser("~"), ".tex-ocr", "daemon.sock")
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class OcrService:
+    """守护进程内所有客户端共享的识别管线：一个连接池、一份缓存、一个抓图线程"""
+
+    def __init__(self, endpoint='turbo', workers=4, max_pending=32, timeout=60.0, history=True, route='auto',
+                 path_root=None):
+        try:
+            ini = load_config()
+        except ConfigError as e:
+            print(e, file=sys.stderr)
+            ini = None
+        self.endpoint = endpoint
+        self.timeout = timeout  # 单个请求等待识别结果的上限（秒）
+        # /ocr 的 path 只能指向该目录内的文件；None 表示不接受 path，避免任何本机进程借守护进程读取任意文件
+        self.path_root = os.path.realpath(os.path.expanduser(path_root)) if path_root else None
+        self.metrics = MetricsRegistry()
+        self.topology = MonitorTopology()
+        self.screenshot = MultiMonitorScreenshot([])
+        # mss 句柄按线程保存，抓图固定在一个常驻线程上，避免每个请求线程各开一个
+        self.capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+        self.detector = BlockDetector()
+        self.policy = EndpointPolicy.from_config(ini, API_URLS)
+        self.local = LocalModelBackend.from_config(ini)
+        self.history = None
+        # 断网时截图存入离线队列（与界面程序分开目录，避免两个进程同时补识别同一条），
+        # 恢复后补识别的结果写入识别历史，客户端可通过 /history 取回
+        try:
+            offline = OfflineQueue(os.path.join(os.path.dirname(default_offline_dir()), "offline-daemon"))
+        except Exception as e:
+            offline = None
+            print(f"离线队列不可用，断网时请求将直接失败: {e}", file=sys.stderr)
+        # 各客户端的请求互不相关，结果完成即交付，不按提交顺序排队
+        self.ocr = OcrWorker(self.get_api_url, sign_request, workers=workers, max_pending=max_pending,
+                             preprocessor=Preprocessor.from_config(ini), policy=self.policy,
+                             local=self.local, route=route, ordered=False, offline=offline,
+                             on_offline_done=self.on_offline_done,
+                             encoder=AdaptiveEncoder.from_config(ini),
+                             scheduler=RequestScheduler.from_config(ini))
+        self.history = None
+        if history and (ini is None or ini.getboolean("History", "ENABLED", fallback=True)):
+            try:
+                self.history = HistoryStore(
+                    max_items=ini.getint("History", "MAX_ITEMS", fallback=5000) if ini else 5000,
+                    max_age_days=ini.getint("History", "MAX_AGE_DAYS", fallback=180) if ini else 180)
+            except Exception as e:
+                print(f"识别历史不可用: {e}", file=sys.stderr)
+        self.started = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def get_api_url(self):
+        return AUTO_ENDPOINT if self.endpoint == AUTO_ENDPOINT else API_URLS[self.endpoint]
+
+    def warm_up(self):
+        """启动时预热：枚举显示器、建立连接池、加载本地模型"""
+        try:
+            self.topology.refresh()
+            self.topology.start()
+        except Exception as e:
+            print(f"枚举显示器失败，截图接口不可用: {e}", file=sys.stderr)
+        self.ocr.prewarm()
+        if self.local is not None:
+            try:
+                self.ocr.prewarm_local()
+            except Exception as e:
+                print(f"本地模型加载失败: {e}", file=sys.stderr)
+
+    def on_offline_done(self, meta, text, raw):
+        # 在补识别线程中调用
+        if self.history is not None:
+            self.history.add(text, raw, hotkey=meta.get('hotkey'))
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    # ---- 识别 ----
+
+    def recognize(self, source, hotkey='daemon', frame=None, priority='normal'):
+        """提交识别并阻塞等待结果；在请求处理线程中调用"""
+        trace = self.metrics.new_trace()
+        trace.mark('pressed')
+        done = threading.Event()
+        box = {}
+
+        def on_done(text, raw):
+            box['result'] = (text, raw)
+            done.set()
+
+        def on_error(exc):
+            box['error'] = exc
+            done.set()
+
+        try:
+            job = self.ocr.submit(source, on_done=on_done, on_error=on_error, trace=trace, meta={'hotkey': hotkey},
+                                  priority=priority)
+        except queue.Full:
+            raise RequestError(503, f"识别队列已满（{self.ocr.max_pending}），请稍后重试")
+        if not done.wait(self.timeout):
+            job.cancel()
+            trace.finish(ok=False, error="timeout")
+            raise RequestError(504, f"识别超时（{self.timeout:.0f}s）")
+        if 'error' in box:
+            exc = box['error']
+            trace.finish(ok=False, error=exc)
+            status = 202 if isinstance(exc, OfflineQueued) else 502
+            raise RequestError(status, str(exc))
+        text, raw = box['result']
+        trace.finish(ok=True)
+        if self.history is not None:
+            self.history.add(text, raw, hotkey=hotkey, durations=trace.to_dict()['durations_ms'], frame=frame)
+        res = raw.get('res') or {}
+        return {
+            'status': True,
+            'latex': text,
+            'conf': res.get('conf'),
+            'endpoint': raw.get('endpoint'),
+            'cached': bool(raw.get('cached')),
+            'timings_ms': trace.to_dict()['durations_ms'],
+        }
+
+    def ocr_image(self, body, content_type, priority=None):
+        priority = _priority(priority, 'normal')
+        if content_type.startswith("application/json"):
+            args = _json(body)
+            path = args.get('path')
+            if not path or not isinstance(path, str):
+                raise RequestError(400, "缺少 path")
+            return self.recognize(self._resolve_path(path), priority=priority)
+        if not body:
+            raise RequestError(400, "请求体为空，应为图片字节或 JSON")
+        return self.recognize(bytes(body), priority=priority)
+
+    def _resolve_path(self, path):
+        """把 path 解析为 path_root 内的真实路径；符号链接与 .. 都按解析后的位置判断"""
+        if self.path_root is None:
+            raise RequestError(403, "未配置 [Daemon] PATH_ROOT，不接受 path，请直接发送图片字节")
+        real = os.path.realpath(os.path.join(self.path_root, os.path.expanduser(path)))
+        try:
+            inside = os.path.commonpath([real, self.path_root]) == self.path_root
+        except ValueError:
+            inside = False  # Windows 下位于不同盘符
+        if not inside:
+            raise RequestError(403, f"path 不在允许的目录内: {path}")
+        if not os.path.isfile(real):
+            raise RequestError(404, f"文件不存在: {path}")
+        return real
+
+    # ---- 截图 ----
+
+    def _monitor(self, index):
+        layout = self.topology.layout
+        if layout is None:
+            raise RequestError(503, "尚未获取显示器布局")
+        try:
+            return layout.monitors[int(index)]
+        except (IndexError, ValueError, TypeError):
+            raise RequestError(400, f"显示器下标无效: {index}（共 {len(layout.monitors)} 个）")
+
+    def _grab(self, fn, *args):
+        try:
+            return self.capture_executor.submit(fn, *args).result()
+        except CaptureError as e:
+            raise RequestError(500, str(e))
+
+    def capture(self, body, priority=None):
+        args = _json(body)
+        priority = priority or args.get('priority')
+        if args.get('region') is not None:
+            try:
+                left, top, right, bottom = (int(v) for v in args['region'])
+            except (TypeError, ValueError):
+                raise RequestError(400, "region 应为 [left, top, right, bottom]")
+            if right - left < 2 or bottom - top < 2:
+                raise RequestError(400, "选区太小")
+            frame = self._grab(self.screenshot.grab_area, left, top, right, bottom)
+            return dict(self.recognize(frame, hotkey='daemon', frame=frame,
+                                       priority=_priority(priority, 'interactive')),
+                        region=[left, top, right, bottom])
+        if args.get('monitor') is None:
+            raise RequestError(400, "需要 region 或 monitor")
+        monitor = self._monitor(args['monitor'])
+        frame = self._grab(self.screenshot.grab_monitor, monitor)
+        if args.get('scan'):
+            return self.scan(frame, monitor, _priority(priority, 'normal'))
+        return self.recognize(frame, hotkey='daemon', frame=frame, priority=_priority(priority, 'interactive'))
+
+    def scan(self, frame, monitor, priority='normal'):
+        blocks = self.detector.detect(frame)
+        origin = (int(monitor['x']), int(monitor['y']))
+        if not blocks:
+            return {'status': True, 'results': [], 'detect_ms': self.detector.last_ms}
+        done = threading.Event()
+        box = {}
+        session = MultiRegionSession(
+            self.ocr,
+            on_complete=lambda entries: (box.setdefault('entries', entries), done.set()),
+            on_error=lambda exc: (box.setdefault('error', exc), done.set()),
+            meta={'hotkey': 'daemon-scan'},
+            # 给其他客户端在识别队列中留出空位
+            max_in_flight=max(1, self.ocr.max_pending // 2),
+            priority=priority,
+        )
+        for block in blocks:
+            session.add(block, frame.crop(*block))
+        session.finish()
+        if not done.wait(self.timeout):
+            session.cancel()
+            raise RequestError(504, f"整屏识别超时（{self.timeout:.0f}s）")
+        if 'error' in box:
+            raise RequestError(502, str(box['error']))
+        if self.history is not None:
+            for entry in box['entries']:
+                if entry['outcome'][0] == 'done':
+                    self.history.add(entry['outcome'][1], entry['outcome'][2], hotkey='daemon-scan',
+                                     frame=entry['source'])
+        return {'status': True, 'results': positioned_results(box['entries'], origin),
+                'detect_ms': self.detector.last_ms}
+
+    # ---- 状态 / 历史 ----
+
+    def health(self):
+        layout = self.topology.layout
+        return {
+            'status': True,
+            'uptime_s': round(time.time() - self.started, 1),
+            'requests': self.requests,
+            'pending': self.ocr.pending(),
+            'max_pending': self.ocr.max_pending,
+            'offline_pending': self.ocr.offline_pending(),
+            'breaker': self.ocr.breaker.state,
+            'endpoint': self.endpoint,
+            'routed': dict(self.ocr.router.routed),
+            'local': self.local.model if self.local is not None else None,
+            'monitors': len(layout.monitors) if layout is not None else 0,
+            'cache': self.ocr.cache_stats(),
+            'encoder': self.ocr.encoder.snapshot(),
+            'rate_limit': self.ocr.scheduler_stats(),
+        }
+
+    def search_history(self, query):
+        if self.history is None:
+            raise RequestError(404, "识别历史未启用")
+        params = parse_qs(query)
+        text = params.get('q', [''])[0]
+        try:
+            limit = max(1, min(1000, int(params.get('limit', ['50'])[0])))
+        except ValueError:
+            raise RequestError(400, "limit 应为整数")
+        return {'status': True, 'results': self.history.search(text, limit=limit)}
+
+    def thumbnail(self, capture_id):
+        if self.history is None:
+            raise RequestError(404, "识别历史未启用")
+        thumb = self.history.thumbnail(capture_id)
+        if not thumb:
+            raise RequestError(404, "没有该记录的缩略图")
+        return thumb
+
+    def close(self):
+        self.topology.stop()
+        self.capture_executor.shutdown(wait=False)
+        self.ocr.close()
+        self.screenshot.close()
+        if self.history is not None:
+            self.history.close()
+
+
+def _query_priority(query):
+    return parse_qs(query).get('priority', [None])[0]
+
+
+def _priority(value, default):
+    if not value:
+        return default
+    if value not in PRIORITIES:
+        raise RequestError(400, f"未知的优先级: {value}，可选 {', '.join(PRIORITIES)}")
+    return value
+
+
+def _json(body):
+    if not body:
+        return {}
+    try:
+        obj = json.loads(body)
+    except ValueError as e:
+        raise RequestError(400, f"JSON 解析失败: {e}")
+    if not isinstance(obj, dict):
+        raise RequestError(400, "请求体应为 JSON 对象")
+    return obj
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    server_version = "TexOcrDaemon/1.0"
+    protocol_version = "HTTP/1.1"  # 客户端可复用连接连续发请求
+
+    @property
+    def service(self) -> OcrService:
+        return self.server.service
+
+    def address_string(self):
+        # Unix 套接字没有客户端地址
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            sys.stderr.write("%s - %s\n" % (self.address_string(), fmt % args))
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _check_access(self):
+        # 浏览器页面会带 Origin；拒绝它们，防止网页借本机端口截屏或读取历史
+        if self.headers.get("Origin"):
+            raise RequestError(403, "不接受浏览器跨域请求")
+        if isinstance(self.client_address, tuple):
+            host = (self.headers.get("Host") or "").rsplit(":", 1)[0].strip("[]")
+            if host not in ("127.0.0.1", "localhost", "::1"):
+                raise RequestError(403, f"不允许的 Host: {host}")
+        token = self.server.token
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            raise RequestError(401, "缺少或错误的访问令牌")
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            self._check_access()
+            self.service.count_request()
+            path = url.path.rstrip("/") or "/"
+            if method == "GET" and path == "/health":
+                self._send_json(200, self.service.health())
+            elif method == "GET" and path == "/metrics":
+                self._send(200, self.service.metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            elif method == "GET" and path == "/history":
+                self._send_json(200, self.service.search_history(url.query))
+            elif method == "GET" and path.startswith("/history/") and path.endswith("/thumb"):
+                try:
+                    capture_id = int(path.split("/")[2])
+                except ValueError:
+                    raise RequestError(400, "记录 id 应为整数")
+                self._send(200, self.service.thumbnail(capture_id), "image/png")
+            elif method == "POST" and path == "/ocr":
+                self._send_json(200, self.service.ocr_image(body, self.headers.get("Content-Type", ""),
+                                                            _query_priority(url.query)))
+            elif method == "POST" and path == "/capture":
+                self._send_json(200, self.service.capture(body, _query_priority(url.query)))
+            else:
+                raise RequestError(404, f"未知接口: {method} {url.path}")
+        except RequestError as e:
+            self._send_json(e.status, {"status": False, "message": str(e)})
+        except Exception as e:
+            self._send_json(500, {"status": False, "message": f"内部错误: {e}"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def _configure(server, service, token, verbose):
+    server.daemon_threads = True
+    server.service = service
+    server.token = token
+    server.verbose = verbose
+    return server
+
+
+def make_http_server(host, port, service, token=None, verbose=False):
+    return _configure(ThreadingHTTPServer((host, port), DaemonHandler), service, token, verbose)
+
+
+if hasattr(socket, "AF_UNIX"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        def server_bind(self):
+            # 上次异常退出可能留下套接字文件
+            if os.path.exists(self.server_address):
+                os.unlink(self.server_address)
+            os.makedirs(os.path.dirname(self.server_address) or ".", exist_ok=True)
+            super().server_bind()
+            # 只允许当前用户连接
+            os.chmod(self.server_address, 0o600)
+
+        def server_close(self):
+            super().server_close()
+            try:
+                os.unlink(self.server_address)
+            except OSError:
+                pass
+
+
+def make_unix_server(path, service, token=None, verbose=False):
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("当前平台不支持 Unix 套接字，请使用 --port")
+    return _configure(UnixHTTPServer(path, DaemonHandler), service, token, verbose)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="tex-ocr 本地识别守护进程")
+    parser.add_argument("--host", default="127.0.0.1", help="只建议监听本机地址")
+    parser.add_argument("--port", type=int, default=8766, help="HTTP 端口，0 表示不开 HTTP")
+    parser.add_argument("--socket", nargs="?", const=default_socket_path(), default=None,
+                        help=f"同时监听 Unix 套接字（默认路径 {default_socket_path()}）")
+    parser.add_argument("--endpoint", choices=sorted(API_URLS) + [AUTO_ENDPOINT], default=AUTO_ENDPOINT,
+                        help="识别接口")
+    parser.add_argument("--route", choices=("auto", "cloud", "local"), default="auto",
+                        help="配置了 [Local] 本地模型时的后端选择")
+    parser.add_argument("-j", "--workers", type=int, default=4, help="识别工作线程数")
+    parser.add_argument("--max-pending", type=int, default=32, help="识别队列上限，超出返回 503")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求等待结果的上限（秒）")
+    parser.add_argument("--no-history", action="store_true", help="不写入、不提供识别历史")
+    parser.add_argument("--path-root", default=None,
+                        help="/ocr 可按 path 读取的图片目录（覆盖 [Daemon] PATH_ROOT）；不设置时不接受 path")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.port == 0 and not args.socket:
+        parser.error("--port 为 0 时需要指定 --socket")
+    try:
+        get_credentials()
+    except ConfigError as e:
+        print(f"未配置云端凭据，只能使用本地模型或缓存: {e}", file=sys.stderr)
+    try:
+        daemon_ini = load_config()
+        token = daemon_ini.get("Daemon", "TOKEN", fallback=None) or None
+        path_root = daemon_ini.get("Daemon", "PATH_ROOT", fallback=None) or None
+    except ConfigError:
+        token = path_root = None
+    path_root = args.path_root or path_root
+
+    service = OcrService(endpoint=args.endpoint, workers=max(1, args.workers), max_pending=args.max_pending,
+                         timeout=args.timeout, history=not args.no_history, route=args.route,
+                         path_root=path_root)
+    servers = []
+    try:
+        if args.port:
+            servers.append(make_http_server(args.host, args.port, service, token, args.verbose))
+            print(f"守护进程已启动: http://{args.host}:{args.port}", file=sys.stderr)
+        if args.socket:
+            servers.append(make_unix_server(os.path.expanduser(args.socket), service, token, args.verbose))
+            print(f"守护进程已监听 Unix 套接字: {args.socket}", file=sys.stderr)
+    except Exception:
+        for server in servers:
+            server.server_close()
+        service.close()
+        raise
+    threading.Thread(target=service.warm_up, name="daemon-warmup", daemon=True).start()
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, name="daemon-unix", daemon=True).start()
+    try:
+        servers[0].serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers[1:]:
+            server.shutdown()
+        for server in servers:
+            server.server_close()
+        service.close()
+        print(f"共处理 {service.requests} 个请求", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,469 @@
-import json
-import requests
+import queue
+import threading
+import time
+from contextlib import nullcontext
 from threading import Thread
 
+from image_encoder import AdaptiveEncoder, Encoded
+from ocr_backends import BackendRouter, SimpleTexBackend
+from ocr_cache import OcrCache
+from rate_limit import RequestNotSent, RequestScheduler, priority_level
+from resilience import ApiError, CircuitBreaker, CircuitOpenError, OfflineQueued, RetryPolicy, is_retryable
+
+
+class OcrJob:
+    """一次识别任务的句柄，可用于查询状态或取消"""
+
+    def __init__(self, seq, source, on_done, on_error, trace=None, meta=None, priority='normal'):
+        self.seq = seq
+        # rate_limit.PRIORITIES 中的名称：决定出队与领取限流令牌的先后
+        self.priority = priority
+        self.level = priority_level(priority)
+        self.order = 0  # 同一优先级内的提交序号，按它顺序交付
+        self.trace = trace  # metrics.CaptureTrace，可为 None
+        self.meta = meta or {}  # 随离线记录一起保存，如热键
+        self.source = source
+        self.on_done = on_done
+        self.on_error = on_error
+        self.state = 'queued'  # queued / running / waiting / finished
+        self.cancelled = False
+        self.submitted_at = time.monotonic()
+
+    def span(self, stage):
+        if self.trace is None:
+            return nullcontext()
+        return self.trace.span(stage)
+
+    def cancel(self):
+        # 排队中的任务不会再发请求；已发出的请求结果会被丢弃
+        self.cancelled = True
+
 
 class OcrWorker:
-    def __init__(self, api_url_getter, auth_getter, on_done, on_error, timeout=(3, 30)):
-        self.api_url_getter = api_url_getter  # () -> url
-        self.auth_getter = auth_getter        # () -> (headers, data)
+    def __init__(self, api_url_getter, auth_getter, on_done=None, on_error=None, timeout=(3, 30), session=None,
+                 cache=None, workers=2, max_pending=8, preprocessor=None, policy=None, retry=None,
+                 breaker=None, offline=None, on_offline_done=None, drain_interval=10.0, local=None, route='auto',
+                 ordered=True, encoder=None, scheduler=None):
+        self.api_url_getter = api_url_getter  # () -> url 或 AUTO_ENDPOINT
         self.on_done = on_done                # (result_text, raw_json)
         self.on_error = on_error              # (exc)
-        self.timeout = timeout
+        # SimpleTeX 接口只是后端之一：跨截图复用连接池（首次使用或后台预热时创建），
+        # 对冲时每个任务可能同时占用两条连接
+        self.http = SimpleTexBackend(api_url_getter, auth_getter, timeout=timeout, session=session, policy=policy,
+                                     pool_size=max(4, workers * 2), hedge_workers=max(2, workers * 2))
+        # 识别结果缓存；传 False 可关闭
+        self.cache = OcrCache() if cache is None else (cache or None)
+        # 上传前的图片预处理（裁边/灰度/缩放），None 表示原样上传
+        self.preprocessor = preprocessor
+        # 按选区大小与实测上行带宽选择编码格式与压缩级别
+        self.encoder = encoder or AdaptiveEncoder()
+        self.http.on_upload = self.encoder.observe_upload
+        # 接口 QPS/配额限流，所有提交路径（含离线补识别）共用；429 时自动降速
+        self.scheduler = scheduler or RequestScheduler()
+        self.http.scheduler = self.scheduler
+        # 可重试错误按退避重试；熔断打开时直接失败，截图写入离线队列，恢复后由后台线程补识别
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        # 本地模型后端（ocr_backends.LocalModelBackend，可为 None）与路由；route 为模式字符串或返回它的函数
+        self.router = BackendRouter(self.http, local, mode=route, breaker=self.breaker)
+        self.offline = offline  # resilience.OfflineQueue，None 表示不做离线保存
+        self.on_offline_done = on_offline_done  # (meta, result_text, raw_json)
+        self.drain_interval = drain_interval
+        self._drain_wakeup = threading.Event()
+        self.breaker.listeners.append(self._on_breaker_change)
+        # 单飞：同一 key 的并发请求只发一次，其余任务等待共享结果
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
 
-    def submit(self, image_path: str):
-        Thread(target=self._do_request, args=(image_path,), daemon=True).start()
+        # 有界优先队列 + 固定数量的常驻工作线程；同优先级先进先出
+        self.max_pending = max_pending
+        self._queue = queue.PriorityQueue(maxsize=max_pending)
+        self._submit_lock = threading.Lock()
+        self._next_seq = 0
+        self._next_order = {}  # 优先级 -> 下一个提交序号
+        self._active = {}  # seq -> job，已提交但尚未交付结果
+        # 同一优先级内按提交顺序交付结果，热键截图不必等排在前面的整屏识别；
+        # 多个互不相关的调用方（如守护进程的各个客户端）可关闭，避免互相阻塞
+        self.ordered = ordered
+        self._deliver_lock = threading.RLock()
+        self._next_deliver = {}  # 优先级 -> 下一个待交付的序号
+        self._ready = {}  # (优先级, 序号) -> (job, outcome)
+        self._undelivered = {}  # (优先级, 序号) -> job，尚未轮到交付的任务
+        self._skipped = set()  # (优先级, 序号)，任务已被 promote 走，交付时跳过
+        self._closed = False
+        self._threads = []
+        for i in range(max(1, workers)):
+            t = Thread(target=self._worker_loop, name=f"ocr-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self.offline is not None:
+            Thread(target=self._drain_loop, name="ocr-offline-drain", daemon=True).start()
 
-    def _do_request(self, image_path: str):
+    @property
+    def session(self):
+        return self.http.session
+
+    @property
+    def local(self):
+        return self.router.local
+
+    def prewarm(self):
         try:
-            api_url = self.api_url_getter()
-            headers, data = self.auth_getter()
-            with open(image_path, 'rb') as f:
-                files = {"file": f}
-                res = requests.post(api_url, files=files, data=data, headers=headers, timeout=self.timeout)
-            obj = json.loads(res.text)
-            text = obj["res"]["latex"]
-            if callable(self.on_done):
-                self.on_done(text, obj)
+            self.http.prewarm()
         except Exception as e:
-            if callable(self.on_error):
-                self.on_error(e) 
\ No newline at end of file
+            print(f"连接预热调度失败: {e}")
+
+    def prewarm_local(self):
+        """启动本地模型进程并加载模型；耗时较长，应在后台线程调用"""
+        if self.router.local is None:
+            return False
+        self.router.prewarm()
+        return True
+
+    def connection_stats(self):
+        return self.session.stats()
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+
+    def pending(self):
+        """已提交但尚未交付结果的任务数"""
+        with self._submit_lock:
+            return len(self._active)
+
+    def is_full(self):
+        return self._queue.full()
+
+    def scheduler_stats(self):
+        """限流状态：当前速率、各优先级等待令牌的请求数与等待耗时，以及识别队列深度"""
+        stats = self.scheduler.stats()
+        with self._submit_lock:
+            queued = {}
+            for job in self._active.values():
+                if job.state == 'queued':
+                    queued[job.priority] = queued.get(job.priority, 0) + 1
+        stats['queued'] = queued
+        return stats
+
+    def offline_pending(self):
+        return len(self.offline) if self.offline is not None else 0
+
+    def submit(self, source, on_done=None, on_error=None, trace=None, meta=None, priority='normal'):
+        """source 可以是图片路径、PNG 字节、RawFrame，或在工作线程中执行的生成函数 () -> 上述任一。
+        priority 见 rate_limit.PRIORITIES。队列已满时抛出 queue.Full。"""
+        on_done = on_done or self.on_done
+        on_error = on_error or self.on_error
+        # 与 _finish 相同的加锁顺序（先交付锁后提交锁），避免死锁
+        with (self._deliver_lock if self.ordered else nullcontext()), self._submit_lock:
+            if self._closed:
+                raise RuntimeError("识别器已关闭")
+            job = OcrJob(self._next_seq, source, on_done, on_error, trace, meta, priority)
+            job.order = self._next_order.get(job.level, 0)
+            if self.ordered:
+                # 入队前登记：工作线程可能在 put 返回前就处理完并进入 _finish
+                self._undelivered[(job.level, job.order)] = job
+            try:
+                self._queue.put_nowait((job.level, job.seq, job))
+            except queue.Full:
+                self._undelivered.pop((job.level, job.order), None)
+                raise
+            self._next_seq += 1
+            self._next_order[job.level] = job.order + 1
+            self._active[job.seq] = job
+        return job
+
+    def promote(self, job, priority='interactive'):
+        """把已提交的任务提升到更高优先级：排队中的任务按新优先级重新入队，
+        尚未交付的结果改在新优先级内按顺序交付。已交付或优先级不更高时返回 False"""
+        level = priority_level(priority)
+        with self._deliver_lock, self._submit_lock:
+            if job.cancelled or level >= job.level or job.seq not in self._active:
+                return False
+            old_key = (job.level, job.order)
+            job.priority = priority  # 尚未发出的请求按新优先级领取限流令牌
+            if job.state == 'queued':
+                try:
+                    # 旧的队列项留在队列里，出队时因优先级不符被跳过
+                    self._queue.put_nowait((level, job.seq, job))
+                except queue.Full:
+                    return False  # 没有空位重新入队，出队与交付顺序不变
+            job.level = level
+            job.order = self._next_order.get(level, 0)
+            self._next_order[level] = job.order + 1
+            if not self.ordered:
+                return True
+            # 原优先级中的位置不再等它；已就绪的结果随任务挪到新位置
+            self._skipped.add(old_key)
+            self._undelivered.pop(old_key, None)
+            self._undelivered[(level, job.order)] = job
+            ready = self._ready.pop(old_key, None)
+            if ready is not None:
+                self._ready[(level, job.order)] = ready
+        with self._deliver_lock:
+            self._flush(old_key[0])
+            self._flush(level)
+        return True
+
+    def cancel_all(self):
+        with self._submit_lock:
+            jobs = list(self._active.values())
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def _worker_loop(self):
+        while True:
+            level, _, job = self._queue.get()
+            if job is None:
+                break
+            with self._submit_lock:
+                if level != job.level:
+                    continue  # 任务已被 promote 到更高优先级重新入队，这是旧的队列项
+                job.state = 'running'
+            if job.cancelled:
+                self._finish(job, None)
+                continue
+            if job.trace is not None:
+                job.trace.record('queue_wait', time.monotonic() - job.submitted_at)
+            try:
+                self._process(job)
+            except Exception as e:
+                self._finish(job, ('error', e))
+
+    def _finish(self, job, outcome):
+        """记录任务结果，并按提交顺序交付同一优先级内所有已就绪的结果"""
+        job.state = 'finished'
+        if not self.ordered:
+            with self._submit_lock:
+                self._active.pop(job.seq, None)
+            self._deliver(job, outcome)
+            return
+        with self._deliver_lock:
+            lane = job.level
+            if job.order < self._next_deliver.get(lane, 0):
+                # 已取消并被跳过的任务，结果直接丢弃
+                with self._submit_lock:
+                    self._active.pop(job.seq, None)
+                return
+            self._ready[(lane, job.order)] = (job, outcome)
+            self._flush(lane)
+
+    def _flush(self, lane):
+        """按顺序交付该优先级内所有已就绪的结果；调用方持有 _deliver_lock"""
+        while True:
+            key = (lane, self._next_deliver.get(lane, 0))
+            if key in self._skipped:
+                # 已提升到其他优先级的任务，在原优先级中直接跳过
+                self._skipped.discard(key)
+                self._next_deliver[lane] = key[1] + 1
+                continue
+            if key in self._ready:
+                ready_job, ready_outcome = self._ready.pop(key)
+            elif key in self._undelivered and self._undelivered[key].cancelled:
+                # 已取消但请求仍在途的任务（如被丢弃的预识别）不再占着交付顺序，后面的结果不必等它
+                ready_job, ready_outcome = self._undelivered[key], None
+            else:
+                break
+            self._undelivered.pop(key, None)
+            self._next_deliver[lane] = key[1] + 1
+            if ready_outcome is None and ready_job.state != 'finished':
+                continue  # 仍在运行，结束时由 _finish 清理
+            with self._submit_lock:
+                self._active.pop(ready_job.seq, None)
+            self._deliver(ready_job, ready_outcome)
+
+    @staticmethod
+    def _deliver(job, outcome):
+        if job.cancelled or outcome is None:
+            return
+        try:
+            if outcome[0] == 'done':
+                if callable(job.on_done):
+                    job.on_done(outcome[1], outcome[2])
+            elif callable(job.on_error):
+                job.on_error(outcome[1])
+        except Exception as e:
+            print(f"识别结果回调异常: {e}")
+
+    @staticmethod
+    def _resolve(source):
+        if callable(source):
+            source = source()
+        if isinstance(source, (bytes, bytearray, memoryview)) or hasattr(source, "encode_png"):
+            return source
+        with open(source, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def _cache_key(image, scope):
+        if hasattr(image, "encode_png"):
+            # 原始像素直接做键，命中时连编码都省了
+            return OcrCache.make_key(image.bgra, scope, size=image.size)
+        return OcrCache.make_key(image, scope)
+
+    def _payload(self, image):
+        return self.encoder.encode(image)
+
+    def _process(self, job):
+        image = self._resolve(job.source)
+        job.source = None  # 尽早释放帧缓冲
+        backend = self.router.choose()
+        scope = backend.cache_scope()
+        key = self._cache_key(image, scope) if self.cache is not None else None
+
+        if key is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                self._finish(job, ('done', hit["latex"], dict(hit["raw"], cached=True)))
+                return
+            with self._inflight_lock:
+                waiters = self._inflight.get(key)
+                if waiters is not None:
+                    job.state = 'waiting'
+                    waiters.append(job)
+                    return
+                self._inflight[key] = [job]
+
+        try:
+            text, obj = self._post(image, backend, scope, job)
+            outcome = ('done', text, obj)
+            # 回退到本地模型的结果不写入云端的缓存键，避免之后的云端截图命中较差的本地结果
+            if key is not None and not obj.get("fallback"):
+                self.cache.put(key, {"latex": text, "raw": obj})
+        except Exception as e:
+            outcome = ('error', e)
+        for waiter in self._take_waiters(key, [job]):
+            self._finish(waiter, outcome)
+
+    def _take_waiters(self, key, default):
+        if key is None:
+            return default
+        with self._inflight_lock:
+            return self._inflight.pop(key, default)
+
+    def _post(self, image, backend, api_url, job):
+        if self.preprocessor is not None:
+            with job.span('preprocess'):
+                image = self.preprocessor.process(image)
+        with job.span('encode'):
+            payload = self._payload(image)
+        info = {'encoding': payload.name, 'upload_bytes': len(payload)}
+        if backend is not self.http:
+            # 本地后端不走熔断与离线队列
+            text, obj = backend.recognize(payload, job)
+            return text, dict(obj, **info)
+        try:
+            text, obj = self._call_with_retry(lambda: self.http.recognize(payload, job, api_url), job.trace, job)
+            return text, dict(obj, **info)
+        except Exception as e:
+            fallback = self.router.fallback(backend, e)
+            if fallback is not None:
+                print(f"云端识别失败，改用{fallback.name}后端: {e}")
+                text, obj = fallback.recognize(payload, job)
+                return text, dict(obj, fallback=True, **info)
+            if self.offline is None or not is_retryable(e):
+                raise
+            try:
+                item_id = self.offline.put(payload.data, dict(job.meta, api_url=api_url, mime=payload.mime,
+                                                              ext=payload.ext))
+            except Exception as save_err:
+                print(f"写入离线队列失败: {save_err}")
+                raise e
+            raise OfflineQueued(item_id, e) from e
+
+    def _call_with_retry(self, fn, trace=None, job=None):
+        """熔断器放行时才发请求；可重试错误按抖动退避重试，重试次数计入 trace 的 retry 阶段"""
+        for attempt in range(self.retry.attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"接口暂不可用，{self.breaker.retry_after():.0f} 秒后重试")
+            try:
+                result = fn()
+            except RequestNotSent:
+                # 等待限流令牌时被取消，请求没有发出，不影响熔断状态
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # 服务端可达（如签名错误、响应格式异常），不算作熔断失败
+                    self.breaker.record_success()
+                    raise
+                if isinstance(e, ApiError) and e.status == 429:
+                    # 限流由调度器降速处理，服务端可达，不触发熔断
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                if attempt + 1 >= self.retry.attempts or (job is not None and job.cancelled):
+                    raise
+                delay = self.retry.delay(attempt)
+                print(f"识别请求失败（第{attempt + 1}次），{delay:.2f} 秒后重试: {e}")
+                if trace is not None:
+                    trace.record('retry', delay)
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _on_breaker_change(self, old, new):
+        print(f"识别接口熔断状态: {old} -> {new}")
+        if new == CircuitBreaker.CLOSED:
+            self._drain_wakeup.set()
+
+    def _drain_loop(self):
+        """后台补识别离线队列：熔断器恢复时立即唤醒，否则按固定间隔检查"""
+        while not self._closed:
+            self._drain_wakeup.wait(self.drain_interval)
+            self._drain_wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.drain_offline()
+            except Exception as e:
+                print(f"离线队列补识别异常: {e}")
+
+    def drain_offline(self):
+        """按保存顺序补识别；遇到可重试错误就停下，等下一轮"""
+        drained = 0
+        for item_id in self.offline.ids():
+            if self._closed:
+                break
+            try:
+                png, meta = self.offline.load(item_id)
+            except Exception as e:
+                print(f"离线记录损坏，已丢弃 {item_id}: {e}")
+                self.offline.remove(item_id)
+                continue
+            api_url = meta.get("api_url") or self.api_url_getter()
+            payload = Encoded(png, 'offline', meta.get('mime', 'image/png'), meta.get('ext', 'png'), 0.0)
+            try:
+                text, obj = self._call_with_retry(lambda: self.http.recognize(payload, None, api_url))
+            except Exception as e:
+                # 关闭时领令牌会失败，记录留到下次启动
+                if is_retryable(e) or self._closed:
+                    break
+                print(f"离线记录识别失败，已丢弃 {item_id}: {e}")
+                self.offline.remove(item_id)
+                continue
+            self.offline.remove(item_id)
+            drained += 1
+            if callable(self.on_offline_done):
+                try:
+                    self.on_offline_done(meta, text, dict(obj, offline=True))
+                except Exception as e:
+                    print(f"离线结果回调异常: {e}")
+        return drained
+
+    def close(self):
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._drain_wakeup.set()
+        self.cancel_all()
+        self.scheduler.close()
+        for _ in self._threads:
+            try:
+                # 排在所有任务之后
+                self._queue.put_nowait((float('inf'), 0, None))
+            except queue.Full:
+                break
+        self.router.close()
@@ -0,0 +1,189 @@
+import time
+from io import BytesIO
+
+# numpy 与 PIL 在首次预处理时才导入，缩短启动时间
+np = None
+_np_checked = False
+
+
+def _load_numpy():
+    global np, _np_checked
+    if not _np_checked:
+        try:
+            import numpy  # type: ignore
+            np = numpy
+        except Exception:
+            np = None  # numpy 未安装时跳过预处理，原样上传
+        _np_checked = True
+    return np
+
+
+class ProcessedImage:
+    """预处理后的图片，接口与 RawFrame 一致（size / encode_png）"""
+
+    def __init__(self, image, stats, save_kwargs=None, reporter=None):
+        self.image = image
+        self.stats = stats
+        self.save_kwargs = save_kwargs or {}
+        self.reporter = reporter
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def to_image(self):
+        return self.image
+
+    def encode_png(self) -> bytes:
+        t0 = time.perf_counter()
+        buf = BytesIO()
+        self.image.save(buf, format="PNG", **self.save_kwargs)
+        data = buf.getvalue()
+        self._report(len(data), (time.perf_counter() - t0) * 1000, "png6")
+        return data
+
+    def record_encoding(self, encoded):
+        """由 image_encoder.AdaptiveEncoder 编码后回调"""
+        self._report(len(encoded), encoded.encode_ms, encoded.name)
+
+    def _report(self, nbytes, encode_ms, encoding):
+        self.stats['encoded_bytes'] = nbytes
+        self.stats['encode_ms'] = round(encode_ms, 2)
+        self.stats['encoding'] = encoding
+        if callable(self.reporter):
+            self.reporter(self.stats)
+
+
+class Preprocessor:
+    """上传前的向量化预处理：裁掉纯色边框、转灰度/低位调色板、按字高缩放"""
+
+    def __init__(self, enabled=True, trim=True, tolerance=24, padding=4, grayscale=True,
+                 palette_bits=0, target_glyph_height=40, min_scale=0.5, min_runs=2, reporter=None):
+        self.enabled = enabled
+        self.trim = trim
+        self.tolerance = tolerance          # 与背景灰度差超过该值视为前景
+        self.padding = padding              # 裁边后保留的留白像素
+        self.grayscale = grayscale
+        self.palette_bits = palette_bits    # 0 表示不做调色板量化；否则取 1/2/4/8
+        self.target_glyph_height = target_glyph_height  # 0 表示不缩放；只缩小不放大
+        # 缩放下限与字高估计所需的最少行段数：大积分号、矩阵、叠放分式会连成一整段高墨迹，
+        # 按它估字高会把整张图缩得过小
+        self.min_scale = min_scale
+        self.min_runs = min_runs
+        self.reporter = reporter            # (stats) -> None
+        self._warned = False
+
+    @classmethod
+    def from_config(cls, config, reporter=None):
+        """从 .ini 的 [Preprocess] 段读取参数，缺省项使用默认值"""
+        section = "Preprocess"
+        if config is None or not config.has_section(section):
+            return cls(reporter=reporter)
+        return cls(
+            enabled=config.getboolean(section, "ENABLED", fallback=True),
+            trim=config.getboolean(section, "TRIM", fallback=True),
+            tolerance=config.getint(section, "TOLERANCE", fallback=24),
+            padding=config.getint(section, "PADDING", fallback=4),
+            grayscale=config.getboolean(section, "GRAYSCALE", fallback=True),
+            palette_bits=config.getint(section, "PALETTE_BITS", fallback=0),
+            target_glyph_height=config.getint(section, "TARGET_GLYPH_HEIGHT", fallback=40),
+            min_scale=config.getfloat(section, "MIN_SCALE", fallback=0.5),
+            min_runs=config.getint(section, "MIN_RUNS", fallback=2),
+            reporter=reporter,
+        )
+
+    def process(self, frame):
+        if not self.enabled or not hasattr(frame, "bgra"):
+            return frame
+        if _load_numpy() is None:
+            if not self._warned:
+                print("未安装 numpy，跳过图片预处理")
+                self._warned = True
+            return frame
+        width, height = frame.size
+        if width == 0 or height == 0:
+            return frame
+
+        from PIL import Image
+        t0 = time.perf_counter()
+        # 直接在 mss 缓冲区上建视图，不拷贝
+        px = np.frombuffer(frame.bgra, dtype=np.uint8, count=width * height * 4).reshape(height, width, 4)
+        gray = ((px[..., 2].astype(np.uint16) * 77 + px[..., 1].astype(np.uint16) * 150
+                 + px[..., 0].astype(np.uint16) * 29) >> 8).astype(np.uint8)
+
+        # 以四条边的中位灰度作为背景色
+        border = np.concatenate((gray[0], gray[-1], gray[:, 0], gray[:, -1]))
+        background = int(np.median(border))
+        mask = np.abs(gray.astype(np.int16) - background) > self.tolerance
+
+        top, bottom, left, right = 0, height, 0, width
+        if self.trim:
+            rows = np.flatnonzero(mask.any(axis=1))
+            cols = np.flatnonzero(mask.any(axis=0))
+            if rows.size and cols.size:
+                top = max(0, int(rows[0]) - self.padding)
+                bottom = min(height, int(rows[-1]) + 1 + self.padding)
+                left = max(0, int(cols[0]) - self.padding)
+                right = min(width, int(cols[-1]) + 1 + self.padding)
+                mask = mask[top:bottom, left:right]
+
+        glyph_height, scale = self._scale_for(mask)
+
+        if self.grayscale:
+            image = Image.fromarray(np.ascontiguousarray(gray[top:bottom, left:right]), "L")
+        else:
+            image = Image.fromarray(np.ascontiguousarray(px[top:bottom, left:right, 2::-1]), "RGB")
+        if scale < 1.0:
+            new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(new_size, Image.LANCZOS)
+
+        save_kwargs = {}
+        if self.grayscale and self.palette_bits in (1, 2, 4, 8):
+            image, save_kwargs = self._to_palette(image, self.palette_bits)
+
+        stats = {
+            'size_before': (width, height),
+            # 原始 BGRA 像素的字节数；不为统计再编码一次原图，免得与上传编码争抢 CPU
+            'raw_bytes': width * height * 4,
+            'size_after': image.size,
+            'glyph_height': glyph_height,
+            'scale': round(scale, 3),
+            'preprocess_ms': round((time.perf_counter() - t0) * 1000, 2),
+        }
+        return ProcessedImage(image, stats, save_kwargs, self.reporter)
+
+    def _scale_for(self, mask):
+        """返回 (字高估计, 缩放比例)；行段太少无法可靠估计字高时不缩放，缩放比例不低于 min_scale"""
+        glyph_height = self._estimate_glyph_height(mask, self.min_runs)
+        if not self.target_glyph_height or not glyph_height or glyph_height <= self.target_glyph_height:
+            return glyph_height, 1.0
+        return glyph_height, max(self.min_scale, self.target_glyph_height / glyph_height)
+
+    @staticmethod
+    def _estimate_glyph_height(mask, min_runs=1):
+        """用行投影找出连续的有墨行段，取中位高度作为字高估计；行段少于 min_runs 时返回 0"""
+        if mask.size == 0:
+            return 0
+        ink_rows = mask.any(axis=1).astype(np.int8)
+        edges = np.diff(np.concatenate(([0], ink_rows, [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        heights = ends - starts
+        heights = heights[heights >= 3]  # 忽略分数线、噪点等细线
+        if heights.size == 0 or heights.size < min_runs:
+            return 0
+        return int(np.median(heights))
+
+    @staticmethod
+    def _to_palette(image, bits):
+        from PIL import Image
+        levels = (1 << bits) - 1
+        arr = np.asarray(image, dtype=np.uint16)
+        indices = ((arr * levels + 127) // 255).astype(np.uint8)
+        paletted = Image.frombytes("P", image.size, indices.tobytes())
+        palette = []
+        for i in range(levels + 1):
+            v = round(i * 255 / levels)
+            palette.extend((v, v, v))
+        paletted.putpalette(palette)
+        return paletted, {'bits': bits}
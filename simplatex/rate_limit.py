@@ -0,0 +1,169 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+# 优先级：数值越小越先拿到令牌。热键截图 > 整屏识别/脚本请求 > 框选停顿预识别 > 离线补识别/批量
+PRIORITIES = {'interactive': 0, 'normal': 1, 'speculative': 2, 'background': 3}
+PRIORITY_NAMES = {v: k for k, v in PRIORITIES.items()}
+
+
+class RequestNotSent(RuntimeError):
+    """等待令牌期间任务被取消或调度器已关闭，请求没有发出"""
+
+
+def priority_level(priority):
+    """优先级名或数值 -> 数值；未知名称按 normal 处理"""
+    if isinstance(priority, int):
+        return priority
+    return PRIORITIES.get(priority, PRIORITIES['normal'])
+
+
+class RequestScheduler:
+    """SimpleTeX 请求的令牌桶：所有发往接口的请求（含重试、对冲、离线补识别）先领令牌再发送。
+
+    等待者按优先级排队，令牌空出时先给优先级最高的请求；非交互请求不能把桶取到 reserve 个
+    令牌以下，留给随时可能到来的热键截图。收到 429 时速率减半并按 Retry-After 暂停发放，
+    之后每次成功按 max_qps 的 recover 比例回升（AIMD）。
+    """
+
+    def __init__(self, qps=10.0, burst=10, reserve=1, min_qps=0.2, recover=0.05, enabled=True, window=200):
+        self.max_qps = max(0.01, float(qps))
+        self.qps = self.max_qps
+        self.burst = max(1.0, float(burst))
+        self.reserve = max(0.0, min(float(reserve), self.burst - 1))
+        self.min_qps = min(min_qps, self.max_qps)
+        self.recover = recover
+        self.enabled = enabled
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []  # 堆：(优先级, 序号)
+        self._seq = itertools.count()
+        self._closed = False
+        self.granted = {}    # 优先级名 -> 放行次数
+        self.throttled = 0   # 收到 429 的次数
+        self._waits = {}     # 优先级名 -> 最近的等待秒数
+        self._window = window
+
+    @classmethod
+    def from_config(cls, config):
+        """读取 .ini 的 [RateLimit] 段；没有该段时按默认值启用"""
+        section = "RateLimit"
+        if config is None or not config.has_section(section):
+            return cls()
+        return cls(qps=config.getfloat(section, "QPS", fallback=10.0),
+                   burst=config.getfloat(section, "BURST", fallback=10),
+                   reserve=config.getfloat(section, "RESERVE", fallback=1),
+                   min_qps=config.getfloat(section, "MIN_QPS", fallback=0.2),
+                   enabled=config.getboolean(section, "ENABLED", fallback=True))
+
+    def _refill(self, now):
+        if now < self._paused_until:
+            # 暂停期间不积累令牌
+            self._updated = now
+            return
+        self.tokens = min(self.burst, self.tokens + (now - max(self._updated, self._paused_until)) * self.qps)
+        self._updated = now
+
+    def _wait_time(self, now, need):
+        if now < self._paused_until:
+            return self._paused_until - now
+        return max(0.001, (need - self.tokens) / self.qps)
+
+    def acquire(self, priority='normal', cancelled=None):
+        """阻塞直到领到一个令牌，返回等待的秒数；cancelled() 为真时抛出 RequestNotSent"""
+        if not self.enabled:
+            return 0.0
+        level = priority_level(priority)
+        need = 1.0 if level <= PRIORITIES['interactive'] else 1.0 + self.reserve
+        t0 = time.monotonic()
+        with self._cond:
+            ticket = (level, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    if self._closed:
+                        raise RequestNotSent("请求调度器已关闭")
+                    if cancelled is not None and cancelled():
+                        raise RequestNotSent("识别请求已取消")
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == ticket and now >= self._paused_until and self.tokens >= need:
+                        self.tokens -= 1
+                        break
+                    timeout = self._wait_time(now, need)
+                    # 可取消的请求定期醒来检查；排在后面的等待者由出队时的 notify 唤醒
+                    self._cond.wait(min(timeout, 0.2) if cancelled is not None else timeout)
+            finally:
+                if self._waiters[0] == ticket:
+                    heapq.heappop(self._waiters)
+                else:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                self._cond.notify_all()
+            waited = time.monotonic() - t0
+            name = PRIORITY_NAMES.get(level, str(level))
+            self.granted[name] = self.granted.get(name, 0) + 1
+            self._waits.setdefault(name, deque(maxlen=self._window)).append(waited)
+        return waited
+
+    def on_throttled(self, retry_after=None):
+        """接口返回 429：速率减半，暂停发放到 Retry-After（没有时按新速率的一个间隔）之后"""
+        with self._cond:
+            self.throttled += 1
+            now = time.monotonic()
+            # 同一波在途请求陆续返回的 429 只减速一次，只延长暂停
+            if now >= self._paused_until:
+                self.qps = max(self.min_qps, self.qps / 2)
+            pause = retry_after if retry_after and retry_after > 0 else 1.0 / self.qps
+            self._paused_until = max(self._paused_until, now + pause)
+            # 暂停结束时只剩一个令牌，先放行一个请求试探，之后按新速率发放
+            self.tokens = min(1.0, self.burst)
+            self._cond.notify_all()
+
+    def on_success(self):
+        if self.qps < self.max_qps:
+            with self._cond:
+                self.qps = min(self.max_qps, self.qps + self.recover * self.max_qps)
+
+    def depth(self):
+        """各优先级正在等待令牌的请求数"""
+        with self._cond:
+            counts = {}
+            for level, _ in self._waiters:
+                name = PRIORITY_NAMES.get(level, str(level))
+                counts[name] = counts.get(name, 0) + 1
+            return counts
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            waits = {}
+            for name, samples in self._waits.items():
+                ordered = sorted(samples)
+                if ordered:
+                    waits[name] = {
+                        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 1),
+                        'p95_ms': round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 1),
+                        'max_ms': round(ordered[-1] * 1000, 1),
+                    }
+            return {
+                'enabled': self.enabled,
+                'qps': round(self.qps, 2),
+                'max_qps': self.max_qps,
+                'tokens': round(self.tokens, 2),
+                'paused_ms': round(max(0.0, self._paused_until - now) * 1000, 1),
+                'throttled': self.throttled,
+                'waiting': self.depth(),
+                'granted': dict(self.granted),
+                'wait': waits,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,194 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+
+class ApiError(RuntimeError):
+    """接口返回了表示服务端暂时不可用的状态码（429 / 5xx）"""
+
+    def __init__(self, status, message="", retry_after=None):
+        super().__init__(f"接口返回 HTTP {status}{': ' + message if message else ''}")
+        self.status = status
+        self.retry_after = retry_after  # 响应头 Retry-After（秒），没有时为 None
+
+
+def parse_retry_after(value):
+    """只支持秒数形式的 Retry-After；HTTP 日期形式返回 None"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开期间直接失败，不再发请求"""
+
+
+class OfflineQueued(RuntimeError):
+    """请求未能完成，截图已存入离线队列，恢复后自动识别"""
+
+    def __init__(self, item_id, cause):
+        super().__init__(f"截图已离线保存（{item_id}）: {cause}")
+        self.item_id = item_id
+        self.cause = cause
+
+
+def is_retryable(exc):
+    """网络错误、超时、429/5xx 可以重试；签名错误、响应格式错误等直接失败"""
+    if isinstance(exc, (ApiError, CircuitOpenError)):
+        return True
+    # 只认网络层错误；文件不存在、权限不足、URL 无效等本地问题重试也没用
+    try:
+        import requests
+        network = (requests.ConnectionError, requests.Timeout)
+    except ImportError:
+        network = ()
+    return isinstance(exc, network + (ConnectionError, TimeoutError, socket.timeout))
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动：第 n 次重试前等待 uniform(0, min(cap, base * 2^n)) 秒"""
+
+    def __init__(self, attempts=3, base=0.3, cap=4.0):
+        self.attempts = max(1, attempts)
+        self.base = base
+        self.cap = cap
+
+    def delay(self, retry_index):
+        return random.uniform(0, min(self.cap, self.base * (2 ** retry_index)))
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开，冷却期内直接失败；冷却结束后只放行一个探测请求"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.listeners = []  # (old_state, new_state) -> None
+
+    def _set_state(self, state):
+        old, self.state = self.state, state
+        return (old, state) if old != state else None
+
+    def _notify(self, change):
+        if change is None:
+            return
+        for listener in list(self.listeners):
+            try:
+                listener(*change)
+            except Exception as e:
+                print(f"熔断状态监听回调异常: {e}")
+
+    def allow(self):
+        with self._lock:
+            change = None
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                change = self._set_state(self.HALF_OPEN)
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+        self._notify(change)
+        return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            change = self._set_state(self.CLOSED)
+        self._notify(change)
+
+    def release(self):
+        """allow() 放行后请求并未发出：不计成功或失败，只归还半开状态的探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            change = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                change = self._set_state(self.OPEN)
+        self._notify(change)
+
+    def retry_after(self):
+        """距离下一次允许探测还有多少秒"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+def default_offline_dir():
+    return os.path.join(os.path.expanduser("~"), ".tex-ocr", "offline")
+
+
+class OfflineQueue:
+    """持久化的离线队列：每条记录一个 PNG 加一个 JSON 元数据文件，按写入顺序取出"""
+
+    def __init__(self, queue_dir=None):
+        self.queue_dir = queue_dir or default_offline_dir()
+        self._lock = threading.Lock()
+        os.makedirs(self.queue_dir, exist_ok=True)
+
+    def _paths(self, item_id):
+        base = os.path.join(self.queue_dir, item_id)
+        return base + ".png", base + ".json"
+
+    def put(self, png_bytes, meta=None):
+        item_id = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        png_path, meta_path = self._paths(item_id)
+        meta = dict(meta or {}, queued_at=time.time())
+        with self._lock:
+            # 先写图片再写元数据；元数据存在即代表记录完整
+            for path, data in ((png_path, bytes(png_bytes)),
+                               (meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))):
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        return item_id
+
+    def ids(self):
+        with self._lock:
+            try:
+                names = os.listdir(self.queue_dir)
+            except FileNotFoundError:
+                return []
+        return sorted(name[:-5] for name in names if name.endswith(".json"))
+
+    def __len__(self):
+        return len(self.ids())
+
+    def load(self, item_id):
+        png_path, meta_path = self._paths(item_id)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(png_path, "rb") as f:
+            return f.read(), meta
+
+    def remove(self, item_id):
+        with self._lock:
+            for path in self._paths(item_id):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
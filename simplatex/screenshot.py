@@ -1,59 +1,174 @@
-from PIL import Image
+from io import BytesIO
+import threading
 import time
-import mss
+
+from preprocess import _load_numpy
+
+# PIL 与 mss 在首次截图时才导入，缩短启动时间
+
+class CaptureError(RuntimeError):
+    """截图阶段失败（区别于网络/识别失败）"""
+
+
+class RawFrame:
+    """mss 抓取得到的原始 BGRA 帧，只持有缓冲区引用，不做整帧拷贝"""
+
+    def __init__(self, size, bgra):
+        self.size = (int(size[0]), int(size[1]))
+        self.bgra = bgra  # mss 的 raw bytearray，每像素 4 字节 BGRA
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def crop(self, left, top, right, bottom):
+        """按帧内坐标裁剪，只拷贝选区内的像素，一次切片完成"""
+        left = max(0, min(self.width, int(left)))
+        right = max(left, min(self.width, int(right)))
+        top = max(0, min(self.height, int(top)))
+        bottom = max(top, min(self.height, int(bottom)))
+        stride = self.width * 4
+        size = (right - left, bottom - top)
+        if left == 0 and right == self.width:
+            # 整行选区在缓冲区中是连续的一段
+            return RawFrame(size, bytearray(memoryview(self.bgra)[top * stride:bottom * stride]))
+        out = bytearray(size[0] * size[1] * 4)
+        if not out:
+            return RawFrame(size, out)
+        np = _load_numpy()
+        if np is not None:
+            src = np.frombuffer(self.bgra, dtype=np.uint8, count=stride * self.height).reshape(self.height, stride)
+            # 直接写入输出缓冲区，不产生中间数组
+            np.frombuffer(out, dtype=np.uint8).reshape(size[1], size[0] * 4)[:] = src[top:bottom, left * 4:right * 4]
+            return RawFrame(size, out)
+        # 没有 numpy 时逐行拷贝
+        view = memoryview(self.bgra)
+        row_bytes = size[0] * 4
+        for i, y in enumerate(range(top, bottom)):
+            start = y * stride + left * 4
+            out[i * row_bytes:(i + 1) * row_bytes] = view[start:start + row_bytes]
+        return RawFrame(size, out)
+
+    def to_image(self):
+        from PIL import Image
+        # 直接按 BGRX 解码原始缓冲区，省去 screenshot.rgb 的中间拷贝
+        return Image.frombuffer("RGB", self.size, self.bgra, "raw", "BGRX", 0, 1)
+
+    def encode_png(self) -> bytes:
+        buf = BytesIO()
+        self.to_image().save(buf, format="PNG")
+        return buf.getvalue()
 
 
 class MultiMonitorScreenshot:
-    """多显示器截图处理类（按次创建 mss 以增强稳定性）"""
+    """多显示器截图处理类：每个线程持有一个常驻 mss 句柄，出错时重连"""
 
     def __init__(self, monitors_info):
         self.monitors_info = monitors_info
+        # mss 句柄不能跨线程使用（X11 下绑定显示连接），因此按线程保存
+        self._local = threading.local()
+        self._handles_lock = threading.Lock()
+        self._handles = []  # [(thread, sct)]，用于关闭与清理已退出线程的句柄
+        self.opened = 0
+        self.reconnects = 0
+
+    def _get_sct(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            import mss
+            self._prune_dead_handles()
+            sct = mss.mss()
+            self._local.sct = sct
+            with self._handles_lock:
+                self._handles.append((threading.current_thread(), sct))
+                self.opened += 1
+        return sct
+
+    def _drop_sct(self):
+        sct = getattr(self._local, 'sct', None)
+        self._local.sct = None
+        if sct is None:
+            return
+        with self._handles_lock:
+            self._handles = [(t, h) for t, h in self._handles if h is not sct]
+        try:
+            sct.close()
+        except Exception:
+            pass
+
+    def _prune_dead_handles(self):
+        with self._handles_lock:
+            dead = [(t, h) for t, h in self._handles if not t.is_alive()]
+            self._handles = [(t, h) for t, h in self._handles if t.is_alive()]
+        for _, sct in dead:
+            try:
+                sct.close()
+            except Exception:
+                pass
 
     def _grab_with_retry(self, region):
         last_err = None
         for attempt in range(2):
             try:
-                with mss.mss() as sct:
-                    screenshot = sct.grab(region)
-                    return screenshot
+                return self._get_sct().grab(region)
             except Exception as e:
                 last_err = e
                 print(f"mss 抓取失败（第{attempt+1}次）: {e}")
+                # 显示连接可能已断开（如 X 服务器重启、远程桌面重连），丢弃句柄后重连
+                self._drop_sct()
+                with self._handles_lock:
+                    self.reconnects += 1
                 time.sleep(0.05)
         raise last_err if last_err else RuntimeError("未知的 mss 抓取失败")
 
-    def capture_area(self, left, top, right, bottom):
+    def grab_area(self, left, top, right, bottom) -> RawFrame:
+        """抓取区域并返回原始帧；可在任意线程调用，失败抛出 CaptureError"""
+        region = {
+            'left': int(left),
+            'top': int(top),
+            'width': max(0, int(right) - int(left)),
+            'height': max(0, int(bottom) - int(top))
+        }
+        print(f"截图区域: {region}")
         try:
-            region = {
-                'left': int(left),
-                'top': int(top),
-                'width': max(0, int(right) - int(left)),
-                'height': max(0, int(bottom) - int(top))
-            }
-            print(f"截图区域: {region}")
             screenshot = self._grab_with_retry(region)
-            img = Image.frombytes("RGB", screenshot.size, screenshot.rgb)
-            return img
+        except Exception as e:
+            raise CaptureError(f"截图失败: {e}") from e
+        return RawFrame(screenshot.size, screenshot.raw)
+
+    def capture_area(self, left, top, right, bottom):
+        try:
+            return self.grab_area(left, top, right, bottom).to_image()
         except Exception as e:
             print(f"截图失败: {e}")
             return None
 
+    def grab_monitor(self, monitor) -> RawFrame:
+        """抓取整个显示器（monitor 为下标或显示器信息字典），失败抛出 CaptureError"""
+        if not isinstance(monitor, dict):
+            monitor = self.monitors_info[monitor]
+        x, y = int(monitor['x']), int(monitor['y'])
+        return self.grab_area(x, y, x + int(monitor['width']), y + int(monitor['height']))
+
     def capture_monitor(self, monitor_index):
         try:
-            monitor = self.monitors_info[monitor_index]
-            region = {
-                'left': int(monitor['x']),
-                'top': int(monitor['y']),
-                'width': int(monitor['width']),
-                'height': int(monitor['height'])
-            }
-            print(f"截取显示器 {monitor_index}: {region}")
-            screenshot = self._grab_with_retry(region)
-            img = Image.frombytes("RGB", screenshot.size, screenshot.rgb)
-            return img
+            print(f"截取显示器 {monitor_index}")
+            return self.grab_monitor(monitor_index).to_image()
         except Exception as e:
             print(f"截取显示器 {monitor_index} 失败: {e}")
             return None
 
     def close(self):
-        pass 
\ No newline at end of file
+        with self._handles_lock:
+            handles = self._handles
+            self._handles = []
+        for _, sct in handles:
+            try:
+                sct.close()
+            except Exception:
+                pass
+        self._local = threading.local()
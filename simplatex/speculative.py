@@ -0,0 +1,86 @@
+import queue
+import threading
+
+
+class SpeculativeOcr:
+    """框选过程中鼠标停顿时提前识别当前选区；松手时选区一致则直接采用该结果，否则丢弃"""
+
+    def __init__(self, ocr, tolerance=2):
+        self.ocr = ocr
+        self.tolerance = tolerance  # 松手选区与预识别选区每条边允许的像素误差
+        self._lock = threading.Lock()
+        self._current = None  # dict(region, job, outcome, on_done, on_error)
+        self.started = 0
+        self.adopted = 0
+        self.discarded = 0
+
+    def _matches(self, a, b):
+        return all(abs(x - y) <= self.tolerance for x, y in zip(a, b))
+
+    def start(self, region, source, meta=None):
+        """提交一次预识别；与当前预识别选区相同时不重复提交。source 同 OcrWorker.submit，
+        meta 随任务保存（离线补识别时用于按热键格式化结果）"""
+        with self._lock:
+            current = self._current
+            if current is not None and self._matches(current['region'], region):
+                return False
+            self._discard_locked()
+            entry = {'region': tuple(region), 'job': None, 'outcome': None, 'on_done': None, 'on_error': None}
+            try:
+                entry['job'] = self.ocr.submit(source,
+                                               on_done=lambda text, raw: self._deliver(entry, ('done', text, raw)),
+                                               on_error=lambda exc: self._deliver(entry, ('error', exc)),
+                                               meta=meta, priority='speculative')
+            except queue.Full:
+                return False  # 队列已满时不做预识别，不影响正式提交
+            self._current = entry
+            self.started += 1
+            return True
+
+    def _deliver(self, entry, outcome):
+        with self._lock:
+            entry['outcome'] = outcome
+            on_done, on_error = entry['on_done'], entry['on_error']
+        if on_done is not None:
+            self._dispatch(outcome, on_done, on_error)
+
+    @staticmethod
+    def _dispatch(outcome, on_done, on_error):
+        if outcome[0] == 'done':
+            on_done(outcome[1], dict(outcome[2], speculative=True))
+        else:
+            on_error(outcome[1])
+
+    def adopt(self, region, on_done, on_error):
+        """松手时调用：选区一致则接管预识别结果并返回 True，否则取消预识别并返回 False"""
+        with self._lock:
+            entry = self._current
+            if entry is None or not self._matches(entry['region'], region):
+                self._discard_locked()
+                return False
+            self._current = None
+            self.adopted += 1
+            entry['on_done'], entry['on_error'] = on_done, on_error
+            outcome = entry['outcome']
+        if outcome is not None:
+            self._dispatch(outcome, on_done, on_error)
+        else:
+            # 采用后即是用户的正式截图：提升到交互优先级出队、领取限流令牌与交付。
+            # 提升时可能当场交付结果并回调 _deliver，因此在锁外调用
+            self.ocr.promote(entry['job'], 'interactive')
+        return True
+
+    def cancel(self):
+        with self._lock:
+            self._discard_locked()
+
+    def _discard_locked(self):
+        entry, self._current = self._current, None
+        if entry is not None:
+            # 排队中的任务不再发请求；已发出的请求结果被丢弃（但仍会写入识别缓存）
+            entry['job'].cancel()
+            self.discarded += 1
+
+    def stats(self):
+        with self._lock:
+            return {'started': self.started, 'adopted': self.adopted, 'discarded': self.discarded}
@@ -1,14 +1,42 @@
-import tkinter as tk
+import logging
+import logging.handlers
+import os
+import queue
+import sys
 import time
+import tkinter as tk
+from collections import deque
+
+# 界面使用的级别名 -> logging 数值；WARN 只在这里映射到 WARNING，不改动全局的级别名
+LEVELS = {'DEBUG': logging.DEBUG, 'INFO': logging.INFO, 'SUCCESS': 25, 'WARN': logging.WARNING,
+          'ERROR': logging.ERROR}
+logging.addLevelName(25, 'SUCCESS')
+
+
+def default_log_file():
+    return os.path.join(os.path.expanduser("~"), ".tex-ocr", "logs", "tex-ocr.log")
 
 
 class UILogger:
-    def __init__(self, root, parent):
+    """界面日志：任意线程写入无锁队列，主线程定时批量刷新到有行数上限的文本框；
+    控制台与滚动日志文件由后台 QueueListener 线程异步写出"""
+
+    def __init__(self, root, parent, max_lines=1000, flush_interval_ms=100, log_file=None,
+                 file_level='DEBUG', max_file_bytes=2 * 1024 * 1024, backup_count=3):
         self.root = root
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        # deque 的 append/popleft 是原子操作，写入端无需加锁
+        self._pending = deque()
+        # 环形缓冲：最近 max_lines 条记录，与文本框中的内容一致
+        self.records = deque(maxlen=max_lines)
+        self.dropped = 0
         self.outer_frame = tk.Frame(parent)
 
-        # 级别控制
+        # 级别控制；阈值另存一份普通属性，供非主线程读取（tk 变量只能在主线程访问）
         self.log_level_var = tk.StringVar(value='INFO')
+        self._threshold = LEVELS['INFO']
+        self.log_level_var.trace_add('write', self._on_level_changed)
         self.ctrl_frame = tk.Frame(self.outer_frame)
         self.ctrl_frame.pack(padx=8, fill='x')
         tk.Label(self.ctrl_frame, text="日志级别:").pack(side=tk.LEFT)
@@ -31,6 +59,48 @@ class UILogger:
         self.log_text.tag_config('ERROR', foreground='#cc0000')
         self.log_text.tag_config('SUCCESS', foreground='#2e7d32')
 
+        self._setup_sinks(log_file, file_level, max_file_bytes, backup_count)
+        self._closed = False
+        self._flush_job = self.root.after(self.flush_interval_ms, self._flush)
+
+    def _setup_sinks(self, log_file, file_level, max_file_bytes, backup_count):
+        """控制台与文件输出都挂在 QueueListener 上，调用 log 的线程只负责入队"""
+        self._console = logging.StreamHandler(sys.stdout)
+        self._console.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+        self._console.setLevel(self._threshold)
+        handlers = [self._console]
+        self._file = None
+        self.log_file = log_file or default_log_file()
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            self._file = logging.handlers.RotatingFileHandler(
+                self.log_file, maxBytes=max_file_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+            self._file.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(threadName)s] %(message)s"))
+            self._file.setLevel(LEVELS.get(file_level, 10))
+            handlers.append(self._file)
+        except Exception as e:
+            print(f"日志文件不可用，仅输出到控制台: {e}")
+        self._sink_queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._sink_queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+        self._logger = logging.getLogger("tex-ocr.ui")
+        self._logger.propagate = False
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+        self._logger.addHandler(logging.handlers.QueueHandler(self._sink_queue))
+        self._update_logger_level()
+
+    def _update_logger_level(self):
+        levels = [self._threshold]
+        if self._file is not None:
+            levels.append(self._file.level)
+        self._logger.setLevel(min(levels))
+
+    def _on_level_changed(self, *_):
+        self._threshold = self._level_to_value(self.log_level_var.get())
+        self._console.setLevel(self._threshold)
+        self._update_logger_level()
+
     def get_widget(self):
         return self.outer_frame
 
@@ -43,40 +113,80 @@ class UILogger:
     def get_level(self) -> str:
         return self.log_level_var.get()
 
+    def set_max_lines(self, max_lines):
+        self.max_lines = max(1, int(max_lines))
+        self.records = deque(self.records, maxlen=self.max_lines)
+
     def _level_to_value(self, level):
-        mapping = {'DEBUG': 10, 'INFO': 20, 'SUCCESS': 25, 'WARN': 30, 'ERROR': 40}
-        return mapping.get(level, 20)
+        return LEVELS.get(level, 20)
 
     def _current_threshold(self):
-        try:
-            return self._level_to_value(self.log_level_var.get())
-        except Exception:
-            return 20
+        return self._threshold
 
     def log(self, message, level='INFO'):
-        if self._level_to_value(level) < self._current_threshold():
-            try:
-                print(f"{level}: {message}")
-            except Exception:
-                pass
+        """可在任意线程调用；低于界面级别且低于文件级别的记录直接丢弃"""
+        value = self._level_to_value(level)
+        if not self._logger.isEnabledFor(value):
             return
-        ts = time.strftime("%H:%M:%S")
-        line = f"[{ts}] {level}: {message}\n"
+        self._logger.log(value, "%s", message)
+        if value >= self._threshold and not self._closed:
+            self._pending.append((time.strftime("%H:%M:%S"), level, message))
 
-        def append():
+    def _flush(self):
+        """主线程定时器：把积压的记录合并成一次插入"""
+        self._flush_job = None
+        batch = []
+        while True:
+            try:
+                batch.append(self._pending.popleft())
+            except IndexError:
+                break
+        if batch:
+            if len(batch) > self.max_lines:
+                self.dropped += len(batch) - self.max_lines
+                batch = batch[-self.max_lines:]
+            self.records.extend(batch)
             try:
-                self.log_text.config(state='normal')
-                self.log_text.insert('end', line, level)
-                self.log_text.see('end')
-                self.log_text.config(state='disabled')
+                self._append(batch)
             except Exception as e:
                 print(f"日志输出失败: {e}")
+        if not self._closed:
+            self._flush_job = self.root.after(self.flush_interval_ms, self._flush)
 
+    def _append(self, batch):
+        # 相邻同级别的行合并为一段，一次 insert 传入多组 (文本, 标签)
+        args = []
+        for ts, level, message in batch:
+            line = f"[{ts}] {level}: {message}\n"
+            if args and args[-1] == level:
+                args[-2] += line
+            else:
+                args.extend((line, level))
+        # 用户往上翻看时不强制滚到底部
+        at_bottom = self.log_text.yview()[1] >= 0.999
+        self.log_text.config(state='normal')
+        self.log_text.insert('end', *args)
+        lines = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        if lines > self.max_lines:
+            self.log_text.delete('1.0', f"{lines - self.max_lines + 1}.0")
+        self.log_text.config(state='disabled')
+        if at_bottom:
+            self.log_text.see('end')
+
+    def close(self):
+        """停止定时刷新并等待后台写完文件"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_job is not None:
+            try:
+                self.root.after_cancel(self._flush_job)
+            except Exception:
+                pass
+            self._flush_job = None
         try:
-            self.root.after(0, append)
-        except Exception:
-            append()
-        try:
-            print(f"{level}: {message}")
+            self._listener.stop()
         except Exception:
-            pass 
\ No newline at end of file
+            pass
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# simplatex 下的模块以脚本目录为根互相导入（from ocr_worker import ...）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simplatex"))
+
+from fakes import FakeSession  # noqa: E402
+
+
+@pytest.fixture
+def session():
+    return FakeSession()
+
+
+@pytest.fixture
+def make_worker(session):
+    """构造使用假会话、不限流、不缓存的 OcrWorker，测试结束时关闭"""
+    from ocr_worker import OcrWorker
+    from rate_limit import RequestScheduler
+    workers = []
+
+    def factory(**kwargs):
+        kwargs.setdefault("session", session)
+        kwargs.setdefault("cache", False)
+        kwargs.setdefault("workers", 1)
+        kwargs.setdefault("scheduler", RequestScheduler(enabled=False))
+        worker = OcrWorker(lambda: "http://ocr.invalid/api", lambda: ({}, {}), **kwargs)
+        workers.append(worker)
+        return worker
+
+    yield factory
+    for worker in workers:
+        worker.close()
@@ -0,0 +1,44 @@
+import json
+import threading
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """代替 PooledSession：按上传的图片字节记录请求顺序，可按内容阻塞或返回预设响应"""
+
+    def __init__(self):
+        self.posts = []          # 按发出顺序记录的图片字节
+        self.gates = {}          # 图片字节 -> threading.Event，set 之前请求不返回
+        self.responses = {}      # 图片字节 -> FakeResponse 列表，依次返回；用完后返回成功
+        self._lock = threading.Lock()
+
+    def gate(self, data):
+        event = self.gates[data] = threading.Event()
+        return event
+
+    def post(self, url, files=None, data=None, headers=None, timeout=None):
+        image = bytes(files["file"][1])
+        with self._lock:
+            self.posts.append(image)
+            queued = self.responses.get(image)
+            response = queued.pop(0) if queued else None
+        gate = self.gates.get(image)
+        if gate is not None:
+            gate.wait(5)
+        if isinstance(response, Exception):
+            raise response
+        if response is not None:
+            return response
+        return FakeResponse(200, json.dumps({"status": True, "res": {"latex": image.decode(), "conf": 0.99}}))
+
+    def prewarm(self, url):
+        pass
+
+    def close(self):
+        pass
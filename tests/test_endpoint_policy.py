@@ -0,0 +1,51 @@
+import pytest
+
+from endpoint_policy import EndpointPolicy
+
+URLS = {'turbo': 'https://ocr.invalid/turbo', 'standard': 'https://ocr.invalid/standard'}
+
+
+def test_untried_endpoints_start_with_primary():
+    assert EndpointPolicy(URLS).order() == ('turbo', 'standard')
+
+
+def test_faster_endpoint_goes_first():
+    policy = EndpointPolicy(URLS)
+    policy.observe('turbo', 0.9, ok=True)
+    policy.observe('standard', 0.3, ok=True)
+    assert policy.order() == ('standard', 'turbo')
+
+
+def test_failing_endpoint_without_latency_samples_does_not_win():
+    policy = EndpointPolicy(URLS)
+    policy.observe('turbo', 0.1, ok=False)
+    policy.observe('standard', 1.2, ok=True)
+    assert policy.order() == ('standard', 'turbo')
+
+
+def test_errors_penalise_a_fast_endpoint():
+    policy = EndpointPolicy(URLS)
+    policy.observe('turbo', 0.2, ok=True)
+    policy.observe('standard', 0.5, ok=True)
+    for _ in range(5):
+        policy.observe('turbo', 0.2, ok=False)
+    assert policy.order() == ('standard', 'turbo')
+
+
+def test_hedge_delay_tracks_latency_within_bounds():
+    policy = EndpointPolicy(URLS, hedge_bounds=(0.4, 4.0), hedge_factor=1.5)
+    assert policy.hedge_delay('turbo') == 4.0  # 没有样本时取上限
+    policy.observe('turbo', 0.1, ok=True)
+    assert policy.hedge_delay('turbo') == 0.4
+    policy.observe('standard', 1.0, ok=True)
+    assert policy.hedge_delay('standard') == pytest.approx(1.5)
+    assert EndpointPolicy(URLS, hedge_after=0.7).hedge_delay('turbo') == 0.7
+
+
+def test_only_low_confidence_primary_results_escalate():
+    policy = EndpointPolicy(URLS, min_confidence=0.8)
+    assert policy.needs_escalation('turbo', {'res': {'conf': 0.5}})
+    assert not policy.needs_escalation('turbo', {'res': {'conf': 0.9}})
+    assert not policy.needs_escalation('standard', {'res': {'conf': 0.5}})
+    assert not policy.needs_escalation('turbo', {'res': {}})
+    assert not EndpointPolicy(URLS, min_confidence=0).needs_escalation('turbo', {'res': {'conf': 0.1}})
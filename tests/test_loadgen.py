@@ -0,0 +1,51 @@
+import pytest
+
+import loadgen
+from fakes import FakeResponse, FakeSession
+
+
+@pytest.fixture
+def generator(monkeypatch, tmp_path):
+    monkeypatch.setattr(loadgen, "sign_request", lambda: ({}, {}))
+    # 不经过构造函数，避免创建真实的连接池
+    gen = loadgen.LoadGenerator.__new__(loadgen.LoadGenerator)
+    gen.url, gen.timeout, gen._images = "http://ocr.invalid/api/latex_ocr", (3, 30), {}
+    gen.session = FakeSession()
+    image = tmp_path / "a.png"
+    image.write_bytes(b"a")
+    return gen, str(image)
+
+
+def test_http_status_is_kept_when_body_is_not_json(generator):
+    gen, image = generator
+    gen.session.responses[b"a"] = [FakeResponse(502, "<html>Bad Gateway</html>")]
+    result = gen._one({"image": image, "endpoint": None}, 0.0)
+    assert result["status"] == 502
+    assert not result["ok"]
+    assert "JSON" in result["error"]
+    summary = loadgen.summarize([result], 1.0)
+    assert summary["status"] == {"502": 1}
+    assert summary["parse_errors"] == 1
+
+
+def test_network_errors_record_the_exception(generator):
+    gen, image = generator
+    gen.session.responses[b"a"] = [ConnectionError("refused")]
+    result = gen._one({"image": image, "endpoint": None}, 0.0)
+    assert result["status"] == "ConnectionError"
+    assert loadgen.summarize([result], 1.0)["parse_errors"] == 0
+
+
+def test_successful_response(generator):
+    gen, image = generator
+    result = gen._one({"image": image, "endpoint": None}, 0.0)
+    assert result["ok"] and result["status"] == 200
+
+
+def test_repeat_of_zero_length_trace_is_rejected(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(loadgen, "get_credentials", lambda: None)
+    trace = tmp_path / "trace.jsonl"
+    trace.write_text('{"image": "a.png", "t": 0}\n')
+    with pytest.raises(SystemExit):
+        loadgen.main([str(trace), "--url", "http://ocr.invalid/api/latex_ocr", "--repeat", "3"])
+    assert "--interval" in capsys.readouterr().err
@@ -0,0 +1,83 @@
+import time
+
+from monitor_topology import MonitorLayout, MonitorTopology, layout_signature
+
+
+def monitor(x, y, width, height, scaling=1.0):
+    return {'x': x, 'y': y, 'width': width, 'height': height, 'scaling_factor': scaling}
+
+
+# 主屏 1920x1080，右侧竖放 1080x1920 的副屏向上错开 400px
+MAIN = monitor(0, 0, 1920, 1080)
+SIDE = monitor(1920, -400, 1080, 1920, 1.5)
+
+
+def test_layout_bounds_and_relative_coordinates():
+    layout = MonitorLayout([MAIN, SIDE])
+    assert layout.bounds == (0, -400, 3000, 1520)
+    assert (layout.total_width, layout.total_height) == (3000, 1920)
+    assert [(m['relative_x'], m['relative_y']) for m in layout.monitors] == [(0, 400), (1920, 0)]
+
+
+def test_monitor_at_and_gaps():
+    layout = MonitorLayout([MAIN, SIDE])
+    assert layout.monitor_at(100, 100)['x'] == 0
+    assert layout.monitor_at(1920, -400)['x'] == 1920
+    assert layout.monitor_at(1919, 1079)['x'] == 0
+    assert layout.monitor_at(100, -10) is None       # 主屏上方的空隙
+    assert layout.monitor_at(3000, 0) is None        # 右边界之外
+
+
+def test_nearest_picks_closest_monitor_outside_any_screen():
+    layout = MonitorLayout([MAIN, SIDE])
+    assert layout.nearest(100, -10)['x'] == 0
+    assert layout.nearest(1900, -300)['x'] == 1920
+    assert layout.nearest(5000, 5000)['x'] == 1920
+    assert layout.nearest(-50, 500)['x'] == 0
+
+
+def test_overlapping_mirrored_monitors():
+    layout = MonitorLayout([monitor(0, 0, 1920, 1080), monitor(0, 0, 1280, 720)])
+    assert layout.monitor_at(1500, 900)['width'] == 1920
+    assert layout.monitor_at(10, 10) is not None
+
+
+def test_signature_ignores_order():
+    assert layout_signature([MAIN, SIDE]) == layout_signature([SIDE, MAIN])
+    assert layout_signature([MAIN]) != layout_signature([dict(MAIN, scaling_factor=1.25)])
+
+
+def test_refresh_only_rebuilds_and_notifies_on_change():
+    current = [[MAIN]]
+    topology = MonitorTopology(enumerate_monitors=lambda: current[0])
+    events = []
+    topology.listeners.append(lambda old, new: events.append((old, new)))
+    first = topology.refresh()
+    assert first is not None and topology.layout is first
+    assert topology.refresh() is None
+    current[0] = [SIDE, MAIN]
+    second = topology.refresh()
+    assert second is not None
+    assert topology.refresh([MAIN, SIDE]) is None
+    assert events == [(None, first), (first, second)]
+    assert topology.rebuilds == 2
+
+
+def test_poll_thread_enumerates_only_when_probe_changes():
+    calls = []
+    signal = [1]
+    topology = MonitorTopology(enumerate_monitors=lambda: calls.append(1) or [MAIN], poll_interval=0.01,
+                               probe=lambda: signal[0])
+    topology.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.005)
+        time.sleep(0.1)
+        assert len(calls) == 1
+        signal[0] = 2
+        while len(calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert len(calls) == 2
+    finally:
+        topology.stop()
@@ -0,0 +1,51 @@
+import threading
+
+from multi_region import MultiRegionSession, reading_order
+
+
+def test_reading_order_groups_lines_then_left_to_right():
+    regions = [
+        (300, 12, 400, 40),   # 第一行右侧，略低于左侧
+        (10, 10, 120, 38),    # 第一行左侧
+        (10, 100, 200, 130),  # 第二行
+        (250, 95, 330, 140),  # 第二行，更高的块
+        (10, 200, 90, 220),   # 第三行
+    ]
+    assert reading_order(regions) == [1, 0, 2, 3, 4]
+
+
+def test_reading_order_does_not_merge_barely_overlapping_lines():
+    # 纵向只重叠 5px（不到较矮者的一半）：分属两行
+    regions = [(200, 25, 300, 55), (10, 0, 100, 30)]
+    assert reading_order(regions) == [1, 0]
+
+
+def test_reading_order_empty():
+    assert reading_order([]) == []
+
+
+def test_session_completes_in_reading_order_after_finish(make_worker, session):
+    worker = make_worker(workers=2)
+    done = threading.Event()
+    result = {}
+    mrs = MultiRegionSession(worker, on_complete=lambda entries: (result.setdefault('entries', entries), done.set()),
+                             on_error=lambda exc: (result.setdefault('error', exc), done.set()))
+    mrs.add((0, 100, 50, 130), b"second-line")
+    mrs.add((0, 0, 50, 30), b"first-line")
+    assert not done.wait(0.1)  # 没有 finish 不回调
+    mrs.finish()
+    assert done.wait(2)
+    assert [e['outcome'][1] for e in result['entries']] == ["first-line", "second-line"]
+
+
+def test_cancelled_session_does_not_call_back(make_worker, session):
+    worker = make_worker()
+    calls = []
+    release = session.gate(b"region")
+    mrs = MultiRegionSession(worker, on_complete=calls.append, on_error=calls.append)
+    mrs.add((0, 0, 10, 10), b"region")
+    mrs.cancel()
+    mrs.finish()
+    release.set()
+    assert mrs.add((0, 20, 10, 30), b"other") is None
+    assert calls == []
@@ -0,0 +1,23 @@
+from ocr_backends import BackendRouter, LocalModelBackend, SimpleTexBackend
+from resilience import CircuitBreaker
+
+
+def open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_cold_local_model_is_not_routed_to_when_circuit_opens():
+    cloud = SimpleTexBackend(lambda: "http://ocr.invalid/api", lambda: ({}, {}))
+    local = LocalModelBackend(model="nonexistent.module:factory")
+    router = BackendRouter(cloud, local, breaker=open_breaker())
+    assert not local.available()
+    assert router.choose() is cloud
+    assert router.fallback(cloud, ConnectionError("down")) is None
+    # 预热成功后才接管
+    local._warm.set()
+    assert router.choose() is local
+    assert router.fallback(cloud, ConnectionError("down")) is local
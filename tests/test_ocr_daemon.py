@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+ocr_daemon = pytest.importorskip("ocr_daemon")
+
+
+def service_with_root(root):
+    # 只测路径检查，不启动识别管线
+    service = ocr_daemon.OcrService.__new__(ocr_daemon.OcrService)
+    service.path_root = os.path.realpath(str(root)) if root is not None else None
+    return service
+
+
+def test_path_input_is_refused_without_a_configured_root(tmp_path):
+    image = tmp_path / "a.png"
+    image.write_bytes(b"png")
+    with pytest.raises(ocr_daemon.RequestError) as info:
+        service_with_root(None)._resolve_path(str(image))
+    assert info.value.status == 403
+
+
+def test_paths_are_confined_to_the_root(tmp_path):
+    root = tmp_path / "shots"
+    root.mkdir()
+    (root / "a.png").write_bytes(b"png")
+    secret = tmp_path / "secret.txt"
+    secret.write_text("token")
+    service = service_with_root(root)
+    assert service._resolve_path("a.png") == os.path.realpath(str(root / "a.png"))
+    assert service._resolve_path(str(root / "a.png")) == os.path.realpath(str(root / "a.png"))
+    for path in (str(secret), "../secret.txt", "/etc/passwd"):
+        with pytest.raises(ocr_daemon.RequestError) as info:
+            service._resolve_path(path)
+        assert info.value.status == 403
+    with pytest.raises(ocr_daemon.RequestError) as info:
+        service._resolve_path("missing.png")
+    assert info.value.status == 404
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="需要符号链接")
+def test_symlinks_out_of_the_root_are_refused(tmp_path):
+    root = tmp_path / "shots"
+    root.mkdir()
+    (tmp_path / "secret.txt").write_text("token")
+    os.symlink(str(tmp_path / "secret.txt"), str(root / "link.png"))
+    with pytest.raises(ocr_daemon.RequestError) as info:
+        service_with_root(root)._resolve_path("link.png")
+    assert info.value.status == 403
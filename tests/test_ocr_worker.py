@@ -0,0 +1,213 @@
+import threading
+import time
+
+from fakes import FakeResponse
+from speculative import SpeculativeOcr
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+class Recorder:
+    """收集交付顺序；wait(n) 等到收到 n 个结果"""
+
+    def __init__(self):
+        self.results = []
+        self._cond = threading.Condition()
+
+    def done(self, name):
+        def on_done(text, raw):
+            with self._cond:
+                self.results.append((name, text))
+                self._cond.notify_all()
+        return on_done
+
+    def error(self, name):
+        def on_error(exc):
+            with self._cond:
+                self.results.append((name, exc))
+                self._cond.notify_all()
+        return on_error
+
+    def wait(self, n, timeout=5):
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.results) >= n, timeout), self.results
+            return list(self.results)
+
+
+def test_adopted_speculative_job_jumps_ahead_of_queued_scans(make_worker, session):
+    worker = make_worker(max_pending=16)
+    rec = Recorder()
+    release = session.gate(b"busy")
+    worker.submit(b"busy", rec.done("busy"), rec.error("busy"))
+    wait_until(lambda: session.posts == [b"busy"])  # 唯一的工作线程被占住
+    for i in range(3):
+        worker.submit(f"scan{i}".encode(), rec.done(f"scan{i}"), rec.error(f"scan{i}"), priority='normal')
+    spec = SpeculativeOcr(worker)
+    assert spec.start((0, 0, 100, 50), b"spec")
+    assert spec.adopt((1, 0, 100, 51), rec.done("spec"), rec.error("spec"))
+    release.set()
+    results = rec.wait(5)
+    assert session.posts[:2] == [b"busy", b"spec"]
+    assert [name for name, _ in results][:2] == ["busy", "spec"]
+    assert results[1][1] == "spec"
+
+
+def test_promote_moves_finished_result_out_of_blocked_lane(make_worker, session):
+    worker = make_worker(workers=2)
+    rec = Recorder()
+    release = session.gate(b"slow")
+    worker.submit(b"slow", rec.done("slow"), rec.error("slow"), priority='speculative')
+    fast = worker.submit(b"fast", rec.done("fast"), rec.error("fast"), priority='speculative')
+    # fast 已完成但排在 slow 之后；提升后立即交付
+    wait_until(lambda: fast.state == 'finished')
+    assert rec.results == []
+    assert worker.promote(fast, 'interactive')
+    assert rec.wait(1) == [("fast", "fast")]
+    release.set()
+    assert rec.wait(2)[1] == ("slow", "slow")
+
+
+def test_results_are_delivered_in_submission_order_within_a_lane(make_worker, session):
+    worker = make_worker(workers=2)
+    rec = Recorder()
+    release = session.gate(b"first")
+    worker.submit(b"first", rec.done("first"), rec.error("first"))
+    worker.submit(b"second", rec.done("second"), rec.error("second"))
+    wait_until(lambda: len(session.posts) == 2)
+    time.sleep(0.05)
+    assert rec.results == []  # second 已返回，但要等 first
+    release.set()
+    assert [name for name, _ in rec.wait(2)] == ["first", "second"]
+
+
+def test_lanes_do_not_wait_for_each_other(make_worker, session):
+    worker = make_worker(workers=2)
+    rec = Recorder()
+    release = session.gate(b"scan")
+    worker.submit(b"scan", rec.done("scan"), rec.error("scan"), priority='normal')
+    worker.submit(b"hotkey", rec.done("hotkey"), rec.error("hotkey"), priority='interactive')
+    assert rec.wait(1) == [("hotkey", "hotkey")]
+    release.set()
+    rec.wait(2)
+
+
+def test_cancelled_inflight_job_does_not_block_later_results(make_worker, session):
+    worker = make_worker(workers=2)
+    rec = Recorder()
+    release = session.gate(b"slow")
+    slow = worker.submit(b"slow", rec.done("slow"), rec.error("slow"))
+    worker.submit(b"fast", rec.done("fast"), rec.error("fast"))
+    wait_until(lambda: len(session.posts) == 2)
+    slow.cancel()
+    worker.submit(b"later", rec.done("later"), rec.error("later"))
+    assert [name for name, _ in rec.wait(2)] == ["fast", "later"]
+    release.set()
+    wait_until(lambda: worker.pending() == 0)
+    assert [name for name, _ in rec.results] == ["fast", "later"]
+
+
+def test_cancelled_queued_job_is_never_sent(make_worker, session):
+    worker = make_worker()
+    rec = Recorder()
+    release = session.gate(b"busy")
+    worker.submit(b"busy", rec.done("busy"), rec.error("busy"))
+    wait_until(lambda: session.posts == [b"busy"])
+    queued = worker.submit(b"queued", rec.done("queued"), rec.error("queued"))
+    worker.submit(b"after", rec.done("after"), rec.error("after"))
+    queued.cancel()
+    release.set()
+    assert [name for name, _ in rec.wait(2)] == ["busy", "after"]
+    assert b"queued" not in session.posts
+
+
+def test_queued_interactive_job_is_sent_before_queued_normal_jobs(make_worker, session):
+    worker = make_worker(max_pending=16)
+    rec = Recorder()
+    release = session.gate(b"busy")
+    worker.submit(b"busy", rec.done("busy"), rec.error("busy"))
+    wait_until(lambda: session.posts == [b"busy"])
+    for i in range(3):
+        worker.submit(f"scan{i}".encode(), rec.done(f"scan{i}"), rec.error(f"scan{i}"), priority='normal')
+    worker.submit(b"hotkey", rec.done("hotkey"), rec.error("hotkey"), priority='interactive')
+    release.set()
+    rec.wait(5)
+    assert session.posts == [b"busy", b"hotkey", b"scan0", b"scan1", b"scan2"]
+
+
+def test_every_result_is_delivered_under_concurrent_submits(make_worker, session):
+    # 提交与完成交错进行：交付位置必须在任务入队前登记好，否则交付顺序会卡死
+    worker = make_worker(workers=4, max_pending=400)
+    rec = Recorder()
+    names = [f"job{i}" for i in range(200)]
+    submitters = [threading.Thread(target=lambda chunk=names[k::4]: [
+        worker.submit(name.encode(), rec.done(name), rec.error(name)) for name in chunk]) for k in range(4)]
+    for t in submitters:
+        t.start()
+    for t in submitters:
+        t.join()
+    assert sorted(name for name, _ in rec.wait(200)) == sorted(names)
+
+
+def test_single_flight_shares_one_request(make_worker, session, tmp_path):
+    from ocr_cache import OcrCache
+    worker = make_worker(workers=3, cache=OcrCache(str(tmp_path)))
+    rec = Recorder()
+    release = session.gate(b"same")
+    for i in range(3):
+        worker.submit(b"same", rec.done(i), rec.error(i))
+    wait_until(lambda: session.posts == [b"same"])
+    time.sleep(0.05)
+    release.set()
+    assert [r for r in rec.wait(3)] == [(0, "same"), (1, "same"), (2, "same")]
+    assert session.posts == [b"same"]
+    # 之后的相同截图直接命中缓存
+    worker.submit(b"same", rec.done(3), rec.error(3))
+    assert rec.wait(4)[3] == (3, "same")
+    assert session.posts == [b"same"]
+
+
+def test_retryable_errors_are_retried_until_success(make_worker, session):
+    from resilience import RetryPolicy
+    worker = make_worker(retry=RetryPolicy(attempts=3, base=0.001, cap=0.001))
+    rec = Recorder()
+    session.responses[b"flaky"] = [FakeResponse(503, "busy"), ConnectionError("reset")]
+    worker.submit(b"flaky", rec.done("flaky"), rec.error("flaky"))
+    assert rec.wait(1) == [("flaky", "flaky")]
+    assert session.posts == [b"flaky"] * 3
+    assert worker.breaker.state == 'closed'
+
+
+def test_bad_response_is_not_retried(make_worker, session):
+    from resilience import RetryPolicy
+    worker = make_worker(retry=RetryPolicy(attempts=3, base=0.001, cap=0.001))
+    rec = Recorder()
+    session.responses[b"bad"] = [FakeResponse(200, "not json")]
+    worker.submit(b"bad", rec.done("bad"), rec.error("bad"))
+    (name, exc), = rec.wait(1)
+    assert isinstance(exc, ValueError)
+    assert session.posts == [b"bad"]
+
+
+def test_open_circuit_queues_offline_and_drains_after_recovery(make_worker, session, tmp_path):
+    from resilience import CircuitBreaker, OfflineQueue, OfflineQueued, RetryPolicy
+    drained = []
+    offline = OfflineQueue(str(tmp_path))
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    worker = make_worker(retry=RetryPolicy(attempts=1), breaker=breaker, offline=offline,
+                         on_offline_done=lambda meta, text, raw: drained.append((meta['hotkey'], text)),
+                         drain_interval=0.02)
+    rec = Recorder()
+    session.responses[b"down"] = [ConnectionError("unreachable")]
+    worker.submit(b"down", rec.done("down"), rec.error("down"), meta={'hotkey': 'ctrl+alt+q'})
+    (_, exc), = rec.wait(1)
+    assert isinstance(exc, OfflineQueued)
+    assert breaker.state == CircuitBreaker.OPEN
+    # 冷却结束后的探测请求成功，离线记录被补识别并移出队列
+    wait_until(lambda: drained == [('ctrl+alt+q', 'down')])
+    assert len(offline) == 0
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,45 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import preprocess
+from preprocess import Preprocessor
+
+preprocess._load_numpy()
+
+
+def formula_mask(width, runs):
+    """按 [(起始行, 高度)] 画出有墨的行段，其余为背景"""
+    height = max(start + h for start, h in runs) + 10
+    mask = np.zeros((height, width), dtype=bool)
+    for start, h in runs:
+        mask[start:start + h, 10:width - 10] = True
+    return mask
+
+
+def test_tall_multiline_formula_is_not_shrunk():
+    # 矩阵 / 大积分号：三行内容被一个 300px 高的括号连成一整段墨迹
+    mask = formula_mask(600, [(5, 300)])
+    glyph_height, scale = Preprocessor()._scale_for(mask)
+    assert glyph_height == 0
+    assert scale == 1.0
+
+
+def test_scale_is_bounded_below():
+    # 两行大号文字：字高 200px，按 40px 目标应缩到 0.2，被限制在 0.5
+    mask = formula_mask(600, [(5, 200), (240, 200)])
+    glyph_height, scale = Preprocessor()._scale_for(mask)
+    assert glyph_height == 200
+    assert scale == 0.5
+
+
+def test_multiline_text_is_scaled_to_target_glyph_height():
+    mask = formula_mask(600, [(5, 60), (90, 60), (175, 60)])
+    glyph_height, scale = Preprocessor(target_glyph_height=40)._scale_for(mask)
+    assert glyph_height == 60
+    assert scale == pytest.approx(40 / 60)
+
+
+def test_rescaling_can_be_disabled():
+    mask = formula_mask(600, [(5, 60), (90, 60)])
+    assert Preprocessor(target_glyph_height=0)._scale_for(mask)[1] == 1.0
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from rate_limit import RequestNotSent, RequestScheduler
+
+
+def test_burst_is_granted_without_waiting():
+    scheduler = RequestScheduler(qps=1, burst=3, reserve=0)
+    assert [scheduler.acquire() < 0.05 for _ in range(3)] == [True] * 3
+    assert scheduler.stats()['granted'] == {'normal': 3}
+
+
+def test_non_interactive_requests_leave_the_reserve_for_hotkeys():
+    scheduler = RequestScheduler(qps=0.5, burst=2, reserve=1)
+    scheduler.acquire('background')
+    # 只剩保留的一个令牌：后台请求拿不到，热键截图立即拿到
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+    with pytest.raises(RequestNotSent):
+        scheduler.acquire('background', cancelled.is_set)
+    assert scheduler.acquire('interactive') < 0.05
+
+
+def test_waiters_are_served_by_priority():
+    scheduler = RequestScheduler(qps=20, burst=1, reserve=0)
+    scheduler.acquire()
+    order = []
+    threads = [threading.Thread(target=lambda p=p: (scheduler.acquire(p), order.append(p)))
+               for p in ('background', 'normal', 'speculative')]
+    for t in threads:
+        t.start()
+    time.sleep(0.02)  # 三个请求都在等令牌时才来的热键截图仍然先拿到
+    threads.append(threading.Thread(target=lambda: (scheduler.acquire('interactive'), order.append('interactive'))))
+    threads[-1].start()
+    for t in threads:
+        t.join(2)
+    assert order == ['interactive', 'normal', 'speculative', 'background']
+
+
+def test_throttle_halves_rate_pauses_and_recovers():
+    scheduler = RequestScheduler(qps=8, burst=4, reserve=0, recover=0.25)
+    scheduler.on_throttled(retry_after=0.2)
+    assert scheduler.qps == 4
+    # 同一波 429 只减速一次
+    scheduler.on_throttled()
+    assert scheduler.qps == 4
+    assert scheduler.stats()['throttled'] == 2
+    waited = scheduler.acquire()
+    assert waited >= 0.15
+    scheduler.on_success()
+    assert scheduler.qps == 6
+    for _ in range(5):
+        scheduler.on_success()
+    assert scheduler.qps == 8
+
+
+def test_rate_never_drops_below_minimum():
+    scheduler = RequestScheduler(qps=1, min_qps=0.4)
+    for _ in range(5):
+        scheduler._paused_until = 0.0
+        scheduler.on_throttled(retry_after=0.001)
+    assert scheduler.qps == 0.4
+
+
+def test_close_releases_waiters():
+    scheduler = RequestScheduler(qps=0.1, burst=1, reserve=0)
+    scheduler.acquire()
+    errors = []
+
+    def wait():
+        try:
+            scheduler.acquire()
+        except RequestNotSent as e:
+            errors.append(e)
+    t = threading.Thread(target=wait)
+    t.start()
+    time.sleep(0.05)
+    scheduler.close()
+    t.join(1)
+    assert len(errors) == 1
+    assert scheduler.depth() == {}
+
+
+def test_disabled_scheduler_never_blocks():
+    scheduler = RequestScheduler(qps=0.01, burst=1, enabled=False)
+    assert all(scheduler.acquire() == 0.0 for _ in range(10))
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from region_scan import BlockDetector
+from screenshot import RawFrame
+
+
+def white_frame(width, height, boxes):
+    """白底 BGRA 帧，在 [(left, top, right, bottom)] 处画黑色实心块"""
+    buf = bytearray(b"\xff" * (width * height * 4))
+    for left, top, right, bottom in boxes:
+        row = b"\x00\x00\x00\xff" * (right - left)
+        for y in range(top, bottom):
+            start = (y * width + left) * 4
+            buf[start:start + len(row)] = row
+    return RawFrame((width, height), buf)
+
+
+def contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def test_detects_separate_blocks_in_reading_order():
+    boxes = [(40, 40, 200, 80), (400, 40, 560, 80), (40, 200, 300, 260)]
+    blocks = BlockDetector().detect(white_frame(640, 360, boxes))
+    assert len(blocks) == 3
+    for block, box in zip(blocks, boxes):
+        assert contains(block, box)
+
+
+def test_word_gaps_do_not_split_a_block():
+    # 两段之间只有 12px 空白（降采样后 3 列），小于 column_gap
+    boxes = [(40, 40, 120, 70), (132, 40, 220, 70)]
+    blocks = BlockDetector().detect(white_frame(320, 120, boxes))
+    assert len(blocks) == 1
+    assert contains(blocks[0], (40, 40, 220, 70))
+
+
+def test_tiny_specks_are_dropped():
+    frame = white_frame(400, 300, [(10, 10, 11, 11), (301, 201, 302, 202)])
+    assert BlockDetector().detect(frame) == []
+
+
+def test_window_sized_images_are_dropped():
+    # 占整帧 70% 的“照片”：逐行变化的灰度，背景仍是白色
+    frame = white_frame(400, 300, [])
+    for y in range(0, 210):
+        value = (y * 7) % 200
+        row = bytes((value, value, value, 255)) * 400
+        frame.bgra[y * 1600:(y + 1) * 1600] = row
+    assert BlockDetector().detect(frame) == []
+
+
+def test_blank_frame_has_no_blocks():
+    assert BlockDetector().detect(white_frame(200, 100, [])) == []
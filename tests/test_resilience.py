@@ -0,0 +1,102 @@
+import socket
+import time
+
+import pytest
+
+from resilience import (ApiError, CircuitBreaker, CircuitOpenError, OfflineQueue, RetryPolicy, is_retryable,
+                        parse_retry_after)
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (ApiError(503), True),
+    (ApiError(429), True),
+    (CircuitOpenError(), True),
+    (ConnectionError(), True),
+    (TimeoutError(), True),
+    (socket.timeout(), True),
+    (FileNotFoundError(), False),
+    (PermissionError(), False),
+    (ValueError("bad json"), False),
+    (KeyError("res"), False),
+])
+def test_only_network_and_server_errors_are_retryable(exc, expected):
+    assert is_retryable(exc) is expected
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+
+
+def test_retry_delay_is_jittered_within_exponential_cap():
+    policy = RetryPolicy(attempts=5, base=0.3, cap=1.0)
+    for retry in range(6):
+        bound = min(1.0, 0.3 * 2 ** retry)
+        assert all(0 <= policy.delay(retry) <= bound for _ in range(50))
+    assert RetryPolicy(attempts=0).attempts == 1
+
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    changes = []
+    breaker.listeners.append(lambda old, new: changes.append(new))
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= 0.05
+    time.sleep(0.06)
+    # 冷却结束：只放行一个探测请求
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert changes == [CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED]
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+    breaker.allow()
+    breaker.record_failure()
+    time.sleep(0.03)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_release_returns_the_probe_slot_without_closing():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.02)
+    breaker.allow()
+    breaker.record_failure()
+    time.sleep(0.03)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_offline_queue_round_trip_in_order(tmp_path):
+    offline = OfflineQueue(str(tmp_path))
+    first = offline.put(b"png-1", {'hotkey': 'a'})
+    time.sleep(0.002)
+    second = offline.put(b"png-2", {'hotkey': 'b'})
+    assert offline.ids() == [first, second]
+    data, meta = offline.load(first)
+    assert data == b"png-1"
+    assert meta['hotkey'] == 'a' and 'queued_at' in meta
+    offline.remove(first)
+    offline.remove(first)  # 重复删除无害
+    assert offline.ids() == [second]
+    # 重新打开同一目录仍能读到未补识别的记录
+    assert OfflineQueue(str(tmp_path)).ids() == [second]
+
+
+def test_offline_queue_ignores_incomplete_records(tmp_path):
+    offline = OfflineQueue(str(tmp_path))
+    (tmp_path / "0000000000001-deadbeef.png").write_bytes(b"png")  # 元数据未写完
+    (tmp_path / "0000000000002-deadbeef.json.tmp").write_text("{}")
+    assert len(offline) == 0
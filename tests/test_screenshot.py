@@ -0,0 +1,42 @@
+import pytest
+
+import preprocess
+from screenshot import RawFrame
+
+
+def numbered_frame(width, height):
+    """每个像素的 BGRA 为 (x, y, x ^ y, 255)，便于核对裁剪结果"""
+    buf = bytearray()
+    for y in range(height):
+        for x in range(width):
+            buf += bytes((x, y, x ^ y, 255))
+    return RawFrame((width, height), buf)
+
+
+def expected(frame, left, top, right, bottom):
+    stride = frame.width * 4
+    return b"".join(bytes(frame.bgra[y * stride + left * 4:y * stride + right * 4]) for y in range(top, bottom))
+
+
+@pytest.mark.parametrize("box", [
+    (3, 2, 10, 7),       # 内部选区
+    (0, 1, 16, 5),       # 整行：连续拷贝
+    (-5, -5, 4, 3),      # 越界部分被截掉
+    (12, 6, 40, 40),
+    (5, 5, 5, 9),        # 空选区
+])
+def test_crop_matches_row_by_row_copy(box, monkeypatch):
+    frame = numbered_frame(16, 10)
+    cropped = frame.crop(*box)
+    left, top = max(0, box[0]), max(0, box[1])
+    right, bottom = min(16, box[2]), min(10, box[3])
+    assert cropped.size == (max(0, right - left), max(0, bottom - top))
+    assert bytes(cropped.bgra) == expected(frame, left, top, max(left, right), max(top, bottom))
+    assert isinstance(cropped.bgra, bytearray)
+
+
+def test_crop_without_numpy(monkeypatch):
+    frame = numbered_frame(16, 10)
+    monkeypatch.setattr(preprocess, "_np_checked", True)
+    monkeypatch.setattr(preprocess, "np", None)
+    assert bytes(frame.crop(3, 2, 10, 7).bgra) == expected(frame, 3, 2, 10, 7)